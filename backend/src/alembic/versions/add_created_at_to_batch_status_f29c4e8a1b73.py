@@ -0,0 +1,38 @@
+# ruff: noqa: I001
+"""add created at to batch status
+
+Revision ID: f29c4e8a1b73
+Revises: e5b90c7d4a18
+Create Date: 2026-10-19 21:12:40.361829
+
+"""
+
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = "f29c4e8a1b73"
+down_revision: Union[str, Sequence[str], None] = "e5b90c7d4a18"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.add_column(
+        "batch_status",
+        sa.Column(
+            "created_at",
+            sa.TIMESTAMP(timezone=True),
+            server_default=sa.func.now(),
+            nullable=False,
+        ),
+    )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_column("batch_status", "created_at")
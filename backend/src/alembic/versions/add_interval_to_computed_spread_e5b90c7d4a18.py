@@ -0,0 +1,31 @@
+# ruff: noqa: I001
+"""add interval to computed spread
+
+Revision ID: e5b90c7d4a18
+Revises: d3a81f6c2e57
+Create Date: 2026-10-19 19:26:52.804113
+
+"""
+
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = "e5b90c7d4a18"
+down_revision: Union[str, Sequence[str], None] = "d3a81f6c2e57"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    # existing rows stay without interval until their crypto is computed again
+    op.add_column("computed_spread_max", sa.Column("interval", sa.String(), nullable=True))
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_column("computed_spread_max", "interval")
@@ -0,0 +1,46 @@
+# ruff: noqa: I001
+"""add spread series table
+
+Revision ID: b7d4e2a91c06
+Revises: 9e47c3a1d2b8
+Create Date: 2026-10-19 14:03:27.518204
+
+"""
+
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = "b7d4e2a91c06"
+down_revision: Union[str, Sequence[str], None] = "9e47c3a1d2b8"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    # partitions are created by the writer, see background/db/spread_series.py
+    op.create_table(
+        "spread_series",
+        sa.Column("crypto_id", sa.Integer(), nullable=False),
+        sa.Column("interval", sa.String(length=4), nullable=False),
+        sa.Column("time", sa.TIMESTAMP(timezone=True), nullable=False),
+        sa.Column("spread_percent", sa.REAL(), nullable=False),
+        sa.Column("high_exchange_id", sa.Integer(), nullable=False),
+        sa.Column("low_exchange_id", sa.Integer(), nullable=False),
+        sa.PrimaryKeyConstraint("crypto_id", "interval", "time"),
+        postgresql_partition_by="RANGE (time)",
+    )
+    op.create_index(
+        "ix_spread_series_time_brin", "spread_series", ["time"], postgresql_using="brin"
+    )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    # drops all partitions with it
+    op.drop_index("ix_spread_series_time_brin", table_name="spread_series")
+    op.drop_table("spread_series")
@@ -0,0 +1,41 @@
+# ruff: noqa: I001
+"""key computed spread by interval
+
+Revision ID: a4d7e1f0b952
+Revises: f29c4e8a1b73
+Create Date: 2026-10-19 21:58:03.417265
+
+"""
+
+from typing import Sequence, Union
+
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision: str = "a4d7e1f0b952"
+down_revision: Union[str, Sequence[str], None] = "f29c4e8a1b73"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    # spreads saved before intervals were recorded belong to no interval,
+    # the next run of each interval computes them again
+    op.execute("DELETE FROM computed_spread_max WHERE interval IS NULL")
+    op.alter_column("computed_spread_max", "interval", nullable=False)
+    op.drop_constraint("computed_spread_max_pkey", "computed_spread_max", type_="primary")
+    op.create_primary_key("computed_spread_max_pkey", "computed_spread_max", ["id", "interval"])
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    # one row per crypto again, the newest compute of each one is kept
+    op.execute(
+        "DELETE FROM computed_spread_max WHERE ctid NOT IN "
+        "(SELECT DISTINCT ON (id) ctid FROM computed_spread_max ORDER BY id, time DESC)"
+    )
+    op.drop_constraint("computed_spread_max_pkey", "computed_spread_max", type_="primary")
+    op.create_primary_key("computed_spread_max_pkey", "computed_spread_max", ["id"])
+    op.alter_column("computed_spread_max", "interval", nullable=True)
@@ -0,0 +1,41 @@
+# ruff: noqa: I001
+"""scope batch status by run
+
+Revision ID: d3a81f6c2e57
+Revises: b7d4e2a91c06
+Create Date: 2026-10-19 18:41:09.207315
+
+"""
+
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = "d3a81f6c2e57"
+down_revision: Union[str, Sequence[str], None] = "b7d4e2a91c06"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    # status rows only live for a run, existing ones belong to no run
+    op.execute("DELETE FROM batch_status")
+    op.add_column("batch_status", sa.Column("run_id", sa.String(), nullable=False))
+    op.add_column("batch_status", sa.Column("threshold", sa.Integer(), nullable=False))
+    op.drop_constraint("batch_status_pkey", "batch_status", type_="primary")
+    op.create_primary_key("batch_status_pkey", "batch_status", ["run_id", "id"])
+    op.create_index("ix_batch_status_run_crypto", "batch_status", ["run_id", "crypto_id"])
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.execute("DELETE FROM batch_status")
+    op.drop_index("ix_batch_status_run_crypto", table_name="batch_status")
+    op.drop_constraint("batch_status_pkey", "batch_status", type_="primary")
+    op.create_primary_key("batch_status_pkey", "batch_status", ["id"])
+    op.drop_column("batch_status", "threshold")
+    op.drop_column("batch_status", "run_id")
@@ -1,22 +1,31 @@
 import asyncio
-import json
 import logging
-from typing import Annotated
+import time
+from itertools import batched
+from typing import Annotated, Iterator, Sequence
 
-from background.celery.celery_spreads import run_chunk_compute
-from background.db.batch_status import init_batch_status, update_batch_status_cached
+import numpy as np
+from background.compute.backends import ComputeBackend, get_compute_backend
+from background.db.batch_status import init_batch_status, update_batch_fetch_status
 from background.db.db_pairs import (
-    get_arbitrable_rows,
-    get_params_for_crypto_dto,
     insert_exchange_names,
     insert_or_update_pairs,
+    stream_params_for_crypto_dto,
 )
 from background.dto.crypto_pair import CryptoPair
-from config.config import SUPPORTED_EXCHANGES, CryptoBatchSettings
+from config.config import SUPPORTED_EXCHANGES, CryptoBatchSettings, FetchStatus
 from fastapi import Depends
 from services.data_gather import DataManagerDependency
-from services.db_session import DBSessionDep
-from utils.dependencies.dependencies import CryptoFetcherDependency, RedisClientDependency
+from services.db_session import DBSessionDep, get_session_raw
+from services.external_api_caller import CryptoFetcher
+from services.metrics import PAIRS_FETCHED, record_run
+from services.run_admission import RunAdmission, new_run_id
+from services.tracing import span, start_trace
+from utils.dependencies.dependencies import (
+    CryptoFetcherDependency,
+    RedisClientDependency,
+    RunAdmissionDependency,
+)
 
 logger = logging.getLogger(__name__)
 batch_settings = CryptoBatchSettings()
@@ -28,11 +37,15 @@ class BatchFetcher:
         data_manager: DataManagerDependency,
         redis_client: RedisClientDependency,
         external_api_caller: CryptoFetcherDependency,
+        compute_backend: ComputeBackend,
+        run_admission: RunAdmission,
         chunk_size: int,
     ) -> None:
         self.data_manager = data_manager
         self.redis_client = redis_client
         self.external_api_caller = external_api_caller
+        self.compute_backend = compute_backend
+        self.run_admission = run_admission
 
         self.CHUNK_SIZE = chunk_size
 
@@ -50,106 +63,206 @@ class BatchFetcher:
 
     def create_arb_pairs_objects(
         self,
-        arbitrable_crypto_ids: list[int],
+        threshold: int,
         interval: str,
+        run_id: str,
         db: DBSessionDep,
-    ) -> list[CryptoPair]:
+    ) -> Iterator[CryptoPair]:
         """
-        Get all arbitrable pair objects
+        Lazily yield all arbitrable pair objects
 
         Specify the threshold to be applied.
         I.e. min. amount of exchanges, which support this pair
         """
-        # state management!
-        # how do i know if the pairs have been initted already?
-        # TODO: create a master state machine for general init statuses
-        # e.g. initted all pairs, initted all exchange names, etc.
-        crypto_pairs_tuples = get_params_for_crypto_dto(ids_list=arbitrable_crypto_ids, session=db)
-
-        return [
-            CryptoPair(
-                crypto_id_exchange_unique=crypto_id,
-                crypto_name=crypto_name,
-                supported_exchange=supported_exchange,
-                interval=interval,
-            )
-            for crypto_id, crypto_name, supported_exchange in crypto_pairs_tuples
-        ]
+        return stream_crypto_pairs(threshold=threshold, interval=interval, run_id=run_id, db=db)
 
     async def download_all_ohlc(
-        self, db: DBSessionDep, threshold: int | None = None, interval: str | None = None
+        self,
+        db: DBSessionDep,
+        threshold: int | None = None,
+        interval: str | None = None,
+        run_id: str | None = None,
     ) -> None:
         """
         Download and save all ohcl in Redis
 
         All in this case means
         all arbitrable pairs with predefined threshold
+
+        Pairs are streamed from the db chunk by chunk,
+        so memory stays flat regardless of the amount of pairs
+
+        @run_id is given if the caller was admitted already.
+        A run queued as pending meanwhile is started right after this one
         """
         threshold = threshold or batch_settings.DEFAULT_THRESHOLD
         interval = interval or batch_settings.DEFAULT_INTERVAL
 
-        # get pairs data with threshold applied
-        raw_rows = get_arbitrable_rows(threshold=threshold, session=db)
-        crypto_ids = [row.crypto_id for row in raw_rows]
-        ids_with_exchange = [row.id for row in raw_rows]
+        if run_id is None:
+            run_id = new_run_id()
+            running_run_id = self.run_admission.admit(
+                run_id=run_id, interval=interval, threshold=threshold
+            )
+            if running_run_id:
+                logger.info(f"Run {running_run_id} is in progress, not starting another one")
+                return
 
-        # initialize batch status table
-        init_batch_status(
-            session=db,
-            ids_by_exchange=ids_with_exchange,
-            crypto_ids=crypto_ids,
-            interval=interval,
-        )
+        while True:
+            try:
+                await self._download_run(
+                    db=db, threshold=threshold, interval=interval, run_id=run_id
+                )
+            finally:
+                pending = self.run_admission.release(
+                    run_id=run_id, interval=interval, threshold=threshold
+                )
+            if not pending:
+                return
 
-        crypto_dto_list: list[CryptoPair] = self.create_arb_pairs_objects(
-            db=db, arbitrable_crypto_ids=ids_with_exchange, interval=interval
-        )
+            # requests which came in during this run get one fresh run
+            run_id = new_run_id()
+            if self.run_admission.admit(run_id=run_id, interval=interval, threshold=threshold):
+                return
+
+    async def _download_run(
+        self, db: DBSessionDep, threshold: int, interval: str, run_id: str
+    ) -> None:
+        logger.info(f"Starting run {run_id} for interval {interval}, threshold {threshold}")
+
+        with start_trace(run_id=run_id, name="run", interval=interval, threshold=threshold):
+            # initialize batch status table with threshold applied
+            init_batch_status(session=db, threshold=threshold, interval=interval, run_id=run_id)
+
+            # process_chunk commits on @db, which would close the server-side cursor
+            # so streaming gets its own session
+            started = time.monotonic()
+            pairs = 0
+            stream_session = get_session_raw()
+            try:
+                crypto_dtos = self.create_arb_pairs_objects(
+                    threshold=threshold, interval=interval, run_id=run_id, db=stream_session
+                )
+                for dto_chunk in batched(crypto_dtos, self.CHUNK_SIZE, strict=False):
+                    await self.process_chunk(dto_chunk=dto_chunk, db=db)
+                    pairs += len(dto_chunk)
+                    self.run_admission.heartbeat(
+                        run_id=run_id, interval=interval, threshold=threshold
+                    )
+            finally:
+                stream_session.close()
+            record_run(interval=interval, pairs=pairs, fetch_seconds=time.monotonic() - started)
+
+            await self.compute_backend.finish(db)
 
-        for i in range(0, len(crypto_dto_list), self.CHUNK_SIZE):
-            chunk_end = min(i + self.CHUNK_SIZE, len(crypto_dto_list))
-            dto_chunk = crypto_dto_list[i:chunk_end]
-            await self.process_chunk(dto_chunk=dto_chunk, db=db)
+        # next run starts from the limits this one converged to
+        if self.external_api_caller.concurrency:
+            self.external_api_caller.concurrency.save()
 
     async def process_chunk(
         self,
-        dto_chunk: list[CryptoPair],
+        dto_chunk: Sequence[CryptoPair],
         db: DBSessionDep,
     ) -> None:
-        tasks = [dto.get_ohlc(self.external_api_caller) for dto in dto_chunk]
+        with span("process_chunk", pairs=len(dto_chunk)):
+            await fetch_and_submit(
+                dto_chunk=dto_chunk,
+                crypto_fetcher=self.external_api_caller,
+                compute_backend=self.compute_backend,
+                db=db,
+            )
 
-        # asyncio.gather returns the list saving the initial sequence
-        ordered_ohlc = await asyncio.gather(*tasks)
+        await asyncio.sleep(batch_settings.DEFAULT_SLEEP_TIME)
 
-        cached_ce_ids = []
-        for dto, ohlc in zip(dto_chunk, ordered_ohlc, strict=True):
-            # skip corrupted / unfilled ohlc
-            # won't flag as cached in status table
-            if not ohlc:
-                continue
 
-            self.redis_client.set(
-                key=str(dto), data=json.dumps(ohlc), ttl=batch_settings.DEFAULT_OHLC_TTL
-            )
-            cached_ce_ids.append(dto.ce_id)
+def stream_crypto_pairs(
+    threshold: int,
+    interval: str,
+    run_id: str,
+    db: DBSessionDep,
+) -> Iterator[CryptoPair]:
+    # state management!
+    # how do i know if the pairs have been initted already?
+    # TODO: create a master state machine for general init statuses
+    # e.g. initted all pairs, initted all exchange names, etc.
+    crypto_pairs_rows = stream_params_for_crypto_dto(
+        threshold=threshold, session=db, yield_per=batch_settings.DEFAULT_YIELD_PER
+    )
+
+    for ce_id, crypto_id, crypto_name, supported_exchange in crypto_pairs_rows:
+        yield CryptoPair(
+            crypto_id_exchange_unique=ce_id,
+            crypto_id=crypto_id,
+            crypto_name=crypto_name,
+            supported_exchange=supported_exchange,
+            interval=interval,
+            run_id=run_id,
+        )
+
 
-        update_batch_status_cached(
+async def fetch_and_submit(
+    dto_chunk: Sequence[CryptoPair],
+    crypto_fetcher: CryptoFetcher,
+    compute_backend: ComputeBackend,
+    db: DBSessionDep,
+) -> None:
+    """
+    Fetch ohlc of one chunk, record the fetch outcome and hand it to the compute backend
+
+    Shared by the in-process run and the celery fetch workers
+    """
+    if not dto_chunk:
+        return
+
+    tasks = [_traced_fetch(dto, crypto_fetcher) for dto in dto_chunk]
+
+    # asyncio.gather returns the list saving the initial sequence
+    ordered_results = await asyncio.gather(*tasks)
+    ordered_ohlc = [ohlc for ohlc, _ in ordered_results]
+    fetch_statuses = [fetch_status for _, fetch_status in ordered_results]
+    for dto, fetch_status in zip(dto_chunk, fetch_statuses, strict=True):
+        PAIRS_FETCHED.labels(exchange=dto.supported_exchange, status=fetch_status).inc()
+
+    with span("update_batch_fetch_status", pairs=len(dto_chunk)):
+        update_batch_fetch_status(
             session=db,
-            ce_ids=cached_ce_ids,
+            fetch_statuses={
+                dto.ce_id: fetch_status
+                for dto, fetch_status in zip(dto_chunk, fetch_statuses, strict=True)
+            },
+            run_id=dto_chunk[0].run_id,
+        )
+    with span("submit", pairs=len(dto_chunk)):
+        await compute_backend.submit(
+            dto_chunk=dto_chunk,
+            ordered_ohlc=ordered_ohlc,
+            fetch_statuses=fetch_statuses,
+            db=db,
         )
-        run_chunk_compute(ce_ids=cached_ce_ids)
 
-        await asyncio.sleep(batch_settings.DEFAULT_SLEEP_TIME)
+
+async def _traced_fetch(
+    dto: CryptoPair, crypto_fetcher: CryptoFetcher
+) -> tuple[list[list[float]] | np.ndarray | None, FetchStatus]:
+    with span(
+        "fetch_ohlcv", crypto_id=dto.crypto_id, exchange=dto.supported_exchange
+    ) as attributes:
+        ohlc, fetch_status = await dto.get_ohlc(crypto_fetcher)
+        attributes["status"] = fetch_status
+    return ohlc, fetch_status
 
 
 async def get_batch_fetcher(
     redis_client: RedisClientDependency,
     data_manager: DataManagerDependency,
     external_api_caller: CryptoFetcherDependency,
+    run_admission: RunAdmissionDependency,
 ) -> BatchFetcher:
     return BatchFetcher(
         data_manager=data_manager,
         redis_client=redis_client,
         external_api_caller=external_api_caller,
+        compute_backend=get_compute_backend(redis_client=redis_client),
+        run_admission=run_admission,
         chunk_size=batch_settings.DEFAULT_CHUNK_SIZE,
     )
 
@@ -1,3 +1,4 @@
+from background.celery.schedule import build_beat_schedule
 from celery import Celery
 from config.config import RedisSettings
 
@@ -6,4 +7,9 @@ redis_url = RedisSettings().construct_celery_url()
 scan_app = Celery("db_scanner",
                   broker=redis_url,
                   backend=redis_url,
-                  include=["background.celery.celery_spreads"])
\ No newline at end of file
+                  include=["background.celery.celery_spreads",
+                           "background.celery.celery_fetch",
+                           "background.celery.celery_metrics",
+                           "background.celery.celery_tracing"])
+
+scan_app.conf.beat_schedule = build_beat_schedule()
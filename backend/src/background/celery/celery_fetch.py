@@ -0,0 +1,201 @@
+from background.batch_fetch_ohlc import fetch_and_submit, stream_crypto_pairs
+from background.celery.celery_conf import scan_app
+from background.celery.fetch_worker import fetch_queue, get_worker_loop
+from background.compute.backends import CeleryComputeBackend
+from background.db.batch_status import init_batch_status, mark_pending_failed
+from background.dto.crypto_pair import CryptoPair
+from celery.utils.log import get_task_logger
+from config.config import CryptoBatchSettings
+from services.db_session import get_session_raw
+from services.external_api_caller import CryptoFetcher
+from services.metrics import record_run
+from services.run_admission import new_run_id
+from services.tracing import start_trace
+from sqlalchemy.orm import Session
+from utils.dependencies.dependencies import (
+    get_cache_policy,
+    get_change_detector,
+    get_crypto_fetcher,
+    get_redis_client,
+    get_run_admission,
+    get_run_tracker,
+)
+
+logger = get_task_logger(__name__)
+batch_settings = CryptoBatchSettings()
+
+
+@scan_app.task
+def scheduled_scan(interval: str) -> str:
+    """
+    Fired by celery beat, right after candles of @interval closed
+
+    Only cryptos whose ohlc changed since their last compute are recomputed
+    """
+    return start_fetch_run(
+        threshold=batch_settings.DEFAULT_THRESHOLD,
+        interval=interval,
+        changed_only=True,
+        scheduled=True,
+    )
+
+
+@scan_app.task
+def start_fetch_run(
+    threshold: int,
+    interval: str,
+    changed_only: bool = False,
+    scheduled: bool = False,
+    run_id: str | None = None,
+) -> str | None:
+    """
+    Split a run into per exchange fetch chunks
+
+    Pairs are streamed from the db and buffered per exchange,
+    every full buffer is sent to the queue of its exchange
+
+    With @changed_only cryptos with unchanged ohlc keep their last computed spread.
+    @run_id is given if the caller was admitted already, otherwise the run
+    is skipped while another one of the same scope is in progress
+    """
+    if run_id is None:
+        run_id = new_run_id()
+        running_run_id = get_run_admission().admit(
+            run_id=run_id, interval=interval, threshold=threshold
+        )
+        if running_run_id:
+            logger.info(f"Run {running_run_id} is in progress, skipping")
+            return None
+
+    with start_trace(run_id=run_id, name="run", interval=interval, threshold=threshold):
+        logger.info(f"Starting run {run_id} for interval {interval}, threshold {threshold}")
+        run_tracker = get_run_tracker()
+        run_tracker.start(
+            run_id=run_id,
+            interval=interval,
+            threshold=threshold,
+            changed_only=changed_only,
+            scheduled=scheduled,
+        )
+
+        session = get_session_raw()
+        init_batch_status(session=session, threshold=threshold, interval=interval, run_id=run_id)
+        session.close()
+
+        chunks_sent = 0
+        pairs = 0
+        buffers: dict[str, list[dict]] = {}
+        stream_session = get_session_raw()
+        try:
+            crypto_dtos = stream_crypto_pairs(
+                threshold=threshold, interval=interval, run_id=run_id, db=stream_session
+            )
+            for dto in crypto_dtos:
+                pairs += 1
+                buffer = buffers.setdefault(dto.supported_exchange, [])
+                buffer.append(dto.as_kwargs())
+                if len(buffer) >= batch_settings.DEFAULT_CHUNK_SIZE:
+                    _send_chunk(exchange_name=dto.supported_exchange, pairs=buffer)
+                    buffers[dto.supported_exchange] = []
+                    chunks_sent += 1
+        finally:
+            stream_session.close()
+
+        for exchange_name, buffer in buffers.items():
+            if buffer:
+                _send_chunk(exchange_name=exchange_name, pairs=buffer)
+                chunks_sent += 1
+
+        logger.info(f"Run {run_id} split into {chunks_sent} fetch chunks")
+        if run_tracker.split_done(run_id=run_id, chunks_total=chunks_sent, pairs=pairs):
+            _finish_run(run_id)
+    return run_id
+
+
+def _send_chunk(exchange_name: str, pairs: list[dict]) -> None:
+    fetch_ohlc_chunk.apply_async(args=[pairs], queue=fetch_queue(exchange_name))
+
+
+@scan_app.task
+def fetch_ohlc_chunk(pairs: list[dict]) -> None:
+    """
+    Fetch one chunk of a single exchange, cache it and trigger compute
+
+    Exchanges of a crypto are fetched by different workers,
+    compute waits until all of them settled (see scan_available_ohlc)
+    """
+    dto_chunk = [CryptoPair(**pair) for pair in pairs]
+    get_worker_loop().run_until_complete(_fetch_chunk(dto_chunk))
+
+
+async def _fetch_chunk(dto_chunk: list[CryptoPair]) -> None:
+    if not dto_chunk:
+        return
+
+    run_id = dto_chunk[0].run_id
+    crypto_fetcher = get_crypto_fetcher()
+    session = get_session_raw()
+    try:
+        await fetch_and_submit(
+            dto_chunk=dto_chunk,
+            crypto_fetcher=crypto_fetcher,
+            compute_backend=CeleryComputeBackend(
+                redis_client=get_redis_client(),
+                cache_policy=get_cache_policy(),
+                change_detector=get_change_detector(),
+            ),
+            db=session,
+        )
+    except Exception:
+        logger.exception(f"Fetch chunk of run {run_id} failed, its pending pairs count as failed")
+        _mark_chunk_failed(session=session, dto_chunk=dto_chunk)
+        raise
+    finally:
+        session.close()
+        # a crashed chunk is done too, or its run would hold admission until the lock expires
+        _chunk_done(crypto_fetcher=crypto_fetcher, run_id=run_id)
+
+
+def _mark_chunk_failed(session: Session, dto_chunk: list[CryptoPair]) -> None:
+    try:
+        session.rollback()
+        mark_pending_failed(
+            session=session, ce_ids=[dto.ce_id for dto in dto_chunk], run_id=dto_chunk[0].run_id
+        )
+    except Exception:
+        logger.exception(f"Couldn't mark the chunk of run {dto_chunk[0].run_id} as failed")
+
+
+def _chunk_done(crypto_fetcher: CryptoFetcher, run_id: str) -> None:
+    if crypto_fetcher.concurrency:
+        crypto_fetcher.concurrency.save()
+
+    if get_run_tracker().chunk_done(run_id):
+        _finish_run(run_id)
+        return
+
+    run_info = get_run_tracker().info(run_id)
+    get_run_admission().heartbeat(
+        run_id=run_id, interval=run_info["interval"], threshold=run_info["threshold"]
+    )
+
+
+def _finish_run(run_id: str) -> None:
+    """
+    All chunks fetched, free the run's scope and start a run which waited for it
+    """
+    run_info = get_run_tracker().info(run_id)
+    interval, threshold = run_info["interval"], run_info["threshold"]
+
+    pending = get_run_admission().release(run_id=run_id, interval=interval, threshold=threshold)
+    logger.info(f"Run {run_id} fetched in {run_info.get('fetch_seconds')}s")
+    if "fetch_seconds" in run_info:
+        record_run(
+            interval=interval,
+            pairs=run_info.get("pairs", 0),
+            fetch_seconds=run_info["fetch_seconds"],
+        )
+    if pending:
+        start_fetch_run.delay(
+            threshold=threshold, interval=interval, changed_only=bool(run_info["changed_only"])
+        )
@@ -0,0 +1,43 @@
+"""
+Celery side of services/metrics.py, connected through celery's signals
+
+Prefork pool processes write to PROMETHEUS_MULTIPROC_DIR,
+the worker's main process serves them merged on METRICS_WORKER_PORT
+"""
+
+import time
+
+from celery import Task
+from celery.signals import task_postrun, task_prerun, worker_init, worker_process_shutdown
+from config.config import MetricsSettings
+from services.metrics import TASK_SECONDS, process_dead, serve_worker_metrics
+
+metrics_settings = MetricsSettings()
+
+# task id -> start, per pool process
+_started: dict[str, float] = {}
+
+
+@worker_init.connect
+def start_metrics_server(**kwargs: object) -> None:
+    if metrics_settings.METRICS_WORKER_PORT is not None:
+        serve_worker_metrics(metrics_settings.METRICS_WORKER_PORT)
+
+
+@worker_process_shutdown.connect
+def forget_pool_process(pid: int, **kwargs: object) -> None:
+    process_dead(pid)
+
+
+@task_prerun.connect
+def task_started(task_id: str, **kwargs: object) -> None:
+    _started[task_id] = time.perf_counter()
+
+
+@task_postrun.connect
+def task_finished(task_id: str, task: Task, state: str | None = None, **kwargs: object) -> None:
+    started = _started.pop(task_id, None)
+    if started is not None:
+        TASK_SECONDS.labels(task=task.name.rsplit(".", 1)[-1], state=state or "UNKNOWN").observe(
+            time.perf_counter() - started
+        )
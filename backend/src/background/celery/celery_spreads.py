@@ -1,42 +1,112 @@
-import json
-
+import numpy as np
 from background.celery.celery_conf import scan_app
+from background.celery.fetch_worker import fetch_queue, get_worker_loop
+from background.compute.result_sink import get_result_sink
+from background.compute.spread_compute import (
+    compute_spread_incremental,
+    compute_spread_with_series,
+)
+from background.db.batch_status import mark_refetched_for_recompute
 from background.db.celery import (
     get_ce_ids_by_crypto_id,
     save_compute_mark_complete,
+    save_computes_mark_complete_many,
     scan_available_ohlc,
 )
-from celery import chain, group
+from background.db.spread_series import drop_expired_partitions, save_spread_series
+from background.db.user_api import get_computed_spreads_by_id
+from background.dto.crypto_pair import CryptoPair
+from celery import Task, chain, group
 from celery.utils.log import get_task_logger
-from data_manipulation.spread_object import Spread
-from data_manipulation.timeframes_equalizer import TimeframeSynchronizer
+from config.config import CryptoBatchSettings, FetchStatus, SpreadStatsSettings
+from data_manipulation.incremental_spread import SpreadState
+from services.cache_keys import run_ohlc_key, spread_state_key
 from services.db_session import get_session_raw
-from utils.dependencies.dependencies import get_redis_client
+from services.metrics import SPREADS_COMPUTED
+from services.tracing import span
+from sqlalchemy.orm import Session
+from utils.dependencies.dependencies import (
+    get_cache_policy,
+    get_change_detector,
+    get_crypto_fetcher,
+    get_leaderboard,
+    get_redis_client,
+    get_run_tracker,
+)
 
 logger = get_task_logger(__name__)
+batch_settings = CryptoBatchSettings()
+stats_settings = SpreadStatsSettings()
+
+
+def enqueue_fetch_retries(dtos: list[CryptoPair]) -> None:
+    """
+    Failed fetches are retried by their exchange's fetch workers,
+    under the same adaptive limits and connection pool as the run's chunks
+    """
+    for dto in dtos:
+        retry_failed_fetch.apply_async(
+            args=[dto.as_kwargs()],
+            queue=fetch_queue(dto.supported_exchange),
+            countdown=batch_settings.FETCH_RETRY_COUNTDOWN,
+        )
 
 
-def run_chunk_compute(ce_ids: list[int]) -> None:
-    main_process = chain(get_cached_pairs_list.s(ce_ids), spawn_chunk_computes.s())
+def run_chunk_compute(ce_ids: list[int], run_id: str, interval: str) -> None:
+    main_process = chain(
+        get_cached_pairs_list.s(ce_ids, run_id=run_id),
+        spawn_chunk_computes.s(run_id=run_id, interval=interval),
+    )
     main_process.apply_async()
 
 
 @scan_app.task
-def get_cached_pairs_list(dtos_ids: list[int]) -> list[int]:
+def get_cached_pairs_list(dtos_ids: list[int], run_id: str) -> list[int]:
     session = get_session_raw()
 
     # get list grouped by ohlc with same crypto name
-    return scan_available_ohlc(session=session, dtos_ids=dtos_ids)
+    return scan_available_ohlc(
+        session=session, dtos_ids=dtos_ids, quorum=batch_settings.COMPUTE_QUORUM, run_id=run_id
+    )
 
 
 @scan_app.task
-def spawn_chunk_computes(crypto_ids: list[int]):
-    spread_grouped = group(compute_cross_exchange_spread.s(crypto_id) for crypto_id in crypto_ids)
-    return spread_grouped.apply_async()
+def spawn_chunk_computes(crypto_ids: list[int], run_id: str, interval: str) -> None:
+    if get_run_tracker().is_change_driven(run_id):
+        crypto_ids = _skip_unchanged(crypto_ids=crypto_ids, run_id=run_id, interval=interval)
+
+    spread_grouped = group(
+        compute_cross_exchange_spread.s(crypto_id, run_id=run_id, interval=interval)
+        for crypto_id in crypto_ids
+    )
+    spread_grouped.apply_async()
+
+
+def _skip_unchanged(crypto_ids: list[int], run_id: str, interval: str) -> list[int]:
+    """
+    Mark cryptos with unchanged ohlc as done, their last computed spread stays valid
+
+    Returns the changed ones
+    """
+    changed = get_change_detector().changed_cryptos(run_id)
+    unchanged = [crypto_id for crypto_id in crypto_ids if crypto_id not in changed]
+    if unchanged:
+        session = get_session_raw()
+        save_computes_mark_complete_many(
+            session=session,
+            computed_spreads={crypto_id: {} for crypto_id in unchanged},
+            run_id=run_id,
+            interval=interval,
+        )
+        session.close()
+        get_run_tracker().computes_done(run_id, skipped=len(unchanged))
+        SPREADS_COMPUTED.labels(interval=interval, outcome="unchanged").inc(len(unchanged))
+
+    return [crypto_id for crypto_id in crypto_ids if crypto_id in changed]
 
 
 @scan_app.task
-def compute_cross_exchange_spread(crypto_id: int) -> None:
+def compute_cross_exchange_spread(crypto_id: int, run_id: str, interval: str) -> None:
     """
     Heavy and hacky method
 
@@ -49,23 +119,204 @@ def compute_cross_exchange_spread(crypto_id: int) -> None:
     redis_client = get_redis_client()
 
     ohlc_raw_grouped = []
+    # exchanges which actually have ohlc, in the same order as ohlc_raw_grouped
+    available_ce_ids = []
+    available_keys = []
 
-    crypto_exchange_ids = get_ce_ids_by_crypto_id(session=session, crypto_id=crypto_id)
-    for ce_id in crypto_exchange_ids:
-        redis_key = f"OHLC:{ce_id}"
-        ohlc_raw = redis_client.get(redis_key)
+    crypto_exchange_ids = get_ce_ids_by_crypto_id(
+        session=session, crypto_id=crypto_id, run_id=run_id
+    )
+    redis_keys = [
+        run_ohlc_key(run_id=run_id, interval=interval, crypto_id=crypto_id, ce_id=ce_id)
+        for ce_id in crypto_exchange_ids
+    ]
+    # keys share the crypto id hash tag, one round trip even on a cluster
+    with span("cache_read", crypto_id=crypto_id):
+        ohlc_values = redis_client.mget_json(redis_keys)
 
+    for ce_id, redis_key, serialized in zip(
+        crypto_exchange_ids, redis_keys, ohlc_values, strict=True
+    ):
         # check if data is corrupted at any step
         # shouldn't hapend, but better double check
-        if not ohlc_raw or not (serialized := json.loads(ohlc_raw)):
+        if not serialized:
             continue
 
         ohlc_raw_grouped.append(serialized)
+        available_ce_ids.append(ce_id)
+        available_keys.append(redis_key)
 
-    dataframes_grouped = TimeframeSynchronizer().sync_many(ohlc_raw_grouped)
-    spread_obj = Spread(raw_frames=dataframes_grouped, ce_ids=crypto_exchange_ids)
+    # consumed, unpin ohlc, it now lives until its candle closes
+    redis_client.expire_many(available_keys, get_cache_policy().storage_ttl(interval))
 
-    save_compute_mark_complete(
-        session=session, crypto_id=crypto_id, computed_spread=spread_obj.get_max_spread()
+    # cache could have expired since the quorum was checked
+    computed_spread = {}
+    series = None
+    if len(available_ce_ids) >= batch_settings.COMPUTE_QUORUM:
+        with span("compute", crypto_id=crypto_id, exchanges=len(available_ce_ids)):
+            computed_spread, series = _compute_with_state(
+                crypto_id=crypto_id,
+                interval=interval,
+                ohlc_grouped=ohlc_raw_grouped,
+                ce_ids=available_ce_ids,
+            )
+        get_change_detector().remember(
+            interval=interval,
+            crypto_id=crypto_id,
+            ce_ids=available_ce_ids,
+            ohlc_grouped=ohlc_raw_grouped,
+        )
+        SPREADS_COMPUTED.labels(interval=interval, outcome="computed").inc()
+    else:
+        logger.warning(f"Only {len(available_ce_ids)} exchanges cached for crypto {crypto_id}")
+        SPREADS_COMPUTED.labels(interval=interval, outcome="below_quorum").inc()
+    _save_result(
+        session=session,
+        crypto_id=crypto_id,
+        computed_spread=computed_spread,
+        interval=interval,
+        run_id=run_id,
+        series=series if stats_settings.SPREAD_SERIES_ENABLED else None,
     )
     session.close()
+    get_run_tracker().computes_done(run_id, computed=1)
+
+
+def _save_result(
+    session: Session,
+    crypto_id: int,
+    computed_spread: dict,
+    interval: str,
+    run_id: str,
+    series: np.ndarray | None = None,
+) -> None:
+    """
+    Hand the result to the batched writer, or write it right away if it's disabled
+
+    @series (SERIES_DTYPE rows) goes to spread_series along with it
+    """
+    result_sink = get_result_sink()
+    if result_sink:
+        with span("buffer_result", crypto_id=crypto_id):
+            countdown = result_sink.add(
+                crypto_id=crypto_id,
+                computed_spread=computed_spread,
+                interval=interval,
+                run_id=run_id,
+                series=series,
+            )
+        if countdown is not None:
+            flush_computed_spreads.apply_async(countdown=countdown)
+        return
+
+    with span("save_compute_mark_complete", crypto_id=crypto_id):
+        save_compute_mark_complete(
+            session=session,
+            crypto_id=crypto_id,
+            computed_spread=computed_spread,
+            run_id=run_id,
+            interval=interval,
+        )
+    if series is not None:
+        save_spread_series(
+            session=session,
+            interval=interval,
+            series={crypto_id: series},
+            retention_days=stats_settings.SPREAD_SERIES_RETENTION_DAYS,
+        )
+    leaderboard = get_leaderboard()
+    if leaderboard and computed_spread:
+        leaderboard.record(
+            interval=interval,
+            spreads=get_computed_spreads_by_id(
+                session=session, crypto_ids=[crypto_id], interval=interval
+            ),
+        )
+
+
+@scan_app.task
+def flush_computed_spreads() -> None:
+    """
+    Write buffered computed spreads in batches
+    """
+    result_sink = get_result_sink()
+    if not result_sink:
+        return
+
+    session = get_session_raw()
+    try:
+        result_sink.flush(session)
+    finally:
+        session.close()
+        # results left by a failed flush must not wait for the next compute
+        countdown = result_sink.reschedule()
+        if countdown is not None:
+            flush_computed_spreads.apply_async(countdown=countdown)
+
+
+def _compute_with_state(
+    crypto_id: int, interval: str, ohlc_grouped: list[list[list[float]]], ce_ids: list[int]
+) -> tuple[dict, np.ndarray]:
+    """
+    Fold only new candles into the spread state of the previous compute, if enabled
+
+    Returns the computed spread and the spread series of the folded candles
+    """
+    if not stats_settings.INCREMENTAL_COMPUTE:
+        return compute_spread_with_series(
+            crypto_id=crypto_id, ohlc_grouped=ohlc_grouped, ce_ids=ce_ids
+        )
+
+    redis_client = get_redis_client()
+    state_key = spread_state_key(interval=interval, crypto_id=crypto_id)
+    saved_state = redis_client.get_json(state_key)
+
+    computed_spread, state, series = compute_spread_incremental(
+        crypto_id=crypto_id,
+        ohlc_grouped=ohlc_grouped,
+        ce_ids=ce_ids,
+        state=SpreadState.from_dict(saved_state) if saved_state else None,
+    )
+    if state is not None:
+        redis_client.set_json(
+            key=state_key, data=state.to_dict(), ttl=stats_settings.SPREAD_STATE_TTL
+        )
+    return computed_spread, series
+
+
+@scan_app.task
+def drop_expired_spread_series() -> None:
+    session = get_session_raw()
+    try:
+        dropped = drop_expired_partitions(
+            session=session, retention_days=stats_settings.SPREAD_SERIES_RETENTION_DAYS
+        )
+    finally:
+        session.close()
+    if dropped:
+        logger.info(f"Dropped expired spread series partitions {dropped}")
+
+
+@scan_app.task(bind=True, max_retries=batch_settings.FETCH_MAX_RETRIES)
+def retry_failed_fetch(self: Task, pair: dict) -> None:
+    """
+    Refetch ohlc for one exchange, which failed during the batch run
+
+    Runs on the exchange's fetch worker, on its loop with the shared fetcher.
+    On success the crypto gets (re)computed with this exchange included
+    """
+    dto = CryptoPair(**pair)
+    ohlc, fetch_status = get_worker_loop().run_until_complete(dto.get_ohlc(get_crypto_fetcher()))
+
+    if fetch_status == FetchStatus.FAILED:
+        raise self.retry(countdown=batch_settings.FETCH_RETRY_COUNTDOWN)
+    if fetch_status != FetchStatus.OK:
+        return
+
+    get_redis_client().set_json(key=dto.cache_key(), data=ohlc, ttl=get_cache_policy().pinned_ttl())
+
+    session = get_session_raw()
+    mark_refetched_for_recompute(session=session, ce_id=dto.ce_id, run_id=dto.run_id)
+    session.close()
+
+    run_chunk_compute(ce_ids=[dto.ce_id], run_id=dto.run_id, interval=dto.interval)
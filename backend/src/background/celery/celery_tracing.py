@@ -0,0 +1,63 @@
+"""
+Celery side of services/tracing.py, connected through celery's signals
+
+The publishing span travels in the task headers and the task's span continues it
+in the worker. Time spent in the broker is a queue span of its own
+"""
+
+import inspect
+import time
+from contextvars import Token
+
+from celery import Task
+from celery.signals import before_task_publish, task_postrun, task_prerun
+from services.tracing import Span, close_span, current_context, open_span, record_span
+
+TRACE_HEADER = "trace_context"
+# task arguments kept as span attributes, they tell which crypto a span belongs to
+SPAN_ARGUMENTS = ("crypto_id", "run_id", "interval")
+
+# task id -> open span and the token to reset the current span with, per pool process
+_open: dict[str, tuple[Span, Token]] = {}
+
+
+@before_task_publish.connect
+def inject_trace_context(headers: dict, **kwargs: object) -> None:
+    context = current_context()
+    if context:
+        headers[TRACE_HEADER] = {**context, "published": time.time()}
+
+
+@task_prerun.connect
+def continue_trace(
+    task_id: str,
+    task: Task,
+    args: tuple = (),
+    kwargs: dict | None = None,
+    **other: object,
+) -> None:
+    context = task.request.get(TRACE_HEADER)
+    if not context:
+        return
+
+    name = task.name.rsplit(".", 1)[-1]
+    queued = record_span(
+        f"queue.{name}", parent=context, start=context["published"], end=time.time()
+    )
+    _open[task_id] = open_span(name, parent=queued.context(), **_span_arguments(task, args, kwargs))
+
+
+@task_postrun.connect
+def end_task_span(task_id: str, state: str | None = None, **kwargs: object) -> None:
+    opened = _open.pop(task_id, None)
+    if opened:
+        task_span, token = opened
+        close_span(task_span, token, error=None if state == "SUCCESS" else state)
+
+
+def _span_arguments(task: Task, args: tuple, kwargs: dict | None) -> dict:
+    try:
+        arguments = inspect.signature(task.run).bind_partial(*args, **(kwargs or {})).arguments
+    except TypeError:
+        return {}
+    return {key: value for key, value in arguments.items() if key in SPAN_ARGUMENTS}
@@ -0,0 +1,20 @@
+import asyncio
+from functools import lru_cache
+
+from config.config import CryptoBatchSettings
+
+batch_settings = CryptoBatchSettings()
+
+
+def fetch_queue(exchange_name: str) -> str:
+    # one queue per exchange, so a slow or rate limited exchange
+    # only ever delays its own workers
+    return f"{batch_settings.FETCH_QUEUE_PREFIX}.{exchange_name}"
+
+
+@lru_cache()
+def get_worker_loop() -> asyncio.AbstractEventLoop:
+    # one loop per worker process, created after the fork
+    # ccxt exchanges, their connection pool and adaptive limits are bound to it
+    # and live across tasks
+    return asyncio.new_event_loop()
@@ -0,0 +1,60 @@
+import ccxt
+from celery.schedules import crontab
+from config.config import CacheSettings, ComputeSettings, SchedulerSettings, SpreadStatsSettings
+
+scheduler_settings = SchedulerSettings()
+stats_settings = SpreadStatsSettings()
+compute_settings = ComputeSettings()
+
+
+def interval_crontab(every: str) -> crontab:
+    """
+    Crontab firing on every @every boundary (UTC), same boundaries candles close on
+    """
+    seconds = ccxt.Exchange.parse_timeframe(every)
+    if every == "1M":
+        return crontab(minute=0, hour=0, day_of_month=1)
+    if every == "1w":
+        # weekly candles open on monday
+        return crontab(minute=0, hour=0, day_of_week="mon")
+    if seconds == 86400:
+        return crontab(minute=0, hour=0)
+    if seconds < 3600 and 3600 % seconds == 0:
+        return crontab(minute=f"*/{seconds // 60}")
+    if seconds < 86400 and 86400 % seconds == 0:
+        return crontab(minute=0, hour=f"*/{seconds // 3600}")
+    raise ValueError(f"Can't align a schedule to {every}")
+
+
+def build_beat_schedule() -> dict:
+    """
+    One scheduled scan per configured interval
+
+    Scans start a bit after the boundary, so exchanges already closed the candle.
+    Expired spread series partitions are dropped once a day, buffered results
+    are swept every minute in case their scheduled flush got lost
+    """
+    beat_schedule = {}
+    if compute_settings.RESULT_SINK_ENABLED:
+        beat_schedule["flush-computed-spreads"] = {
+            "task": "background.celery.celery_spreads.flush_computed_spreads",
+            "schedule": interval_crontab("1m"),
+        }
+    if stats_settings.SPREAD_SERIES_ENABLED:
+        beat_schedule["drop-expired-spread-series"] = {
+            "task": "background.celery.celery_spreads.drop_expired_spread_series",
+            "schedule": interval_crontab("1d"),
+        }
+
+    if not scheduler_settings.SCHEDULER_ENABLED:
+        return beat_schedule
+
+    countdown = CacheSettings().CACHE_CLOSE_GRACE
+    for interval in scheduler_settings.SCHEDULER_INTERVALS:
+        beat_schedule[f"scan-{interval}"] = {
+            "task": "background.celery.celery_fetch.scheduled_scan",
+            "schedule": interval_crontab(scheduler_settings.SCHEDULER_REFRESH_EVERY or interval),
+            "args": (interval,),
+            "options": {"countdown": countdown},
+        }
+    return beat_schedule
@@ -0,0 +1,289 @@
+import asyncio
+import logging
+from abc import ABC, abstractmethod
+from concurrent.futures import ProcessPoolExecutor
+from functools import lru_cache
+from typing import Sequence
+
+import numpy as np
+from background.celery.celery_spreads import enqueue_fetch_retries, run_chunk_compute
+from background.compute.spread_compute import compute_spread_with_series
+from background.db.batch_status import update_batch_status_cached
+from background.db.celery import save_computes_mark_complete_many
+from background.db.spread_series import save_spread_series
+from background.db.user_api import get_computed_spreads_by_id
+from background.dto.crypto_pair import CryptoPair
+from config.config import (
+    ComputeBackendType,
+    ComputeSettings,
+    CryptoBatchSettings,
+    FetchStatus,
+    SpreadStatsSettings,
+)
+from services.cache_policy import CachePolicy
+from services.caching import RedisClient
+from services.change_detection import ChangeDetector
+from services.db_session import DBSessionDep
+from services.leaderboard import Leaderboard
+from services.metrics import SPREADS_COMPUTED
+from services.tracing import span
+from utils.dependencies.dependencies import (
+    get_cache_policy,
+    get_change_detector,
+    get_leaderboard,
+)
+
+logger = logging.getLogger(__name__)
+compute_settings = ComputeSettings()
+batch_settings = CryptoBatchSettings()
+stats_settings = SpreadStatsSettings()
+
+
+class ComputeBackend(ABC):
+    """
+    Receives fetched ohlc chunk by chunk from BatchFetcher
+    and takes care of getting the spreads computed and saved
+    """
+
+    @abstractmethod
+    async def submit(
+        self,
+        dto_chunk: Sequence[CryptoPair],
+        ordered_ohlc: Sequence[list[list[float]] | np.ndarray | None],
+        fetch_statuses: Sequence[FetchStatus],
+        db: DBSessionDep,
+    ) -> None:
+        """
+        @ordered_ohlc and @fetch_statuses are in the same order as @dto_chunk,
+        ohlc is None for failed fetches
+        """
+
+    async def finish(self, db: DBSessionDep) -> None:  # noqa: B027
+        """
+        Called once after all chunks of a run were submitted, a no-op unless overridden
+        """
+
+
+class CeleryComputeBackend(ComputeBackend):
+    """
+    Caches ohlc in Redis and lets celery workers compute from there
+
+    Cached ohlc is pinned until the compute consumed it,
+    so slow workers don't find it expired
+
+    Failed fetches are retried by celery on a separate queue.
+    Cryptos whose ohlc changed since their last compute are flagged for the run
+    """
+
+    def __init__(
+        self,
+        redis_client: RedisClient,
+        cache_policy: CachePolicy,
+        change_detector: ChangeDetector,
+    ) -> None:
+        self.redis_client = redis_client
+        self.cache_policy = cache_policy
+        self.change_detector = change_detector
+
+    async def submit(
+        self,
+        dto_chunk: Sequence[CryptoPair],
+        ordered_ohlc: Sequence[list[list[float]] | np.ndarray | None],
+        fetch_statuses: Sequence[FetchStatus],
+        db: DBSessionDep,
+    ) -> None:
+        if not dto_chunk:
+            return
+
+        run_id, interval = dto_chunk[0].run_id, dto_chunk[0].interval
+        cached_ce_ids = []
+        fetched = []
+        with span("cache_write") as attributes:
+            for dto, ohlc in zip(dto_chunk, ordered_ohlc, strict=True):
+                # skip corrupted / unfilled ohlc
+                # won't flag as cached in status table
+                if ohlc is None or not len(ohlc):
+                    continue
+
+                self.redis_client.set_json(
+                    key=dto.cache_key(), data=ohlc, ttl=self.cache_policy.pinned_ttl()
+                )
+                cached_ce_ids.append(dto.ce_id)
+                fetched.append((dto.crypto_id, dto.ce_id, ohlc))
+            attributes["pairs"] = len(cached_ce_ids)
+
+        # before the cached flag, a settled crypto always sees its changes
+        self.change_detector.record_changes(run_id=run_id, interval=interval, fetched=fetched)
+
+        update_batch_status_cached(
+            session=db,
+            ce_ids=cached_ce_ids,
+            run_id=run_id,
+        )
+        enqueue_fetch_retries(
+            [
+                dto
+                for dto, fetch_status in zip(dto_chunk, fetch_statuses, strict=True)
+                if fetch_status == FetchStatus.FAILED
+            ]
+        )
+        run_chunk_compute(ce_ids=cached_ce_ids, run_id=run_id, interval=interval)
+
+
+class LocalComputeBackend(ComputeBackend):
+    """
+    Computes spreads in a local process pool, straight from the fetched ohlc
+
+    No Redis, no broker. Pairs arrive ordered by crypto id,
+    so a crypto is complete as soon as a pair of the next crypto shows up.
+    It's computed over the exchanges with ohlc, if there are at least @quorum of them.
+    Results are written to db in batches of @write_batch_size
+
+    Failed fetches aren't retried, there's no celery to retry them.
+    Written batches go to the @leaderboard too, if given (needs redis after all).
+    The spread series of a batch is written in one COPY
+    """
+
+    def __init__(
+        self,
+        pool: ProcessPoolExecutor,
+        write_batch_size: int,
+        quorum: int,
+        leaderboard: Leaderboard | None = None,
+    ) -> None:
+        self._pool = pool
+        self.write_batch_size = write_batch_size
+        self.quorum = quorum
+        self.leaderboard = leaderboard
+        self._interval: str | None = None
+        self._run_id: str | None = None
+
+        # crypto id -> [(ce_id, ohlc array or None)], for cryptos not dispatched yet
+        self._collecting: dict[int, list[tuple[int, np.ndarray | None]]] = {}
+        self._in_flight: dict[int, asyncio.Future] = {}
+        self._results: dict[int, dict] = {}
+        self._series: dict[int, np.ndarray] = {}
+
+    async def submit(
+        self,
+        dto_chunk: Sequence[CryptoPair],
+        ordered_ohlc: Sequence[list[list[float]] | np.ndarray | None],
+        fetch_statuses: Sequence[FetchStatus],
+        db: DBSessionDep,
+    ) -> None:
+        fetched_ce_ids = []
+        for dto, ohlc in zip(dto_chunk, ordered_ohlc, strict=True):
+            self._interval = dto.interval
+            self._run_id = dto.run_id
+            # arrays pickle into the pool a lot cheaper than nested lists
+            array = np.asarray(ohlc, dtype=np.float64) if ohlc is not None and len(ohlc) else None
+            self._collecting.setdefault(dto.crypto_id, []).append((dto.ce_id, array))
+            if array is not None:
+                fetched_ce_ids.append(dto.ce_id)
+
+        # keeps the progress endpoint working, even though nothing is cached
+        update_batch_status_cached(session=db, ce_ids=fetched_ce_ids, run_id=self._run_id)
+
+        # the last crypto may continue in the next chunk
+        last_crypto_id = dto_chunk[-1].crypto_id if dto_chunk else None
+        complete_ids = [crypto_id for crypto_id in self._collecting if crypto_id != last_crypto_id]
+        for crypto_id in complete_ids:
+            self._dispatch(crypto_id)
+
+        self._collect_done()
+        if len(self._results) >= self.write_batch_size:
+            self._write_results(db)
+
+    async def finish(self, db: DBSessionDep) -> None:
+        for crypto_id in list(self._collecting):
+            self._dispatch(crypto_id)
+
+        await asyncio.gather(*self._in_flight.values(), return_exceptions=True)
+        self._collect_done()
+        self._write_results(db)
+
+    def _dispatch(self, crypto_id: int) -> None:
+        entries = [
+            (ce_id, array) for ce_id, array in self._collecting.pop(crypto_id) if array is not None
+        ]
+
+        # same rule as the celery path
+        if len(entries) < self.quorum:
+            logger.info(f"Only {len(entries)} exchanges fetched for crypto {crypto_id}, skipping")
+            SPREADS_COMPUTED.labels(interval=self._interval, outcome="below_quorum").inc()
+            return
+
+        ce_ids = [ce_id for ce_id, _ in entries]
+        arrays = [array for _, array in entries]
+        self._in_flight[crypto_id] = asyncio.get_running_loop().run_in_executor(
+            self._pool, compute_spread_with_series, crypto_id, arrays, ce_ids
+        )
+
+    def _collect_done(self) -> None:
+        for crypto_id, future in list(self._in_flight.items()):
+            if not future.done():
+                continue
+
+            self._in_flight.pop(crypto_id)
+            try:
+                self._results[crypto_id], self._series[crypto_id] = future.result()
+                SPREADS_COMPUTED.labels(interval=self._interval, outcome="computed").inc()
+            except Exception:
+                logger.exception(f"Spread compute failed for crypto {crypto_id}")
+                SPREADS_COMPUTED.labels(interval=self._interval, outcome="failed").inc()
+
+    def _write_results(self, db: DBSessionDep) -> None:
+        if not self._results:
+            return
+
+        with span("save_computes_mark_complete_many", spreads=len(self._results)):
+            save_computes_mark_complete_many(
+                session=db,
+                computed_spreads=self._results,
+                run_id=self._run_id,
+                interval=self._interval,
+            )
+        logger.info(f"Saved {len(self._results)} computed spreads")
+
+        if stats_settings.SPREAD_SERIES_ENABLED and self._interval:
+            save_spread_series(
+                session=db,
+                interval=self._interval,
+                series=self._series,
+                retention_days=stats_settings.SPREAD_SERIES_RETENTION_DAYS,
+            )
+
+        if self.leaderboard and self._interval:
+            saved_ids = [crypto_id for crypto_id, spread in self._results.items() if spread]
+            self.leaderboard.record(
+                interval=self._interval,
+                spreads=get_computed_spreads_by_id(
+                    session=db, crypto_ids=saved_ids, interval=self._interval
+                ),
+            )
+        self._results = {}
+        self._series = {}
+
+
+@lru_cache()
+def get_process_pool() -> ProcessPoolExecutor:
+    # one pool per process, shared by all runs
+    return ProcessPoolExecutor(max_workers=compute_settings.LOCAL_COMPUTE_WORKERS)
+
+
+def get_compute_backend(redis_client: RedisClient) -> ComputeBackend:
+    """
+    Compute backend selected in ComputeSettings, a new one per run
+    """
+    if compute_settings.COMPUTE_BACKEND == ComputeBackendType.LOCAL:
+        return LocalComputeBackend(
+            pool=get_process_pool(),
+            write_batch_size=compute_settings.LOCAL_WRITE_BATCH_SIZE,
+            quorum=batch_settings.COMPUTE_QUORUM,
+            leaderboard=get_leaderboard(),
+        )
+    return CeleryComputeBackend(
+        redis_client=redis_client,
+        cache_policy=get_cache_policy(),
+        change_detector=get_change_detector(),
+    )
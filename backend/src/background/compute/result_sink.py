@@ -0,0 +1,260 @@
+import json
+import logging
+import os
+import socket
+from datetime import datetime
+from functools import lru_cache
+
+import numpy as np
+import redis
+from background.db.celery import save_computes_mark_complete_many
+from background.db.spread_series import save_spread_series
+from background.db.user_api import get_computed_spreads_by_id
+from config.config import ComputeSettings, SpreadStatsSettings
+from data_manipulation.spread_object import SERIES_DTYPE
+from services.cache_keys import result_flush_key, result_stream_key
+from services.caching import RedisClient
+from services.leaderboard import Leaderboard
+from services.tracing import span
+from sqlalchemy.orm import Session
+from utils.dependencies.dependencies import get_leaderboard, get_redis_client
+
+logger = logging.getLogger(__name__)
+
+CONSUMER_GROUP = "writers"
+
+
+class ResultSink:
+    """
+    Buffers computed spreads in a redis stream, written to postgres in batches
+
+    A flush is one multi-row upsert and one set-based status update for up to
+    @batch_size results, plus one COPY of their spread series per interval.
+    Entries are acked only after the commit, so a dead flusher's results are written
+    again by the next one. Writes are idempotent upserts per crypto (series skip stored
+    candles), a redelivered result has the same effect as one written once
+    """
+
+    def __init__(
+        self,
+        redis_client: RedisClient,
+        batch_size: int,
+        flush_ms: int,
+        claim_idle_ms: int,
+        series_retention_days: int,
+        leaderboard: Leaderboard | None = None,
+    ) -> None:
+        self.redis_client = redis_client
+        self.batch_size = batch_size
+        self.flush_ms = flush_ms
+        self.claim_idle_ms = claim_idle_ms
+        self.series_retention_days = series_retention_days
+        self.leaderboard = leaderboard
+        self.consumer = f"{socket.gethostname()}-{os.getpid()}"
+        self._group_ready = False
+
+    def add(
+        self,
+        crypto_id: int,
+        computed_spread: dict,
+        interval: str,
+        run_id: str,
+        series: np.ndarray | None = None,
+    ) -> float | None:
+        """
+        Append a result and its @series (SERIES_DTYPE rows, stored raw),
+        returns seconds until a flush has to run, or None if one is scheduled already
+        """
+        client = self.redis_client.client
+        pipe = client.pipeline(transaction=False)
+        pipe.xadd(
+            result_stream_key(),
+            {
+                "crypto_id": crypto_id,
+                "interval": interval,
+                "run_id": run_id,
+                "spread": json.dumps(computed_spread, default=_to_json),
+                "series": b"" if series is None else series.tobytes(),
+            },
+        )
+        pipe.xlen(result_stream_key())
+        _, pending = pipe.execute()
+
+        return self._schedule(countdown_ms=0 if pending >= self.batch_size else self.flush_ms)
+
+    def flush(self, session: Session) -> int:
+        """
+        Write everything in the stream, @batch_size results per transaction
+
+        Results added from now on schedule a flush of their own
+        """
+        self.redis_client.client.delete(f"{result_flush_key()}:timer")
+        self._ensure_group()
+        # a failed flush of this process left its entries pending
+        written = self._flush_entries(session, self._read_own_pending())
+        written += self._flush_entries(session, self._claim_stale())
+        while True:
+            entries = self._read_new()
+            if not entries:
+                return written
+            written += self._flush_entries(session, entries)
+
+    def reschedule(self) -> float | None:
+        """
+        Seconds until the next flush if results are left in the stream, e.g. after a failed
+        flush. None if there are none, or a flush is scheduled already
+        """
+        if not self.redis_client.client.xlen(result_stream_key()):
+            return None
+        return self._schedule(countdown_ms=self.flush_ms)
+
+    def _schedule(self, countdown_ms: int) -> float | None:
+        # one scheduled flush at a time, a full batch schedules another one right away
+        flag = f"{result_flush_key()}:{'full' if not countdown_ms else 'timer'}"
+        if not self.redis_client.client.set(flag, 1, nx=True, px=max(countdown_ms, 100)):
+            return None
+        return countdown_ms / 1000
+
+    def _flush_entries(self, session: Session, entries: list[tuple[bytes, dict]]) -> int:
+        if not entries:
+            return 0
+
+        # retried computes can show up twice, the newest result wins
+        computed_spreads: dict[int, dict] = {}
+        intervals: dict[int, str] = {}
+        # series of different computes of a crypto cover different candles, all are kept
+        series: dict[str, dict[int, list[np.ndarray]]] = {}
+        # status rows are per run, one status update per run (and its interval) in the batch
+        runs: dict[tuple[str, str], dict[int, dict]] = {}
+        for _, fields in entries:
+            crypto_id = int(fields[b"crypto_id"])
+            computed_spreads[crypto_id] = _from_json(json.loads(fields[b"spread"]))
+            intervals[crypto_id] = fields[b"interval"].decode()
+            run_id = fields.get(b"run_id", b"").decode()
+            run_spreads = runs.setdefault((run_id, intervals[crypto_id]), {})
+            run_spreads[crypto_id] = computed_spreads[crypto_id]
+            if fields.get(b"series"):
+                crypto_series = series.setdefault(intervals[crypto_id], {})
+                crypto_series.setdefault(crypto_id, []).append(
+                    np.frombuffer(fields[b"series"], dtype=SERIES_DTYPE)
+                )
+
+        with span("save_computes_mark_complete_many", spreads=len(computed_spreads)):
+            for (run_id, interval), run_spreads in runs.items():
+                save_computes_mark_complete_many(
+                    session=session, computed_spreads=run_spreads, run_id=run_id, interval=interval
+                )
+        for interval, interval_series in series.items():
+            save_spread_series(
+                session=session,
+                interval=interval,
+                series={
+                    crypto_id: np.concatenate(arrays)
+                    for crypto_id, arrays in interval_series.items()
+                },
+                retention_days=self.series_retention_days,
+            )
+
+        entry_ids = [entry_id for entry_id, _ in entries]
+        pipe = self.redis_client.client.pipeline(transaction=False)
+        pipe.xack(result_stream_key(), CONSUMER_GROUP, *entry_ids)
+        pipe.xdel(result_stream_key(), *entry_ids)
+        pipe.execute()
+        logger.info(f"Flushed {len(computed_spreads)} computed spreads")
+
+        self._record_leaderboard(
+            session=session, computed_spreads=computed_spreads, intervals=intervals
+        )
+        return len(computed_spreads)
+
+    def _record_leaderboard(
+        self, session: Session, computed_spreads: dict[int, dict], intervals: dict[int, str]
+    ) -> None:
+        if not self.leaderboard:
+            return
+
+        for interval in set(intervals.values()):
+            saved_ids = [
+                crypto_id
+                for crypto_id, spread in computed_spreads.items()
+                if spread and intervals[crypto_id] == interval
+            ]
+            self.leaderboard.record(
+                interval=interval,
+                spreads=get_computed_spreads_by_id(
+                    session=session, crypto_ids=saved_ids, interval=interval
+                ),
+            )
+
+    def _read_new(self) -> list[tuple[bytes, dict]]:
+        response = self.redis_client.client.xreadgroup(
+            CONSUMER_GROUP, self.consumer, {result_stream_key(): ">"}, count=self.batch_size
+        )
+        return response[0][1] if response else []
+
+    def _read_own_pending(self) -> list[tuple[bytes, dict]]:
+        response = self.redis_client.client.xreadgroup(
+            CONSUMER_GROUP, self.consumer, {result_stream_key(): "0"}, count=self.batch_size
+        )
+        if not response:
+            return []
+        # entries deleted meanwhile come back empty
+        return [(entry_id, fields) for entry_id, fields in response[0][1] if fields]
+
+    def _claim_stale(self) -> list[tuple[bytes, dict]]:
+        _, entries, *_ = self.redis_client.client.xautoclaim(
+            result_stream_key(),
+            CONSUMER_GROUP,
+            self.consumer,
+            min_idle_time=self.claim_idle_ms,
+            count=self.batch_size,
+        )
+        # entries deleted meanwhile come back empty
+        return [(entry_id, fields) for entry_id, fields in entries if fields]
+
+    def _ensure_group(self) -> None:
+        if self._group_ready:
+            return
+        try:
+            self.redis_client.client.xgroup_create(
+                result_stream_key(), CONSUMER_GROUP, id="0", mkstream=True
+            )
+        except redis.ResponseError as e:
+            if "BUSYGROUP" not in str(e):
+                raise
+        self._group_ready = True
+
+
+@lru_cache()
+def get_result_sink() -> ResultSink | None:
+    settings = ComputeSettings()
+    if not settings.RESULT_SINK_ENABLED:
+        return None
+    return ResultSink(
+        redis_client=get_redis_client(),
+        batch_size=settings.RESULT_BATCH_SIZE,
+        flush_ms=settings.RESULT_FLUSH_MS,
+        claim_idle_ms=settings.RESULT_CLAIM_IDLE_MS,
+        series_retention_days=SpreadStatsSettings().SPREAD_SERIES_RETENTION_DAYS,
+        leaderboard=get_leaderboard(),
+    )
+
+
+def _to_json(value: object) -> object:
+    # pandas timestamps and numpy scalars straight from the compute
+    if isinstance(value, datetime):
+        return {"__datetime__": value.isoformat()}
+    if isinstance(value, np.generic):
+        return value.item()
+    raise TypeError(f"Can't serialize {type(value)}")
+
+
+def _from_json(computed_spread: dict) -> dict:
+    return {
+        column: (
+            datetime.fromisoformat(value["__datetime__"])
+            if isinstance(value, dict) and "__datetime__" in value
+            else value
+        )
+        for column, value in computed_spread.items()
+    }
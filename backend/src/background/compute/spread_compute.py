@@ -0,0 +1,151 @@
+import logging
+
+import numpy as np
+import pandas as pd
+from config.config import AlignmentSettings, SpreadStatsSettings
+from data_manipulation.incremental_spread import SpreadState
+from data_manipulation.spread_object import SERIES_DTYPE, Spread, series_rows
+from data_manipulation.timeframes_equalizer import TimeframeSynchronizer
+
+logger = logging.getLogger(__name__)
+stats_settings = SpreadStatsSettings()
+alignment_settings = AlignmentSettings()
+
+
+def compute_spread(
+    crypto_id: int, ohlc_grouped: list[list[list[float]] | np.ndarray], ce_ids: list[int]
+) -> dict:
+    """
+    Align ohlc of one crypto across exchanges and compute its max spread with statistics
+
+    Shared task code of every compute backend,
+    has to stay a picklable module level function for process pools
+
+    @ce_ids must be in the same order as @ohlc_grouped
+    """
+    computed_spread, _ = compute_spread_with_series(
+        crypto_id=crypto_id, ohlc_grouped=ohlc_grouped, ce_ids=ce_ids
+    )
+    return computed_spread
+
+
+def compute_spread_with_series(
+    crypto_id: int, ohlc_grouped: list[list[list[float]] | np.ndarray], ce_ids: list[int]
+) -> tuple[dict, np.ndarray]:
+    """
+    Same as compute_spread, plus the spread of every closed candle as SERIES_DTYPE rows
+
+    Max spread and statistics cover the whole fetched history, vectorized on the Spread
+    """
+    spread = _spread(
+        crypto_id=crypto_id, ohlc_grouped=ohlc_grouped, ce_ids=ce_ids, alignment=alignment_settings
+    )
+    if spread is None:
+        return {}, np.empty(0, dtype=SERIES_DTYPE)
+
+    computed_spread = {
+        **spread.get_max_spread(),
+        **spread.get_statistics(
+            windows=stats_settings.ROLLING_WINDOWS,
+            persistence_threshold=stats_settings.PERSISTENCE_THRESHOLD,
+        ),
+    }
+    # the newest candle may still be open, same as in the incremental path
+    return computed_spread, series_rows(spread.spreads_df.iloc[:-1])
+
+
+def compute_spread_incremental(
+    crypto_id: int,
+    ohlc_grouped: list[list[list[float]] | np.ndarray],
+    ce_ids: list[int],
+    state: SpreadState | None,
+    stats: SpreadStatsSettings | None = None,
+    alignment: AlignmentSettings | None = None,
+) -> tuple[dict, SpreadState | None, np.ndarray]:
+    """
+    Same as compute_spread, but only candles newer than @state are aligned and folded in
+
+    Without a matching state (none yet, other exchanges, other window) it's built
+    from the full history. The newest aligned candle may still be open,
+    it's part of the result but never folded, so it's picked up again once closed.
+    Folded candles are returned as SERIES_DTYPE rows too.
+    Max spread and statistics cover the newest SPREAD_WINDOW_CANDLES candles only
+
+    @stats and @alignment override the configured settings, e.g. for replays
+    """
+    stats = stats or stats_settings
+    if (
+        state is None
+        or state.ce_ids != ce_ids
+        or state.max_candles != stats.SPREAD_WINDOW_CANDLES
+        or state.last_time is None
+    ):
+        state = SpreadState(ce_ids=ce_ids, max_candles=stats.SPREAD_WINDOW_CANDLES)
+        new_ohlc = ohlc_grouped
+    else:
+        new_ohlc = [_candles_after(ohlc, state.last_time) for ohlc in ohlc_grouped]
+
+    spreads_df = _spreads_frame(
+        crypto_id=crypto_id,
+        ohlc_grouped=new_ohlc,
+        ce_ids=ce_ids,
+        alignment=alignment or alignment_settings,
+    )
+    if spreads_df.empty and state.last_time is None:
+        return {}, None, np.empty(0, dtype=SERIES_DTYPE)
+
+    state.fold(spreads_df.iloc[:-1])
+    tail = spreads_df.iloc[-1:]
+    logger.info(f"Folded {max(len(spreads_df) - 1, 0)} candles for crypto {crypto_id}")
+
+    return (
+        {
+            **state.max_spread(tail=tail),
+            **state.statistics(
+                windows=stats.ROLLING_WINDOWS,
+                persistence_threshold=stats.PERSISTENCE_THRESHOLD,
+                tail=tail,
+            ),
+        },
+        state,
+        series_rows(spreads_df.iloc[:-1]),
+    )
+
+
+def _spreads_frame(
+    crypto_id: int,
+    ohlc_grouped: list[list[list[float]] | np.ndarray],
+    ce_ids: list[int],
+    alignment: AlignmentSettings,
+) -> pd.DataFrame:
+    spread = _spread(
+        crypto_id=crypto_id, ohlc_grouped=ohlc_grouped, ce_ids=ce_ids, alignment=alignment
+    )
+    return pd.DataFrame() if spread is None else spread.spreads_df
+
+
+def _spread(
+    crypto_id: int,
+    ohlc_grouped: list[list[list[float]] | np.ndarray],
+    ce_ids: list[int],
+    alignment: AlignmentSettings,
+) -> Spread | None:
+    # an exchange without new candles means no new aligned candles at all
+    if any(len(ohlc) == 0 for ohlc in ohlc_grouped):
+        return None
+
+    synchronizer = TimeframeSynchronizer(
+        tolerance_ms=alignment.ALIGN_TOLERANCE_MS,
+        ffill_limit=alignment.ALIGN_FFILL_LIMIT,
+    )
+    dataframes_grouped = synchronizer.sync_many(ohlc_grouped)
+    logger.info(f"Alignment coverage for crypto {crypto_id}: {synchronizer.coverage}")
+    if dataframes_grouped[0].empty:
+        return None
+
+    return Spread(raw_frames=dataframes_grouped, ce_ids=ce_ids)
+
+
+def _candles_after(ohlc: list[list[float]] | np.ndarray, time: int) -> np.ndarray:
+    array = np.asarray(ohlc, dtype=np.float64)
+    return array[array[:, 0] > time]
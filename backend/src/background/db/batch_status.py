@@ -1,40 +1,149 @@
+from datetime import UTC, datetime, timedelta
+
+from background.db.db_pairs import arbitrable_rows_subquery
+from config.config import CacheSettings, FetchStatus
 from domain.models import BatchStatus
 from services.db_session import DBSessionDep
-from sqlalchemy import insert, update
+from services.metrics import timed_db
+from sqlalchemy import case, delete, false, insert, literal, select, update
+
+cache_settings = CacheSettings()
 
 
+@timed_db
 def init_batch_status(
     session: DBSessionDep,
-    ids_by_exchange: list[int],
-    crypto_ids: list[int],
+    threshold: int,
     interval: str,
+    run_id: str,
 ) -> None:
     """
-    Initialize batch status table
-    """
-    db_readable_dict = [
-        {
-            "id": id_by_exchange,
-            "crypto_id": crypto_id,
-            "interval": interval,
-            "saved_cache": False,
-            "difference_found": False,
-            "saved_db": False,
-        }
-        for id_by_exchange, crypto_id in zip(ids_by_exchange, crypto_ids, strict=True)
-    ]
-    stmt = insert(BatchStatus).values(db_readable_dict)
+    Initialize the batch status rows of run @run_id
+
+    Set-based INSERT ... SELECT, arbitrable rows never leave postgres.
+    Rows of previous runs with the same interval and threshold are dropped
+    in the same transaction, once they're older than CACHE_PIN_MAX_TTL.
+    A previous run's computes may still be queued after it released admission,
+    but never outlive its pinned ohlc. Runs of other intervals / thresholds keep their rows
+    """
+    cutoff = datetime.now(UTC) - timedelta(seconds=cache_settings.CACHE_PIN_MAX_TTL)
+    session.execute(
+        delete(BatchStatus).where(
+            BatchStatus.interval == interval,
+            BatchStatus.threshold == threshold,
+            BatchStatus.run_id != run_id,
+            BatchStatus.created_at < cutoff,
+        )
+    )
+
+    arbitrable = arbitrable_rows_subquery(threshold)
+    stmt = insert(BatchStatus).from_select(
+        [
+            "run_id",
+            "id",
+            "crypto_id",
+            "interval",
+            "threshold",
+            "saved_cache",
+            "difference_found",
+            "saved_db",
+        ],
+        select(
+            literal(run_id),
+            arbitrable.c.id,
+            arbitrable.c.crypto_id,
+            literal(interval),
+            literal(threshold),
+            false(),
+            false(),
+            false(),
+        ),
+    )
     session.execute(stmt)
     session.commit()
 
 
+@timed_db
 def update_batch_status_cached(
     session: DBSessionDep,
     ce_ids: list[int],
+    run_id: str,
 ) -> None:
     """
     Update status field for cache
     """
-    stmt = update(BatchStatus).where(BatchStatus.id.in_(ce_ids)).values({"saved_cache": True})
+    stmt = (
+        update(BatchStatus)
+        .where(BatchStatus.run_id == run_id, BatchStatus.id.in_(ce_ids))
+        .values({"saved_cache": True})
+    )
     session.execute(stmt)
     session.commit()
+
+
+@timed_db
+def update_batch_fetch_status(
+    session: DBSessionDep,
+    fetch_statuses: dict[int, FetchStatus],
+    run_id: str,
+) -> None:
+    """
+    Record the fetch outcome per crypto / exchange id
+
+    One UPDATE for the whole chunk, status is picked with a CASE on the id
+    """
+    if not fetch_statuses:
+        return
+
+    stmt = (
+        update(BatchStatus)
+        .where(BatchStatus.run_id == run_id, BatchStatus.id.in_(list(fetch_statuses)))
+        .values(fetch_status=case(fetch_statuses, value=BatchStatus.id))
+    )
+    session.execute(stmt)
+    session.commit()
+
+
+@timed_db
+def mark_pending_failed(session: DBSessionDep, ce_ids: list[int], run_id: str) -> None:
+    """
+    Fetches of @ce_ids which never got an outcome failed, e.g. their chunk crashed
+    """
+    stmt = (
+        update(BatchStatus)
+        .where(
+            BatchStatus.run_id == run_id,
+            BatchStatus.id.in_(ce_ids),
+            BatchStatus.fetch_status == FetchStatus.PENDING,
+        )
+        .values(fetch_status=FetchStatus.FAILED)
+    )
+    session.execute(stmt)
+    session.commit()
+
+
+@timed_db
+def mark_refetched_for_recompute(session: DBSessionDep, ce_id: int, run_id: str) -> None:
+    """
+    A retried fetch succeeded, its crypto is computed again with one more exchange
+    """
+    stmt_cached = (
+        update(BatchStatus)
+        .where(BatchStatus.run_id == run_id, BatchStatus.id == ce_id)
+        .values(fetch_status=FetchStatus.OK, saved_cache=True)
+    )
+    session.execute(stmt_cached)
+
+    crypto_id_subq = select(BatchStatus.crypto_id).where(
+        BatchStatus.run_id == run_id, BatchStatus.id == ce_id
+    )
+    stmt_recompute = (
+        update(BatchStatus)
+        .where(
+            BatchStatus.run_id == run_id,
+            BatchStatus.crypto_id == crypto_id_subq.scalar_subquery(),
+        )
+        .values(difference_found=False)
+    )
+    session.execute(stmt_recompute)
+    session.commit()
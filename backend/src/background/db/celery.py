@@ -1,47 +1,72 @@
+from config.config import FetchStatus
 from domain.models import BatchStatus, ComputedSpreadMax
-from sqlalchemy import and_, func, select, update
+from services.metrics import timed_db
+from sqlalchemy import and_, func, or_, select, update
 from sqlalchemy.dialects.postgresql import insert as upsert
 from sqlalchemy.orm import Session
 
 
-def get_ce_ids_by_crypto_id(session: Session, crypto_id: int) -> list[int]:
+@timed_db
+def get_ce_ids_by_crypto_id(session: Session, crypto_id: int, run_id: str) -> list[int]:
     """
     Get all crypto with exchange ids
 
-    From status table, based on unique crypto id
+    From status rows of run @run_id, based on unique crypto id
 
     No filtering applied!
     """
 
-    stmt = select(BatchStatus.id).where(BatchStatus.crypto_id == crypto_id)
+    stmt = select(BatchStatus.id).where(
+        BatchStatus.run_id == run_id, BatchStatus.crypto_id == crypto_id
+    )
     return list(session.execute(stmt).scalars().all())
 
 
-def scan_available_ohlc(session: Session, dtos_ids: list[int]) -> list[int]:
+@timed_db
+def scan_available_ohlc(
+    session: Session, dtos_ids: list[int], quorum: int, run_id: str
+) -> list[int]:
     """
-    Get all cached unique crypto ids where ALL exchanges have been cached.
+    Get all unique crypto ids where ALL exchanges have settled
+    and at least @quorum of them have been cached.
 
     First extracts unique crypto_ids from the provided dtos_ids batch,
-    then checks if ALL exchanges for those cryptos are cached (not just the ones in current batch).
+    then checks ALL exchanges for those cryptos (not just the ones in current batch).
 
     This solves the edge case where OHLC for the same crypto is split across batches.
 
+    Settled means the fetch failed, is unsupported, or succeeded and got cached.
+    So one failing exchange doesn't strand the whole crypto.
+
     Additionally filters out already-computed cryptos (difference_found=True) to prevent
     multiple worker chains from computing the same crypto when tasks execute out of order.
+
+    Only status rows of run @run_id are looked at
     """
     # Step 1: Get unique crypto_ids from the current batch
-    crypto_ids_subq = select(BatchStatus.crypto_id).where(BatchStatus.id.in_(dtos_ids)).distinct()
+    crypto_ids_subq = (
+        select(BatchStatus.crypto_id)
+        .where(BatchStatus.run_id == run_id, BatchStatus.id.in_(dtos_ids))
+        .distinct()
+    )
 
-    # Step 2: For each crypto_id, check if ALL its exchanges are cached
+    fetched = BatchStatus.fetch_status == FetchStatus.OK
+    cached = and_(fetched, BatchStatus.saved_cache)
+    settled = and_(
+        BatchStatus.fetch_status != FetchStatus.PENDING,
+        or_(~fetched, BatchStatus.saved_cache),
+    )
+
+    # Step 2: For each crypto_id, check if ALL its exchanges settled, enough are cached
     # AND none have been marked as computed yet
     stmt = (
         select(BatchStatus.crypto_id)
-        .where(BatchStatus.crypto_id.in_(crypto_ids_subq))
+        .where(BatchStatus.run_id == run_id, BatchStatus.crypto_id.in_(crypto_ids_subq))
         .group_by(BatchStatus.crypto_id)
         .having(
             and_(
-                # All exchanges for this crypto must have saved_cache=True
-                func.bool_and(BatchStatus.saved_cache) == True,  # noqa: E712
+                func.bool_and(settled) == True,  # noqa: E712
+                func.count().filter(cached) >= quorum,
                 func.bool_and(BatchStatus.difference_found) == False,  # noqa: E712
             )
         )
@@ -51,31 +76,77 @@ def scan_available_ohlc(session: Session, dtos_ids: list[int]) -> list[int]:
     return list(result_ids)
 
 
+@timed_db
 def save_compute_mark_complete(
     session: Session,
     crypto_id: int,
     computed_spread: dict,
+    run_id: str,
+    interval: str,
 ) -> None:
     """
     Insert rows with computed ohlc straight from pandas
     Uses UPSERT (ON CONFLICT) to handle race conditions when multiple workers
     try to compute the same crypto_id simultaneously.
+
+    An empty @computed_spread only marks the crypto as done (in run @run_id)
     """
-    values_with_id = {"id": crypto_id, **computed_spread}
-
-    stmt_insert = (
-        upsert(ComputedSpreadMax)
-        .values(values_with_id)
-        .on_conflict_do_update(
-            index_elements=["id"],
-            set_=computed_spread,  # Update with new spread data if already exists
+    if computed_spread:
+        computed_spread = {**computed_spread, "interval": interval}
+        values_with_id = {"id": crypto_id, **computed_spread}
+
+        stmt_insert = (
+            upsert(ComputedSpreadMax)
+            .values(values_with_id)
+            .on_conflict_do_update(
+                index_elements=["id", "interval"],
+                set_=computed_spread,  # Update with new spread data if already exists
+            )
         )
+        session.execute(stmt_insert)
+        session.flush()
+
+    stmt_update_status = (
+        update(BatchStatus)
+        .where(BatchStatus.run_id == run_id, BatchStatus.crypto_id == crypto_id)
+        .values(difference_found=True)
     )
-    session.execute(stmt_insert)
+    session.execute(stmt_update_status)
+    session.commit()
+
+
+@timed_db
+def save_computes_mark_complete_many(
+    session: Session, computed_spreads: dict[int, dict], run_id: str, interval: str
+) -> None:
+    """
+    Same as save_compute_mark_complete, but for many cryptos at once
+
+    One multi-row UPSERT per set of computed columns and one status UPDATE,
+    instead of a transaction per crypto. Partial computes (e.g. without stats)
+    only update their own columns, like save_compute_mark_complete does.
+    Keys of @computed_spreads are crypto ids
+    """
+    # empty computes have nothing to upsert, time is NOT NULL
+    rows_by_columns: dict[tuple[str, ...], list[dict]] = {}
+    for crypto_id, computed_spread in computed_spreads.items():
+        if computed_spread:
+            row = {"id": crypto_id, **computed_spread, "interval": interval}
+            rows_by_columns.setdefault(tuple(sorted(row)), []).append(row)
+
+    for columns, rows in rows_by_columns.items():
+        stmt_insert = upsert(ComputedSpreadMax).values(rows)
+        stmt_insert = stmt_insert.on_conflict_do_update(
+            index_elements=["id", "interval"],
+            set_={column: stmt_insert.excluded[column] for column in columns if column != "id"},
+        )
+        session.execute(stmt_insert)
     session.flush()
 
     stmt_update_status = (
-        update(BatchStatus).where(BatchStatus.crypto_id == crypto_id).values(difference_found=True)
+        update(BatchStatus)
+        .where(BatchStatus.run_id == run_id, BatchStatus.crypto_id.in_(list(computed_spreads)))
+        .values(difference_found=True)
     )
     session.execute(stmt_update_status)
     session.commit()
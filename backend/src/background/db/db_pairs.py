@@ -1,14 +1,16 @@
 import logging
-from typing import Tuple
+from typing import Iterator, Tuple
 
 from domain.models import CryptoPairName, SupportedExchangesByCrypto
 from services.db_session import DBSessionDep
-from sqlalchemy import Row, Sequence, func, select
+from services.metrics import timed_db
+from sqlalchemy import Row, Subquery, func, select
 from sqlalchemy.dialects.postgresql import insert as upsert
 
 logger = logging.getLogger(__name__)
 
 
+@timed_db
 def insert_or_update_pairs(pairs: list[str], session: DBSessionDep) -> None:
     """
     Inserts or updates pairs.
@@ -24,6 +26,7 @@ def insert_or_update_pairs(pairs: list[str], session: DBSessionDep) -> None:
     session.commit()
 
 
+@timed_db
 def insert_exchange_names(exchange_name: str, crypto_ids: list[str], session: DBSessionDep) -> None:
     """
     Inserts a row with a crypto id and the corresponding
@@ -54,49 +57,58 @@ def insert_exchange_names(exchange_name: str, crypto_ids: list[str], session: DB
         logger.exception(msg)
 
 
-def get_arbitrable_rows(threshold: int, session: DBSessionDep) -> list[SupportedExchangesByCrypto]:
+def arbitrable_rows_subquery(threshold: int) -> Subquery:
     """
-    Find all pairs with at least @threshold available exchanges
+    All crypto / exchange rows of pairs with at least @threshold available exchanges
 
-    Returns
-    ____
-    The list of all crypto ids found
+    Threshold is applied with a window function, so it's a single scan
+    instead of a GROUP BY followed by a huge IN (...) list
     """
-    stmt = (
-        select(SupportedExchangesByCrypto.crypto_id)
-        .group_by(
-            SupportedExchangesByCrypto.crypto_id,
-        )
-        .having(func.count(SupportedExchangesByCrypto.crypto_id) >= threshold)
+    exchanges_count = (
+        func.count()
+        .over(partition_by=SupportedExchangesByCrypto.crypto_id)
+        .label("exchanges_count")
     )
-    result = session.execute(stmt).scalars().all()
-
-    stmt = select(SupportedExchangesByCrypto).where(
-        SupportedExchangesByCrypto.crypto_id.in_(result)
+    counted = select(
+        SupportedExchangesByCrypto.id,
+        SupportedExchangesByCrypto.crypto_id,
+        SupportedExchangesByCrypto.supported_exchange,
+        exchanges_count,
+    ).subquery()
+
+    return (
+        select(counted.c.id, counted.c.crypto_id, counted.c.supported_exchange)
+        .where(counted.c.exchanges_count >= threshold)
+        .subquery()
     )
-    return session.execute(stmt).scalars().all()
 
 
-def get_params_for_crypto_dto(
-    ids_list: list[int], session: DBSessionDep
-) -> Sequence[Row[Tuple[int, str, str]]]:
+@timed_db
+def stream_params_for_crypto_dto(
+    threshold: int, session: DBSessionDep, yield_per: int
+) -> Iterator[Row[Tuple[int, int, str, str]]]:
     """
-    Returns tuples in following order:
+    Stream tuples in following order, through a server-side cursor:
+
+    ID, crypto ID, name, supported exchange
 
-    ID, name, supported exchange
+    Only @yield_per rows are held in memory at once.
+    The session shouldn't be committed while streaming, it closes the cursor
     """
+    arbitrable = arbitrable_rows_subquery(threshold)
     stmt = (
         select(
-            SupportedExchangesByCrypto.id,
+            arbitrable.c.id,
+            arbitrable.c.crypto_id,
             CryptoPairName.crypto_name,
-            SupportedExchangesByCrypto.supported_exchange,
+            arbitrable.c.supported_exchange,
         )
-        .join(CryptoPairName, CryptoPairName.id == SupportedExchangesByCrypto.crypto_id)
-        .where(SupportedExchangesByCrypto.id.in_(ids_list))
+        .join(CryptoPairName, CryptoPairName.id == arbitrable.c.crypto_id)
         # the order in which the ids are returned is very important
-        # we must order by id to have different exchanges for an id first
+        # we must order by crypto id to have different exchanges for an id first
         # otherwise we'll have all crypto pairs for one exchange only first
         # which isn't useful if we're comparing ohlc between different exchanges
-        .order_by(CryptoPairName.id)
+        .order_by(arbitrable.c.crypto_id, arbitrable.c.id)
+        .execution_options(yield_per=yield_per)
     )
-    return session.execute(stmt).all()
+    yield from session.execute(stmt)
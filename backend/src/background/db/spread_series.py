@@ -0,0 +1,281 @@
+import io
+from datetime import UTC, datetime, timedelta
+
+import numpy as np
+from domain.models import CryptoPairName, SpreadSeries, SupportedExchangesByCrypto
+from services.db_session import DBSessionDep
+from services.metrics import timed_db
+from sqlalchemy import select, text
+
+# binary COPY framing, see "COPY ... Binary Format" in the postgres docs
+COPY_HEADER = b"PGCOPY\n\xff\r\n\x00" + bytes(8)
+COPY_TRAILER = b"\xff\xff"
+# binary timestamps are microseconds since 2000-01-01
+PG_EPOCH_MS = 946_684_800_000
+
+COPY_COLUMNS = [
+    "crypto_id",
+    "interval",
+    "time",
+    "spread_percent",
+    "high_exchange_id",
+    "low_exchange_id",
+]
+STAGING_TABLE = "spread_series_staging"
+
+# spread_series columns read back with COPY TO, all of them fixed width and NOT NULL
+EXPORT_DTYPE = np.dtype(
+    [
+        ("fields", ">i2"),
+        ("crypto_id_size", ">i4"),
+        ("crypto_id", ">i4"),
+        ("time_size", ">i4"),
+        ("time", ">i8"),
+        ("spread_percent_size", ">i4"),
+        ("spread_percent", ">f4"),
+        ("high_exchange_id_size", ">i4"),
+        ("high_exchange_id", ">i4"),
+        ("low_exchange_id_size", ">i4"),
+        ("low_exchange_id", ">i4"),
+    ]
+)
+
+# partitions this process already made sure of
+_known_partitions: set[str] = set()
+
+
+@timed_db
+def save_spread_series(
+    session: DBSessionDep, interval: str, series: dict[int, np.ndarray], retention_days: int
+) -> int:
+    """
+    Append spread series of many cryptos in one COPY
+
+    @series values are SERIES_DTYPE arrays keyed by crypto id.
+    Rows go through a temp staging table, so already stored candles
+    (e.g. a full recompute after a lost spread state) are skipped instead of failing the COPY.
+    Candles older than the retention are never written, their partition may be gone
+
+    Returns the amount of copied rows
+    """
+    cutoff_ms = int((datetime.now(UTC) - timedelta(days=retention_days)).timestamp() * 1000)
+    series = {
+        crypto_id: rows[rows["time"] >= cutoff_ms]
+        for crypto_id, rows in series.items()
+        if rows.size
+    }
+    series = {crypto_id: rows for crypto_id, rows in series.items() if rows.size}
+    if not series:
+        return 0
+
+    all_times = np.concatenate([rows["time"] for rows in series.values()])
+    _ensure_partitions(session, start_ms=int(all_times.min()), end_ms=int(all_times.max()))
+
+    session.execute(
+        text(
+            f"CREATE TEMP TABLE IF NOT EXISTS {STAGING_TABLE} "
+            f"(LIKE {SpreadSeries.__tablename__}) ON COMMIT DELETE ROWS"
+        )
+    )
+    cursor = session.connection().connection.cursor()
+    cursor.copy_expert(
+        f"COPY {STAGING_TABLE} ({', '.join(COPY_COLUMNS)}) FROM STDIN WITH (FORMAT binary)",
+        io.BytesIO(_copy_payload(interval=interval, series=series)),
+    )
+    session.execute(
+        text(
+            f"INSERT INTO {SpreadSeries.__tablename__} SELECT * FROM {STAGING_TABLE} "
+            "ON CONFLICT DO NOTHING"
+        )
+    )
+    session.commit()
+    return len(all_times)
+
+
+@timed_db
+def copy_spread_series_out(
+    session: DBSessionDep, interval: str, crypto_ids: list[int]
+) -> np.ndarray:
+    """
+    Stored series of @crypto_ids, ordered by crypto and time
+
+    Read with a binary COPY straight into a numpy record array (EXPORT_DTYPE),
+    no python object per row. Times are microseconds since 2000-01-01, see to_unix_ms
+    """
+    if not crypto_ids:
+        return np.empty(0, dtype=EXPORT_DTYPE)
+
+    return copy_out(
+        session=session,
+        query="SELECT crypto_id, time, spread_percent, high_exchange_id, low_exchange_id "
+        f"FROM {SpreadSeries.__tablename__} "
+        "WHERE interval = %s AND crypto_id = ANY(%s) ORDER BY crypto_id, time",
+        params=(interval, crypto_ids),
+        dtype=EXPORT_DTYPE,
+    )
+
+
+def copy_out(session: DBSessionDep, query: str, params: tuple, dtype: np.dtype) -> np.ndarray:
+    """
+    Rows of @query read with a binary COPY into a numpy record array of @dtype
+
+    Every selected column has to be fixed width and NOT NULL, @dtype lists
+    the field count, then a size and a big endian value per column
+    """
+    buffer = io.BytesIO()
+    cursor = session.connection().connection.cursor()
+    query = cursor.mogrify(query, params).decode()
+    cursor.copy_expert(f"COPY ({query}) TO STDOUT WITH (FORMAT binary)", buffer)
+
+    payload = buffer.getbuffer()
+    # signature, flags, then a header extension of the given length
+    extension_size = int.from_bytes(payload[len(COPY_HEADER) - 4 : len(COPY_HEADER)], "big")
+    start = len(COPY_HEADER) + extension_size
+    return np.frombuffer(payload[start : len(payload) - len(COPY_TRAILER)], dtype=dtype)
+
+
+def to_unix_ms(pg_time: np.ndarray) -> np.ndarray:
+    return pg_time // 1000 + PG_EPOCH_MS
+
+
+@timed_db
+def get_series_crypto_ids(session: DBSessionDep, interval: str) -> list[int]:
+    stmt = (
+        select(SpreadSeries.crypto_id)
+        .where(SpreadSeries.interval == interval)
+        .distinct()
+        .order_by(SpreadSeries.crypto_id)
+    )
+    return list(session.execute(stmt).scalars().all())
+
+
+@timed_db
+def get_series_names(
+    session: DBSessionDep, crypto_ids: list[int]
+) -> tuple[dict[int, str], dict[int, str]]:
+    """
+    Crypto names by crypto id and exchange names by crypto exchange id, for @crypto_ids
+    """
+    crypto_names = session.execute(
+        select(CryptoPairName.id, CryptoPairName.crypto_name).where(
+            CryptoPairName.id.in_(crypto_ids)
+        )
+    ).all()
+    exchange_names = session.execute(
+        select(SupportedExchangesByCrypto.id, SupportedExchangesByCrypto.supported_exchange).where(
+            SupportedExchangesByCrypto.crypto_id.in_(crypto_ids)
+        )
+    ).all()
+    return dict(crypto_names), dict(exchange_names)
+
+
+@timed_db
+def drop_expired_partitions(session: DBSessionDep, retention_days: int) -> list[str]:
+    """
+    Drop monthly partitions whose whole range is older than @retention_days
+
+    Dropping a partition is instant, no row by row DELETE and no vacuum afterwards
+    """
+    cutoff = datetime.now(UTC) - timedelta(days=retention_days)
+    partitions = session.execute(
+        text(
+            "SELECT child.relname FROM pg_inherits "
+            "JOIN pg_class parent ON parent.oid = pg_inherits.inhparent "
+            "JOIN pg_class child ON child.oid = pg_inherits.inhrelid "
+            "WHERE parent.relname = :parent"
+        ),
+        {"parent": SpreadSeries.__tablename__},
+    ).scalars()
+
+    dropped = []
+    for name in partitions:
+        month_start = datetime.strptime(name.rsplit("_", 1)[-1], "%Y%m").replace(tzinfo=UTC)
+        if _next_month(month_start) <= cutoff:
+            session.execute(text(f"DROP TABLE IF EXISTS {name}"))
+            _known_partitions.discard(name)
+            dropped.append(name)
+
+    session.commit()
+    return dropped
+
+
+def _copy_payload(interval: str, series: dict[int, np.ndarray]) -> bytes:
+    """
+    Binary COPY tuples built as one numpy record array, no python object per row
+    """
+    interval_bytes = interval.encode()
+    tuple_dtype = np.dtype(
+        [
+            ("fields", ">i2"),
+            ("crypto_id_size", ">i4"),
+            ("crypto_id", ">i4"),
+            ("interval_size", ">i4"),
+            ("interval", f"S{len(interval_bytes)}"),
+            ("time_size", ">i4"),
+            ("time", ">i8"),
+            ("spread_percent_size", ">i4"),
+            ("spread_percent", ">f4"),
+            ("high_exchange_id_size", ">i4"),
+            ("high_exchange_id", ">i4"),
+            ("low_exchange_id_size", ">i4"),
+            ("low_exchange_id", ">i4"),
+        ]
+    )
+
+    tuples = np.empty(sum(rows.size for rows in series.values()), dtype=tuple_dtype)
+    tuples["fields"] = len(COPY_COLUMNS)
+    tuples["crypto_id_size"] = 4
+    tuples["interval_size"] = len(interval_bytes)
+    tuples["interval"] = interval_bytes
+    tuples["time_size"] = 8
+    tuples["spread_percent_size"] = 4
+    tuples["high_exchange_id_size"] = 4
+    tuples["low_exchange_id_size"] = 4
+
+    offset = 0
+    for crypto_id, rows in series.items():
+        chunk = tuples[offset : offset + rows.size]
+        chunk["crypto_id"] = crypto_id
+        chunk["time"] = (rows["time"] - PG_EPOCH_MS) * 1000
+        chunk["spread_percent"] = rows["spread_percent"]
+        chunk["high_exchange_id"] = rows["high_exchange_id"]
+        chunk["low_exchange_id"] = rows["low_exchange_id"]
+        offset += rows.size
+
+    return COPY_HEADER + tuples.tobytes() + COPY_TRAILER
+
+
+def _ensure_partitions(session: DBSessionDep, start_ms: int, end_ms: int) -> None:
+    month = _month_start(datetime.fromtimestamp(start_ms / 1000, UTC))
+    end = datetime.fromtimestamp(end_ms / 1000, UTC)
+
+    missing = []
+    while month <= end:
+        name = f"{SpreadSeries.__tablename__}_{month:%Y%m}"
+        if name not in _known_partitions:
+            missing.append((name, month))
+        month = _next_month(month)
+    if not missing:
+        return
+
+    # concurrent workers would race on CREATE ... IF NOT EXISTS
+    session.execute(
+        text("SELECT pg_advisory_xact_lock(hashtext(:name))"), {"name": "spread_series"}
+    )
+    for name, month in missing:
+        session.execute(
+            text(
+                f"CREATE TABLE IF NOT EXISTS {name} PARTITION OF {SpreadSeries.__tablename__} "
+                f"FOR VALUES FROM ('{month.isoformat()}') TO ('{_next_month(month).isoformat()}')"
+            )
+        )
+    session.commit()
+    _known_partitions.update(name for name, _ in missing)
+
+
+def _month_start(time: datetime) -> datetime:
+    return time.replace(day=1, hour=0, minute=0, second=0, microsecond=0)
+
+
+def _next_month(month: datetime) -> datetime:
+    return (month + timedelta(days=32)).replace(day=1)
@@ -1,21 +1,59 @@
-from domain.models import BatchStatus, ComputedSpreadMax, CryptoPairName, SupportedExchangesByCrypto
-from routes.models.schemas import ComputedSpreadResponse
+from datetime import datetime
+
+import numpy as np
+from background.db.spread_series import copy_out
+from domain.models import (
+    BatchStatus,
+    ComputedSpreadMax,
+    CryptoPairName,
+    SpreadSeries,
+    SupportedExchangesByCrypto,
+)
+from routes.models.schemas import ComputedSpreadResponse, SpreadOrdering, SpreadSeriesResponse
 from services.db_session import DBSessionDep
-from sqlalchemy import Integer, func, select
+from services.metrics import timed_db
+from sqlalchemy import Integer, Row, Select, func, select
 from sqlalchemy.orm import aliased
 from utils.dependencies.timestamp_norm import normalize_timestamp
 
+# computed_spread_max columns read back with COPY TO, see copy_out
+COMPUTED_EXPORT_DTYPE = np.dtype(
+    [
+        ("fields", ">i2"),
+        ("crypto_id_size", ">i4"),
+        ("crypto_id", ">i4"),
+        ("time_size", ">i4"),
+        ("time", ">i8"),
+        ("spread_percent_size", ">i4"),
+        ("spread_percent", ">f8"),
+        ("high_exchange_id_size", ">i4"),
+        ("high_exchange_id", ">i4"),
+        ("low_exchange_id_size", ">i4"),
+        ("low_exchange_id", ">i4"),
+        ("mean_spread_percent_size", ">i4"),
+        ("mean_spread_percent", ">f8"),
+        ("std_spread_percent_size", ">i4"),
+        ("std_spread_percent", ">f8"),
+        ("longest_run_above_size", ">i4"),
+        ("longest_run_above", ">i4"),
+        ("mean_revert_candles_size", ">i4"),
+        ("mean_revert_candles", ">f8"),
+    ]
+)
+
 
-def get_batch_status_counts(session: DBSessionDep) -> dict[str, int]:
+@timed_db
+def get_batch_status_counts(session: DBSessionDep, run_id: str | None) -> dict[str, int]:
     """
-    Get aggregate counts for batch processing status.
-    Returns dictionary with total, cached, and spreads_computed counts.
+    Get aggregate counts for batch processing status of run @run_id.
+    Returns dictionary with total, cached, and spreads_computed counts,
+    all zero without a run.
     """
     stmt = select(
         func.count(BatchStatus.id).label("total"),
         func.sum(func.cast(BatchStatus.saved_cache, Integer)).label("cached"),
         func.sum(func.cast(BatchStatus.difference_found, Integer)).label("spreads_computed"),
-    )
+    ).where(BatchStatus.run_id == run_id)
 
     result = session.execute(stmt).one()
 
@@ -26,38 +64,156 @@ def get_batch_status_counts(session: DBSessionDep) -> dict[str, int]:
     }
 
 
-def get_computed_spreads(session: DBSessionDep) -> list[ComputedSpreadResponse]:
+@timed_db
+def get_computed_spreads(
+    session: DBSessionDep,
+    interval: str,
+    order_by: SpreadOrdering = SpreadOrdering.SPREAD_PERCENT,
+) -> list[ComputedSpreadResponse]:
     """
-    Get all computed spreads with exchange names resolved.
+    Get all computed spreads of @interval with exchange names resolved.
     Returns list with crypto name, timestamp, spread percent, and exchange names.
+
+    Persistent opportunities can be ranked first with @order_by
+    """
+    stmt = (
+        _computed_spreads_select()
+        .where(ComputedSpreadMax.interval == interval)
+        .order_by(getattr(ComputedSpreadMax, order_by).desc().nulls_last())
+    )
+    results = session.execute(stmt).all()
+
+    return [_to_response(row) for row in results]
+
+
+@timed_db
+def get_computed_spreads_by_id(
+    session: DBSessionDep, crypto_ids: list[int] | None = None, interval: str | None = None
+) -> dict[int, ComputedSpreadResponse]:
+    """
+    Computed spreads with exchange names resolved, keyed by crypto id
+
+    All of them if no @crypto_ids are given. A crypto has a row per interval,
+    so leave out @interval only if a single one was computed
+    """
+    stmt = _computed_spreads_select()
+    if crypto_ids is not None:
+        stmt = stmt.where(ComputedSpreadMax.id.in_(crypto_ids))
+    if interval is not None:
+        stmt = stmt.where(ComputedSpreadMax.interval == interval)
+
+    return {row.crypto_id: _to_response(row) for row in session.execute(stmt).all()}
+
+
+@timed_db
+def get_computed_intervals(session: DBSessionDep) -> list[str]:
+    stmt = select(ComputedSpreadMax.interval).distinct().order_by(ComputedSpreadMax.interval)
+    return list(session.execute(stmt).scalars().all())
+
+
+@timed_db
+def copy_computed_spreads_out(
+    session: DBSessionDep, interval: str, after_id: int, limit: int
+) -> np.ndarray:
+    """
+    Up to @limit computed spreads of @interval with ids above @after_id, ordered by id
+
+    Read with a binary COPY into a COMPUTED_EXPORT_DTYPE record array, no python object
+    per row. Missing stats come back as NaN, a missing longest run as -1
     """
+    return copy_out(
+        session=session,
+        query="SELECT id, time, spread_percent::float8, high_exchange_id, low_exchange_id, "
+        "COALESCE(mean_spread_percent, 'NaN')::float8, "
+        "COALESCE(std_spread_percent, 'NaN')::float8, "
+        "COALESCE(longest_run_above, -1), "
+        "COALESCE(mean_revert_candles, 'NaN')::float8 "
+        f"FROM {ComputedSpreadMax.__tablename__} "
+        "WHERE interval = %s AND id > %s ORDER BY id LIMIT %s",
+        params=(interval, after_id, limit),
+        dtype=COMPUTED_EXPORT_DTYPE,
+    )
+
+
+def _computed_spreads_select() -> Select:
     # Create aliases for the two joins to SupportedExchangesByCrypto
     high_exchange = aliased(SupportedExchangesByCrypto)
     low_exchange = aliased(SupportedExchangesByCrypto)
 
-    stmt = (
+    return (
         select(
+            ComputedSpreadMax.id.label("crypto_id"),
+            ComputedSpreadMax.interval,
             CryptoPairName.crypto_name,
             ComputedSpreadMax.time,
             ComputedSpreadMax.spread_percent,
             high_exchange.supported_exchange.label("high_exchange"),
             low_exchange.supported_exchange.label("low_exchange"),
+            ComputedSpreadMax.mean_spread_percent,
+            ComputedSpreadMax.std_spread_percent,
+            ComputedSpreadMax.longest_run_above,
+            ComputedSpreadMax.mean_revert_candles,
+            ComputedSpreadMax.rolling_stats,
         )
         .join(CryptoPairName, ComputedSpreadMax.id == CryptoPairName.id)
         .join(high_exchange, ComputedSpreadMax.high_exchange_id == high_exchange.id)
         .join(low_exchange, ComputedSpreadMax.low_exchange_id == low_exchange.id)
-        .order_by(ComputedSpreadMax.spread_percent.desc())
     )
 
-    results = session.execute(stmt).all()
 
-    return [
-        ComputedSpreadResponse(
-            crypto_name=row.crypto_name,
-            time=normalize_timestamp(row.time),
-            spread_percent=row.spread_percent,
-            high_exchange=row.high_exchange,
-            low_exchange=row.low_exchange,
+def _to_response(row: Row) -> ComputedSpreadResponse:
+    return ComputedSpreadResponse(
+        crypto_name=row.crypto_name,
+        time=normalize_timestamp(row.time),
+        spread_percent=row.spread_percent,
+        high_exchange=row.high_exchange,
+        low_exchange=row.low_exchange,
+        mean_spread_percent=row.mean_spread_percent,
+        std_spread_percent=row.std_spread_percent,
+        longest_run_above=row.longest_run_above,
+        mean_revert_candles=row.mean_revert_candles,
+        rolling_stats=row.rolling_stats,
+    )
+
+
+@timed_db
+def get_spread_series(
+    session: DBSessionDep,
+    crypto_id: int,
+    interval: str,
+    since: datetime | None = None,
+    limit: int = 1000,
+) -> SpreadSeriesResponse:
+    """
+    Newest @limit stored candle spreads of a crypto, oldest first
+
+    Only candles at or after @since, if given
+    """
+    high_exchange = aliased(SupportedExchangesByCrypto)
+    low_exchange = aliased(SupportedExchangesByCrypto)
+
+    stmt = (
+        select(
+            SpreadSeries.time,
+            SpreadSeries.spread_percent,
+            high_exchange.supported_exchange.label("high_exchange"),
+            low_exchange.supported_exchange.label("low_exchange"),
         )
-        for row in results
-    ]
+        .join(high_exchange, SpreadSeries.high_exchange_id == high_exchange.id)
+        .join(low_exchange, SpreadSeries.low_exchange_id == low_exchange.id)
+        .where(SpreadSeries.crypto_id == crypto_id, SpreadSeries.interval == interval)
+        .order_by(SpreadSeries.time.desc())
+        .limit(limit)
+    )
+    if since is not None:
+        stmt = stmt.where(SpreadSeries.time >= since)
+
+    rows = session.execute(stmt).all()[::-1]
+    return SpreadSeriesResponse(
+        crypto_id=crypto_id,
+        interval=interval,
+        time=[row.time for row in rows],
+        spread_percent=[row.spread_percent for row in rows],
+        high_exchange=[row.high_exchange for row in rows],
+        low_exchange=[row.low_exchange for row in rows],
+    )
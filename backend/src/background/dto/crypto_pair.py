@@ -1,31 +1,61 @@
+import numpy as np
+from config.config import FetchStatus
+from services.cache_keys import run_ohlc_key
 from utils.dependencies.dependencies import CryptoFetcherDependency
 
 
 class CryptoPair:
+    # millions of these can be alive during a run, no per instance __dict__
+    __slots__ = ("ce_id", "crypto_id", "crypto_name", "supported_exchange", "interval", "run_id")
+
     def __init__(
         self,
         *,
         crypto_id_exchange_unique: int,
+        crypto_id: int,
         crypto_name: str,
         supported_exchange: str,
         interval: str,
+        run_id: str,
     ) -> None:
         self.ce_id = crypto_id_exchange_unique
+        self.crypto_id = crypto_id
         self.crypto_name = crypto_name
         self.supported_exchange = supported_exchange
         self.interval = interval
+        self.run_id = run_id
 
-    async def get_ohlc(self, crypto_fetcher: CryptoFetcherDependency) -> list[list[float]] | None:
+    async def get_ohlc(
+        self, crypto_fetcher: CryptoFetcherDependency
+    ) -> tuple[list[list[float]] | np.ndarray | None, FetchStatus]:
         """
         Do some magic by passing in an external api caller
 
         Which will fetch the OHLC with the current class parameters
         """
-        return await crypto_fetcher.get_ohlc_parameterised(
+        return await crypto_fetcher.get_ohlc_with_status(
             crypto_name=self.crypto_name,
             exchange_name=self.supported_exchange,
             interval=self.interval,
         )
 
+    def as_kwargs(self) -> dict:
+        """
+        Constructor kwargs, e.g. to pass the pair to a celery task
+        """
+        return {
+            "crypto_id_exchange_unique": self.ce_id,
+            "crypto_id": self.crypto_id,
+            "crypto_name": self.crypto_name,
+            "supported_exchange": self.supported_exchange,
+            "interval": self.interval,
+            "run_id": self.run_id,
+        }
+
+    def cache_key(self) -> str:
+        return run_ohlc_key(
+            run_id=self.run_id, interval=self.interval, crypto_id=self.crypto_id, ce_id=self.ce_id
+        )
+
     def __repr__(self) -> str:
-        return f"OHLC:{self.ce_id}"
+        return f"CryptoPair({self.ce_id}, {self.crypto_name}, {self.supported_exchange})"
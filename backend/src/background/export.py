@@ -0,0 +1,344 @@
+"""
+Arrow / Parquet exports of aligned ohlc and spreads
+
+Record batches are built from the numpy arrays behind the data (memory mapped candles,
+binary COPY of the spread series and computed spreads), one chunk at a time, so memory stays flat
+no matter how much is exported. Needs pyarrow, which is optional.
+
+    python -m background.export ohlc --interval 1h --symbols BTC/USDT ETH/USDT -o ohlc.parquet
+    python -m background.export series --interval 1h -o series.parquet
+    python -m background.export computed -o computed.arrow
+"""
+
+import argparse
+import logging
+from itertools import batched
+from pathlib import Path
+from typing import Callable, Iterable, Iterator
+
+import numpy as np
+from background.db.spread_series import (
+    PG_EPOCH_MS,
+    copy_spread_series_out,
+    get_series_crypto_ids,
+    get_series_names,
+    to_unix_ms,
+)
+from background.db.user_api import copy_computed_spreads_out, get_computed_intervals
+from config.config import (
+    AlignmentSettings,
+    CandleStoreSettings,
+    CryptoBatchSettings,
+    ExportSettings,
+)
+from data_manipulation.timeframes_equalizer import TimeframeSynchronizer
+from services.candle_store import PRICE_COLUMNS, TIME_COLUMN, CandleStore, symbol_directory
+from services.db_session import DBSessionDep, get_session_raw
+
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+except ImportError:  # optional, only exports need it
+    pa = pq = None
+
+logger = logging.getLogger(__name__)
+export_settings = ExportSettings()
+
+ARROW_STREAM_MEDIA_TYPE = "application/vnd.apache.arrow.stream"
+
+
+def available() -> bool:
+    return pa is not None
+
+
+def ohlc_schema() -> "pa.Schema":
+    return pa.schema(
+        [
+            ("symbol", pa.string()),
+            ("exchange", pa.string()),
+            ("time", pa.timestamp("ms", tz="UTC")),
+            *[(column, pa.float64()) for column in PRICE_COLUMNS],
+        ]
+    )
+
+
+def series_schema() -> "pa.Schema":
+    return pa.schema(
+        [
+            ("crypto_id", pa.int32()),
+            ("crypto_name", pa.string()),
+            ("time", pa.timestamp("ms", tz="UTC")),
+            ("spread_percent", pa.float32()),
+            ("high_exchange", pa.string()),
+            ("low_exchange", pa.string()),
+        ]
+    )
+
+
+def computed_schema() -> "pa.Schema":
+    return pa.schema(
+        [
+            ("crypto_id", pa.int32()),
+            ("interval", pa.string()),
+            ("crypto_name", pa.string()),
+            ("time", pa.timestamp("us", tz="UTC")),
+            ("spread_percent", pa.float64()),
+            ("high_exchange", pa.string()),
+            ("low_exchange", pa.string()),
+            ("mean_spread_percent", pa.float64()),
+            ("std_spread_percent", pa.float64()),
+            ("longest_run_above", pa.int32()),
+            ("mean_revert_candles", pa.float64()),
+        ]
+    )
+
+
+def aligned_ohlc_batches(
+    store: CandleStore,
+    interval: str,
+    alignment: AlignmentSettings,
+    symbols: list[str] | None = None,
+) -> Iterator["pa.RecordBatch"]:
+    """
+    Stored candles aligned across exchanges the same way computes align them
+
+    One batch per symbol in long format (symbol, exchange, time, ohlcv),
+    only symbols stored for at least two exchanges
+    """
+    wanted = {symbol_directory(symbol) for symbol in symbols} if symbols else None
+    for symbol, exchanges in store.series(interval).items():
+        if len(exchanges) < 2 or (wanted is not None and symbol not in wanted):
+            continue
+
+        ohlc_grouped = []
+        for exchange in exchanges:
+            columns = store.columns(exchange_name=exchange, crypto_name=symbol, interval=interval)
+            ohlc_grouped.append(
+                np.column_stack([columns[column] for column in [TIME_COLUMN, *PRICE_COLUMNS]])
+            )
+
+        frames = TimeframeSynchronizer(
+            tolerance_ms=alignment.ALIGN_TOLERANCE_MS,
+            ffill_limit=alignment.ALIGN_FFILL_LIMIT,
+            interval=interval,
+        ).sync_many(ohlc_grouped)
+        rows = len(frames[0])
+        if not rows:
+            continue
+
+        times = np.tile(frames[0].index.as_unit("ms").asi8, len(frames))
+        yield pa.record_batch(
+            [
+                pa.repeat(symbol, rows * len(frames)),
+                pa.array(exchanges).take(np.repeat(np.arange(len(frames)), rows)),
+                pa.array(times, type=pa.timestamp("ms", tz="UTC")),
+                *[
+                    pa.array(np.concatenate([frame[column].to_numpy() for frame in frames]))
+                    for column in PRICE_COLUMNS
+                ],
+            ],
+            schema=ohlc_schema(),
+        )
+
+
+def spread_series_batches(
+    session: DBSessionDep, interval: str, crypto_ids: list[int] | None = None
+) -> Iterator["pa.RecordBatch"]:
+    """
+    Stored spread series, one batch per EXPORT_CHUNK_CRYPTOS cryptos
+    """
+    crypto_ids = crypto_ids or get_series_crypto_ids(session=session, interval=interval)
+    for chunk in batched(crypto_ids, export_settings.EXPORT_CHUNK_CRYPTOS, strict=False):
+        rows = copy_spread_series_out(session=session, interval=interval, crypto_ids=list(chunk))
+        if not rows.size:
+            continue
+
+        crypto_names, exchange_names = get_series_names(session=session, crypto_ids=list(chunk))
+        yield pa.record_batch(
+            [
+                pa.array(rows["crypto_id"].astype(np.int32)),
+                _labels(crypto_names, rows["crypto_id"]),
+                pa.array(
+                    to_unix_ms(rows["time"].astype(np.int64)),
+                    type=pa.timestamp("ms", tz="UTC"),
+                ),
+                pa.array(rows["spread_percent"].astype(np.float32)),
+                _labels(exchange_names, rows["high_exchange_id"]),
+                _labels(exchange_names, rows["low_exchange_id"]),
+            ],
+            schema=series_schema(),
+        )
+
+
+def computed_spread_batches(session: DBSessionDep) -> Iterator["pa.RecordBatch"]:
+    """
+    Computed max spreads with their statistics, up to EXPORT_CHUNK_ROWS per batch
+
+    Per window rolling stats are left out, they're nested and differ per config
+    """
+    for interval in get_computed_intervals(session=session):
+        after_id = 0
+        while True:
+            rows = copy_computed_spreads_out(
+                session=session,
+                interval=interval,
+                after_id=after_id,
+                limit=export_settings.EXPORT_CHUNK_ROWS,
+            )
+            if not rows.size:
+                break
+            after_id = int(rows["crypto_id"][-1])
+
+            crypto_ids = rows["crypto_id"].astype(np.int64)
+            crypto_names, exchange_names = get_series_names(
+                session=session, crypto_ids=crypto_ids.tolist()
+            )
+            longest_run_above = rows["longest_run_above"].astype(np.int32)
+            yield pa.record_batch(
+                [
+                    pa.array(crypto_ids.astype(np.int32)),
+                    pa.repeat(interval, rows.size),
+                    _labels(crypto_names, crypto_ids),
+                    pa.array(
+                        rows["time"].astype(np.int64) + PG_EPOCH_MS * 1000,
+                        type=pa.timestamp("us", tz="UTC"),
+                    ),
+                    pa.array(rows["spread_percent"].astype(np.float64)),
+                    _labels(exchange_names, rows["high_exchange_id"].astype(np.int64)),
+                    _labels(exchange_names, rows["low_exchange_id"].astype(np.int64)),
+                    # NaN / -1 stand for missing stats, see copy_computed_spreads_out
+                    pa.array(rows["mean_spread_percent"].astype(np.float64), from_pandas=True),
+                    pa.array(rows["std_spread_percent"].astype(np.float64), from_pandas=True),
+                    pa.array(longest_run_above, mask=longest_run_above < 0),
+                    pa.array(rows["mean_revert_candles"].astype(np.float64), from_pandas=True),
+                ],
+                schema=computed_schema(),
+            )
+
+
+def arrow_stream(schema: "pa.Schema", batches: Iterable["pa.RecordBatch"]) -> Iterator[bytes]:
+    """
+    Arrow IPC stream, yielded batch by batch
+    """
+    sink = _ChunkSink()
+    writer = pa.ipc.new_stream(pa.PythonFile(sink, mode="w"), schema)
+    for batch in batches:
+        writer.write_batch(batch)
+        yield sink.drain()
+    writer.close()
+    yield sink.drain()
+
+
+def write_parquet(path: Path, schema: "pa.Schema", batches: Iterable["pa.RecordBatch"]) -> int:
+    """
+    Write @batches as row groups of one parquet file, returns the row count
+    """
+    rows = 0
+    with pq.ParquetWriter(path, schema, compression=export_settings.PARQUET_COMPRESSION) as writer:
+        for batch in batches:
+            writer.write_batch(batch)
+            rows += batch.num_rows
+    return rows
+
+
+def with_session(
+    batches_factory: Callable[[DBSessionDep], Iterator["pa.RecordBatch"]],
+) -> Iterator["pa.RecordBatch"]:
+    """
+    Own session for the lifetime of a streamed export,
+    request scoped sessions are gone before a streaming response ends
+    """
+    session = get_session_raw()
+    try:
+        yield from batches_factory(session)
+    finally:
+        session.close()
+
+
+def _labels(names: dict[int, str], ids: np.ndarray) -> "pa.Array":
+    # one python string per distinct id, rows only carry positions into them
+    keys = np.array(sorted(names), dtype=np.int64)
+    if not keys.size:
+        return pa.nulls(len(ids), type=pa.string())
+
+    positions = np.clip(np.searchsorted(keys, ids), 0, keys.size - 1)
+    found = keys[positions] == ids
+    labels = pa.array([names[key] for key in keys.tolist()], type=pa.string())
+    return labels.take(pa.array(positions, mask=~found))
+
+
+class _ChunkSink:
+    """
+    File-like target of the ipc writer, handing out what was written so far
+    """
+
+    def __init__(self) -> None:
+        self._chunks: list[bytes] = []
+        self.closed = False
+
+    def write(self, data: bytes) -> int:
+        self._chunks.append(bytes(data))
+        return len(data)
+
+    def flush(self) -> None:
+        pass
+
+    def close(self) -> None:
+        self.closed = True
+
+    def drain(self) -> bytes:
+        data = b"".join(self._chunks)
+        self._chunks = []
+        return data
+
+
+def _parse_args() -> argparse.Namespace:
+    parser = argparse.ArgumentParser(
+        prog="python -m background.export",
+        description="Export aligned ohlc or spreads as parquet (or arrow with a .arrow output)",
+    )
+    parser.add_argument("what", choices=["ohlc", "series", "computed"])
+    parser.add_argument("--interval", default=CryptoBatchSettings().DEFAULT_INTERVAL)
+    parser.add_argument("--symbols", nargs="+", default=None, help="ohlc only")
+    parser.add_argument("--crypto-ids", type=int, nargs="+", default=None, help="series only")
+    parser.add_argument("--store", default=CandleStoreSettings().CANDLE_STORE_PATH)
+    parser.add_argument("-o", "--output", type=Path, required=True)
+    return parser.parse_args()
+
+
+def main() -> None:
+    args = _parse_args()
+    logging.basicConfig(level=logging.INFO)
+    if not available():
+        raise SystemExit("pyarrow isn't installed, exports need it: pip install pyarrow")
+
+    if args.what == "ohlc":
+        schema = ohlc_schema()
+        batches = aligned_ohlc_batches(
+            store=CandleStore(CandleStoreSettings(CANDLE_STORE_PATH=args.store)),
+            interval=args.interval,
+            alignment=AlignmentSettings(),
+            symbols=args.symbols,
+        )
+    elif args.what == "series":
+        schema = series_schema()
+        batches = with_session(
+            lambda session: spread_series_batches(
+                session=session, interval=args.interval, crypto_ids=args.crypto_ids
+            )
+        )
+    else:
+        schema = computed_schema()
+        batches = with_session(computed_spread_batches)
+
+    if args.output.suffix == ".arrow":
+        with open(args.output, "wb") as file:
+            for chunk in arrow_stream(schema, batches):
+                file.write(chunk)
+    else:
+        rows = write_parquet(args.output, schema, batches)
+        logger.info(f"Wrote {rows} rows to {args.output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,291 @@
+"""
+Offline replay of spread computes over stored candle history
+
+Walks the candle store through time and recomputes every crypto at each step,
+like scheduled scans would have, with the given parameters. No exchanges,
+no redis, no postgres. Cryptos are replayed in parallel on all cores.
+
+    python -m background.replay --interval 1h --step 24 --threshold 1.5 --output replay.csv
+"""
+
+import argparse
+import json
+import logging
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+from datetime import UTC, datetime
+from pathlib import Path
+
+import ccxt
+import numpy as np
+import pandas as pd
+from background.compute.spread_compute import compute_spread_incremental
+from config.config import (
+    AlignmentSettings,
+    CandleStoreSettings,
+    CryptoBatchSettings,
+    SpreadStatsSettings,
+)
+from data_manipulation.incremental_spread import SpreadState
+from services.candle_store import PRICE_COLUMNS, TIME_COLUMN, CandleStore
+
+logger = logging.getLogger(__name__)
+
+REPORT_COLUMNS = [
+    "symbol",
+    "step_time",
+    "time",
+    "spread_percent",
+    "high_exchange",
+    "low_exchange",
+    "mean_spread_percent",
+    "std_spread_percent",
+    "longest_run_above",
+    "mean_revert_candles",
+]
+
+
+def replay_symbol(
+    symbol: str,
+    exchanges: list[str],
+    interval: str,
+    step_times: np.ndarray,
+    store_settings: CandleStoreSettings,
+    stats: SpreadStatsSettings,
+    alignment: AlignmentSettings,
+) -> list[dict]:
+    """
+    Compute one symbol at every step, from candles opened before the step only
+
+    Module level so it pickles into the pool. Candles are memory mapped in the worker,
+    the spread state is carried from step to step, so every candle is aligned once
+    """
+    store = CandleStore(store_settings)
+    ohlc_grouped = []
+    for exchange in exchanges:
+        columns = store.columns(exchange_name=exchange, crypto_name=symbol, interval=interval)
+        ohlc_grouped.append(
+            np.column_stack([columns[column] for column in [TIME_COLUMN, *PRICE_COLUMNS]])
+        )
+
+    # exchanges are identified by their position
+    ce_ids = list(range(len(exchanges)))
+    state: SpreadState | None = None
+    rows = []
+    for step_time in step_times:
+        visible = [ohlc[: np.searchsorted(ohlc[:, 0], step_time)] for ohlc in ohlc_grouped]
+        if any(not len(ohlc) for ohlc in visible):
+            continue
+
+        computed_spread, state, _ = compute_spread_incremental(
+            crypto_id=0,
+            ohlc_grouped=visible,
+            ce_ids=ce_ids,
+            state=state,
+            stats=stats,
+            alignment=alignment,
+        )
+        if not computed_spread:
+            continue
+
+        rows.append(
+            {
+                "symbol": symbol,
+                "step_time": pd.Timestamp(int(step_time), unit="ms", tz="UTC"),
+                "time": computed_spread["time"],
+                "spread_percent": computed_spread["spread_percent"],
+                "high_exchange": exchanges[computed_spread["high_exchange_id"]],
+                "low_exchange": exchanges[computed_spread["low_exchange_id"]],
+                "mean_spread_percent": computed_spread.get("mean_spread_percent"),
+                "std_spread_percent": computed_spread.get("std_spread_percent"),
+                "longest_run_above": computed_spread.get("longest_run_above"),
+                "mean_revert_candles": computed_spread.get("mean_revert_candles"),
+            }
+        )
+    return rows
+
+
+def replay(
+    store: CandleStore,
+    interval: str,
+    step_candles: int,
+    min_exchanges: int,
+    stats: SpreadStatsSettings,
+    alignment: AlignmentSettings,
+    start: datetime | None = None,
+    end: datetime | None = None,
+    workers: int | None = None,
+) -> pd.DataFrame:
+    """
+    Replay every stored symbol with at least @min_exchanges exchanges
+
+    A step is taken every @step_candles candles between @start and @end,
+    both default to the stored history bounds
+    """
+    symbols = {
+        symbol: exchanges
+        for symbol, exchanges in store.series(interval).items()
+        if len(exchanges) >= min_exchanges
+    }
+    if not symbols:
+        return pd.DataFrame(columns=REPORT_COLUMNS)
+
+    step_times = _step_times(
+        store=store,
+        symbols=symbols,
+        interval=interval,
+        step_candles=step_candles,
+        start=start,
+        end=end,
+    )
+    logger.info(f"Replaying {len(symbols)} symbols over {len(step_times)} steps")
+
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        futures = [
+            pool.submit(
+                replay_symbol,
+                symbol,
+                exchanges,
+                interval,
+                step_times,
+                CandleStoreSettings(CANDLE_STORE_PATH=str(store.root)),
+                stats,
+                alignment,
+            )
+            for symbol, exchanges in symbols.items()
+        ]
+        rows = [row for future in futures for row in future.result()]
+
+    return pd.DataFrame(rows, columns=REPORT_COLUMNS)
+
+
+def summarize(report: pd.DataFrame, threshold: float) -> pd.DataFrame:
+    """
+    One row per symbol, comparable across replays with different parameters
+    """
+    if report.empty:
+        return pd.DataFrame()
+
+    grouped = report.groupby("symbol")
+    return (
+        pd.DataFrame(
+            {
+                "steps": grouped.size(),
+                "steps_above": grouped["spread_percent"].agg(lambda s: int((s > threshold).sum())),
+                "max_spread_percent": grouped["spread_percent"].max(),
+                "mean_spread_percent": grouped["mean_spread_percent"].mean(),
+                "longest_run_above": grouped["longest_run_above"].max(),
+            }
+        )
+        .sort_values("max_spread_percent", ascending=False)
+        .reset_index()
+    )
+
+
+def _step_times(
+    store: CandleStore,
+    symbols: dict[str, list[str]],
+    interval: str,
+    step_candles: int,
+    start: datetime | None,
+    end: datetime | None,
+) -> np.ndarray:
+    interval_ms = ccxt.Exchange.parse_timeframe(interval) * 1000
+
+    first_times, last_times = [], []
+    for symbol, exchanges in symbols.items():
+        for exchange in exchanges:
+            times = store.columns(exchange_name=exchange, crypto_name=symbol, interval=interval)[
+                TIME_COLUMN
+            ]
+            first_times.append(int(times[0]))
+            last_times.append(int(times[-1]))
+
+    # the first step needs at least a candle, the last one sees the whole history
+    first = int(start.timestamp() * 1000) if start else min(first_times) + interval_ms
+    last = int(end.timestamp() * 1000) if end else max(last_times) + interval_ms
+    first = first // interval_ms * interval_ms
+    step_times = np.arange(first, last, step_candles * interval_ms, dtype=np.int64)
+    return np.append(step_times, last)
+
+
+def _parse_args() -> argparse.Namespace:
+    stats = SpreadStatsSettings()
+    alignment = AlignmentSettings()
+
+    parser = argparse.ArgumentParser(
+        prog="python -m background.replay",
+        description="Replay spread computes over the local candle store",
+    )
+    parser.add_argument("--interval", default=CryptoBatchSettings().DEFAULT_INTERVAL)
+    parser.add_argument("--step", type=int, default=1, help="candles between steps")
+    parser.add_argument("--start", type=datetime.fromisoformat, default=None)
+    parser.add_argument("--end", type=datetime.fromisoformat, default=None)
+    parser.add_argument("--store", default=CandleStoreSettings().CANDLE_STORE_PATH)
+    parser.add_argument("--min-exchanges", type=int, default=CryptoBatchSettings().COMPUTE_QUORUM)
+    parser.add_argument("--threshold", type=float, default=stats.PERSISTENCE_THRESHOLD)
+    parser.add_argument("--window", type=int, default=stats.SPREAD_WINDOW_CANDLES)
+    parser.add_argument("--rolling-windows", type=int, nargs="+", default=stats.ROLLING_WINDOWS)
+    parser.add_argument("--tolerance-ms", type=int, default=alignment.ALIGN_TOLERANCE_MS)
+    parser.add_argument("--ffill-limit", type=int, default=alignment.ALIGN_FFILL_LIMIT)
+    parser.add_argument("--workers", type=int, default=None, help="defaults to one per cpu")
+    parser.add_argument("--output", type=Path, default=None, help="per step csv report")
+    return parser.parse_args()
+
+
+def main() -> None:
+    args = _parse_args()
+    logging.basicConfig(level=logging.INFO)
+    # per step compute logs would drown everything else
+    logging.getLogger("background.compute.spread_compute").setLevel(logging.WARNING)
+
+    stats = SpreadStatsSettings(
+        PERSISTENCE_THRESHOLD=args.threshold,
+        SPREAD_WINDOW_CANDLES=args.window,
+        ROLLING_WINDOWS=args.rolling_windows,
+    )
+    alignment = AlignmentSettings(
+        ALIGN_TOLERANCE_MS=args.tolerance_ms, ALIGN_FFILL_LIMIT=args.ffill_limit
+    )
+
+    started = time.perf_counter()
+    report = replay(
+        store=CandleStore(CandleStoreSettings(CANDLE_STORE_PATH=args.store)),
+        interval=args.interval,
+        step_candles=args.step,
+        min_exchanges=args.min_exchanges,
+        stats=stats,
+        alignment=alignment,
+        start=args.start.replace(tzinfo=args.start.tzinfo or UTC) if args.start else None,
+        end=args.end.replace(tzinfo=args.end.tzinfo or UTC) if args.end else None,
+        workers=args.workers,
+    )
+    elapsed = time.perf_counter() - started
+
+    summary = summarize(report, threshold=args.threshold)
+    sys.stdout.write(summary.head(50).to_string(index=False) + "\n")
+    sys.stdout.write(
+        json.dumps(
+            {
+                "interval": args.interval,
+                "step": args.step,
+                "threshold": args.threshold,
+                "window": args.window,
+                "tolerance_ms": args.tolerance_ms,
+                "ffill_limit": args.ffill_limit,
+                "symbols": int(summary.shape[0]),
+                "steps": int(report.shape[0]),
+                "seconds": round(elapsed, 2),
+            }
+        )
+        + "\n"
+    )
+
+    if args.output:
+        report.to_csv(args.output, index=False)
+        summary.to_csv(args.output.with_suffix(".summary.csv"), index=False)
+
+
+if __name__ == "__main__":
+    main()
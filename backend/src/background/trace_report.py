@@ -0,0 +1,199 @@
+"""
+Critical path summary of traced runs, from the spans services/tracing.py wrote to TRACE_FILE
+
+A run took as long as its latest span ended. Walking back from that span, every moment
+of the run is attributed to the span busy on the way there (the slowest fetch, the queue,
+the compute, ...), so the stages on the path add up to the run's wall clock time
+
+    python -m background.trace_report
+    python -m background.trace_report --run-id 3f2a9c1b7e4d --top 20
+"""
+
+import argparse
+import json
+import sys
+from pathlib import Path
+
+import numpy as np
+from config.config import TracingSettings
+from services.tracing import trace_id_of
+
+# time between a span handing off and the next one starting, e.g. a countdown
+UNTRACED = "untraced"
+
+
+def load_spans(path: Path, trace_id: str | None = None) -> dict[str, list[dict]]:
+    """
+    Spans per trace id, only the ones of @trace_id if given
+    """
+    traces: dict[str, list[dict]] = {}
+    with open(path) as file:
+        for line in file:
+            span = json.loads(line)
+            if trace_id is None or span["trace_id"] == trace_id:
+                traces.setdefault(span["trace_id"], []).append(span)
+    return traces
+
+
+def critical_path(spans: list[dict]) -> list[tuple[str, float, dict | None]]:
+    """
+    (stage, seconds, span) segments of the path to the latest span end, latest first
+    """
+    by_id = {span["span_id"]: span for span in spans}
+    children: dict[str, list[dict]] = {}
+    for span in spans:
+        if span["parent_id"] in by_id:
+            children.setdefault(span["parent_id"], []).append(span)
+    for siblings in children.values():
+        siblings.sort(key=lambda span: span["end"], reverse=True)
+
+    segments: list[tuple[str, float, dict | None]] = []
+    current = max(spans, key=lambda span: span["end"])
+    _walk(current, cursor=current["end"], children=children, segments=segments)
+
+    # up to the root, through the spans which started the current one
+    while current["parent_id"] in by_id:
+        parent = by_id[current["parent_id"]]
+        cursor = current["start"]
+        if cursor > parent["end"]:
+            segments.append((UNTRACED, cursor - parent["end"], None))
+            cursor = parent["end"]
+        _walk(parent, cursor=cursor, children=children, segments=segments, came_from=current)
+        current = parent
+    return segments
+
+
+def _walk(
+    span: dict,
+    cursor: float,
+    children: dict[str, list[dict]],
+    segments: list[tuple[str, float, dict | None]],
+    came_from: dict | None = None,
+) -> None:
+    # children ending latest first, the time between them is the span's own
+    for child in children.get(span["span_id"], []):
+        if child is came_from or child["end"] > cursor:
+            continue
+        segments.append((span["name"], max(cursor - child["end"], 0), span))
+        _walk(child, cursor=child["end"], children=children, segments=segments)
+        cursor = max(child["start"], span["start"])
+    segments.append((span["name"], max(cursor - span["start"], 0), span))
+
+
+def summarize(spans: list[dict], top: int = 10) -> dict:
+    """
+    Time per stage on the critical path, span durations per stage
+    and the @top cryptos which took longest since the run started
+    """
+    root = min(spans, key=lambda span: span["start"])
+    started, ended = root["start"], max(span["end"] for span in spans)
+    wall_seconds = ended - started
+
+    segments = critical_path(spans)
+    stages: dict[str, float] = {}
+    for stage, seconds, _ in segments:
+        stages[stage] = stages.get(stage, 0) + seconds
+    # the crypto the run waited for
+    last_crypto = next(
+        (
+            span["attributes"]["crypto_id"]
+            for _, _, span in segments
+            if span and "crypto_id" in span["attributes"]
+        ),
+        None,
+    )
+
+    durations: dict[str, list[float]] = {}
+    crypto_done: dict[int, float] = {}
+    for span in spans:
+        durations.setdefault(span["name"], []).append(span["end"] - span["start"])
+        crypto_id = span["attributes"].get("crypto_id")
+        if crypto_id is not None:
+            crypto_done[crypto_id] = max(crypto_done.get(crypto_id, 0), span["end"] - started)
+
+    return {
+        "run_id": root["attributes"].get("run_id", root["trace_id"]),
+        "started": started,
+        "wall_seconds": wall_seconds,
+        "spans": len(spans),
+        "errors": sum(1 for span in spans if span["error"]),
+        "dominant_stage": max(stages, key=stages.get),
+        "last_crypto": last_crypto,
+        "critical_path": {
+            stage: {"seconds": seconds, "share": seconds / wall_seconds if wall_seconds else 0}
+            for stage, seconds in sorted(stages.items(), key=lambda item: item[1], reverse=True)
+        },
+        "durations": {
+            name: {
+                "count": len(seconds),
+                "p50": float(np.percentile(seconds, 50)),
+                "p95": float(np.percentile(seconds, 95)),
+                "max": max(seconds),
+            }
+            for name, seconds in sorted(durations.items())
+        },
+        "slowest_cryptos": sorted(crypto_done.items(), key=lambda item: item[1], reverse=True)[
+            :top
+        ],
+    }
+
+
+def _format(summary: dict) -> str:
+    lines = [
+        f"Run {summary['run_id']}: {summary['wall_seconds']:.3f}s, {summary['spans']} spans, "
+        f"{summary['errors']} errors",
+        f"Dominated by {summary['dominant_stage']}, last crypto {summary['last_crypto']}",
+        "",
+        f"{'critical path':<40}{'seconds':>10}{'share':>8}",
+    ]
+    for stage, entry in summary["critical_path"].items():
+        lines.append(f"{stage:<40}{entry['seconds']:>10.3f}{entry['share']:>8.0%}")
+
+    lines += ["", f"{'span':<40}{'count':>8}{'p50 ms':>10}{'p95 ms':>10}{'max ms':>10}"]
+    for name, entry in summary["durations"].items():
+        lines.append(
+            f"{name:<40}{entry['count']:>8}{entry['p50'] * 1000:>10.1f}"
+            f"{entry['p95'] * 1000:>10.1f}{entry['max'] * 1000:>10.1f}"
+        )
+
+    lines += ["", "Slowest cryptos, seconds since the run started"]
+    lines += [
+        f"{crypto_id:<12}{seconds:>10.3f}" for crypto_id, seconds in summary["slowest_cryptos"]
+    ]
+    return "\n".join(lines) + "\n"
+
+
+def _parse_args() -> argparse.Namespace:
+    parser = argparse.ArgumentParser(
+        prog="python -m background.trace_report",
+        description="Critical path summary of traced runs",
+    )
+    parser.add_argument("--file", type=Path, default=TracingSettings().TRACE_FILE)
+    parser.add_argument("--run-id", default=None, help="all runs in the file if not given")
+    parser.add_argument("--top", type=int, default=10, help="slowest cryptos listed")
+    parser.add_argument("--json", action="store_true")
+    return parser.parse_args()
+
+
+def main() -> None:
+    args = _parse_args()
+    if not args.file or not args.file.exists():
+        raise SystemExit(f"No spans at {args.file}, is TRACING_ENABLED set?")
+
+    traces = load_spans(args.file, trace_id=trace_id_of(args.run_id) if args.run_id else None)
+    if not traces:
+        raise SystemExit(f"No spans of run {args.run_id} in {args.file}")
+
+    # runs in the order they started
+    summaries = sorted(
+        (summarize(spans, top=args.top) for spans in traces.values()),
+        key=lambda summary: summary["started"],
+    )
+    if args.json:
+        sys.stdout.write(json.dumps(summaries, indent=2) + "\n")
+        return
+    sys.stdout.write("\n".join(_format(summary) for summary in summaries))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,261 @@
+"""
+Micro-benchmarks of the spread compute path on seeded synthetic ohlc
+
+Times every stage a compute goes through (json decode of cached ohlc, alignment,
+spread frame, max / statistics extraction, the whole compute) and its peak memory.
+Results can be saved as a JSON baseline, later runs fail on regressions against it.
+
+    python -m benchmarks.compute_path --save
+    python -m benchmarks.compute_path --threshold 0.2
+"""
+
+import argparse
+import json
+import logging
+import platform
+import statistics
+import sys
+import time
+import tracemalloc
+from pathlib import Path
+from typing import Any, Callable
+
+import numpy as np
+import pandas as pd
+from background.compute.spread_compute import compute_spread_incremental
+from benchmarks.synthetic import synthetic_ohlc
+from config.config import AlignmentSettings
+from data_manipulation.incremental_spread import SpreadState
+from data_manipulation.spread_object import Spread
+from data_manipulation.timeframes_equalizer import TimeframeSynchronizer
+
+DEFAULT_BASELINE = Path(__file__).parent / "baselines" / "compute_path.json"
+
+# synthetic data and alignment settings per scenario
+SCENARIOS: dict[str, dict] = {
+    "small": {"data": {"exchanges": 3, "candles": 500}},
+    "default": {"data": {"exchanges": 7, "candles": 1000}},
+    "gaps_offsets": {
+        "data": {
+            "exchanges": 7,
+            "candles": 1000,
+            "gap_rate": 0.05,
+            "max_offset_ms": 30_000,
+            "corrupted_rows": 5,
+        },
+        "tolerance_ms": 360_000,
+        "ffill_limit": 2,
+    },
+    "long": {"data": {"exchanges": 7, "candles": 20_000}},
+}
+
+
+def stage_inputs(scenario: dict, seed: int) -> dict[str, Any]:
+    """
+    Input of every stage, prepared up front so stages are timed on their own
+    """
+    ohlc_grouped = synthetic_ohlc(seed=seed, **scenario["data"])
+    ce_ids = list(range(len(ohlc_grouped)))
+    synchronizer = _synchronizer(scenario)
+    frames = synchronizer.sync_many(ohlc_grouped)
+    spreads_df = Spread(raw_frames=frames, ce_ids=ce_ids).spreads_df
+
+    return {
+        "scenario": scenario,
+        "ohlc_grouped": ohlc_grouped,
+        "serialized": [json.dumps(ohlc) for ohlc in ohlc_grouped],
+        "ce_ids": ce_ids,
+        "frames": frames,
+        "spreads_df": spreads_df,
+    }
+
+
+def _synchronizer(scenario: dict) -> TimeframeSynchronizer:
+    return TimeframeSynchronizer(
+        tolerance_ms=scenario.get("tolerance_ms", 0), ffill_limit=scenario.get("ffill_limit", 0)
+    )
+
+
+def _decode(inputs: dict) -> list:
+    # what compute_cross_exchange_spread gets from mget_json
+    return [json.loads(serialized) for serialized in inputs["serialized"]]
+
+
+def _encode(inputs: dict) -> list:
+    # what fetches pay to cache ohlc
+    return [json.dumps(ohlc) for ohlc in inputs["ohlc_grouped"]]
+
+
+def _align(inputs: dict) -> list:
+    return _synchronizer(inputs["scenario"]).sync_many(inputs["ohlc_grouped"])
+
+
+def _spread(inputs: dict) -> pd.DataFrame:
+    return Spread(raw_frames=inputs["frames"], ce_ids=inputs["ce_ids"]).spreads_df
+
+
+def _max_and_statistics(inputs: dict) -> dict:
+    spreads_df = inputs["spreads_df"]
+    state = SpreadState(ce_ids=inputs["ce_ids"], max_candles=len(spreads_df))
+    state.fold(spreads_df.iloc[:-1])
+    tail = spreads_df.iloc[-1:]
+    return {
+        **state.max_spread(tail=tail),
+        **state.statistics(windows=[6, 24, 72], persistence_threshold=1.0, tail=tail),
+    }
+
+
+def _compute(inputs: dict) -> dict:
+    scenario = inputs["scenario"]
+    computed_spread, _, _ = compute_spread_incremental(
+        crypto_id=0,
+        ohlc_grouped=inputs["ohlc_grouped"],
+        ce_ids=inputs["ce_ids"],
+        state=None,
+        alignment=AlignmentSettings(
+            ALIGN_TOLERANCE_MS=scenario.get("tolerance_ms", 0),
+            ALIGN_FFILL_LIMIT=scenario.get("ffill_limit", 0),
+        ),
+    )
+    # an empty result means nothing got aligned, the timing would be meaningless
+    if not computed_spread:
+        raise RuntimeError(f"Compute of {scenario['data']} returned no spread")
+    return computed_spread
+
+
+STAGES: dict[str, Callable[[dict], Any]] = {
+    "encode": _encode,
+    "decode": _decode,
+    "align": _align,
+    "spread": _spread,
+    "max": _max_and_statistics,
+    "compute": _compute,
+}
+
+
+def measure(stage: Callable[[dict], Any], inputs: dict, repeat: int) -> dict:
+    """
+    Best and median wall time over @repeat runs, peak traced memory of one more run
+    """
+    stage(inputs)  # warm up caches and lazy imports
+
+    timings = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        stage(inputs)
+        timings.append(time.perf_counter() - started)
+
+    # tracing slows everything down, so it's a separate run
+    tracemalloc.start()
+    stage(inputs)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    return {
+        "seconds": min(timings),
+        "median_seconds": statistics.median(timings),
+        "peak_kib": round(peak / 1024, 1),
+    }
+
+
+def run(scenarios: list[str], repeat: int, seed: int) -> dict[str, dict]:
+    """
+    Results keyed by "scenario/stage"
+    """
+    results = {}
+    for name in scenarios:
+        inputs = stage_inputs(SCENARIOS[name], seed=seed)
+        for stage_name, stage in STAGES.items():
+            results[f"{name}/{stage_name}"] = measure(stage, inputs, repeat=repeat)
+    return results
+
+
+def regressions(results: dict[str, dict], baseline: dict[str, dict], threshold: float) -> list[str]:
+    """
+    Stages slower or hungrier than the baseline by more than @threshold (0.2 = 20%)
+
+    Best times are compared, they're the least noisy
+    """
+    found = []
+    for key, result in results.items():
+        if key not in baseline:
+            continue
+        for metric in ["seconds", "peak_kib"]:
+            before, after = baseline[key][metric], result[metric]
+            if before and after > before * (1 + threshold):
+                found.append(
+                    f"{key} {metric}: {before:.6g} -> {after:.6g} (+{after / before - 1:.0%})"
+                )
+    return found
+
+
+def environment() -> dict:
+    # baselines only compare on the same machine and library versions
+    return {
+        "python": platform.python_version(),
+        "numpy": np.__version__,
+        "pandas": pd.__version__,
+        "machine": platform.machine(),
+        "processor": platform.processor(),
+    }
+
+
+def _format(results: dict[str, dict], baseline: dict[str, dict]) -> str:
+    lines = [f"{'stage':<28}{'best ms':>12}{'median ms':>12}{'peak KiB':>12}{'vs base':>10}"]
+    for key, result in results.items():
+        change = ""
+        if key in baseline and baseline[key]["seconds"]:
+            change = f"{result['seconds'] / baseline[key]['seconds'] - 1:+.0%}"
+        lines.append(
+            f"{key:<28}{result['seconds'] * 1000:>12.3f}{result['median_seconds'] * 1000:>12.3f}"
+            f"{result['peak_kib']:>12.1f}{change:>10}"
+        )
+    return "\n".join(lines) + "\n"
+
+
+def _parse_args() -> argparse.Namespace:
+    parser = argparse.ArgumentParser(
+        prog="python -m benchmarks.compute_path",
+        description="Benchmark the spread compute path on synthetic ohlc",
+    )
+    parser.add_argument("--scenarios", nargs="+", choices=list(SCENARIOS), default=list(SCENARIOS))
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--baseline", type=Path, default=DEFAULT_BASELINE)
+    parser.add_argument("--save", action="store_true", help="store the results as baseline")
+    parser.add_argument("--threshold", type=float, default=0.2, help="allowed slowdown, 0.2 = 20%%")
+    return parser.parse_args()
+
+
+def main() -> None:
+    args = _parse_args()
+    # per compute info logs would end up in the timings
+    logging.basicConfig(level=logging.WARNING)
+
+    results = run(scenarios=args.scenarios, repeat=args.repeat, seed=args.seed)
+
+    saved = json.loads(args.baseline.read_text()) if args.baseline.exists() else {}
+    baseline = saved.get("results", {})
+    sys.stdout.write(_format(results, baseline))
+
+    if args.save:
+        args.baseline.parent.mkdir(parents=True, exist_ok=True)
+        args.baseline.write_text(
+            json.dumps(
+                {"environment": environment(), "seed": args.seed, "results": results}, indent=2
+            )
+        )
+        sys.stdout.write(f"Saved baseline to {args.baseline}\n")
+        return
+
+    if saved and saved.get("environment") != environment():
+        sys.stdout.write("Baseline was recorded in another environment, comparing anyway\n")
+
+    found = regressions(results, baseline, threshold=args.threshold)
+    if found:
+        sys.stdout.write("Regressions:\n" + "\n".join(found) + "\n")
+        raise SystemExit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,290 @@
+"""
+Fake ccxt exchanges for load runs, without touching real exchanges
+
+FakeExchange implements the part of ccxt's async exchange CryptoFetcher uses
+(load_markets, symbols, fetch_ohlcv, close) with a latency distribution,
+a request rate limit and error rates per exchange. Candles are synthetic,
+or replayed from responses recorded off real exchanges by RecordingExchange
+"""
+
+import asyncio
+import json
+import random
+import time
+import zlib
+from collections import deque
+from itertools import cycle
+from pathlib import Path
+from typing import Any
+
+import ccxt.async_support as ccxt
+import numpy as np
+from benchmarks.synthetic import synthetic_exchange_ohlc
+
+# per exchange behaviour, every key can be overridden per exchange
+DEFAULT_PROFILE = {
+    # lognormal around the median, sigma 0 makes it fixed
+    "latency_ms": 80.0,
+    "latency_sigma": 0.5,
+    # requests per second, above it requests fail like a 429 does
+    "rate_limit": 50,
+    "error_rate": 0.0,
+    # these take timeout_ms before they fail
+    "timeout_rate": 0.0,
+    "timeout_ms": 10_000,
+    # candles per response, like ccxt's default limit of most exchanges
+    "candles": 500,
+    "gap_rate": 0.0,
+    "spread_bps": 20.0,
+}
+
+# outcomes in the per request stats
+OK = "ok"
+RATE_LIMITED = "rate_limited"
+FAILED = "failed"
+TIMED_OUT = "timed_out"
+UNSUPPORTED = "unsupported"
+
+
+class FakeExchanges:
+    """
+    Builds the fake exchanges, pass its create as CryptoFetcher's exchange_factory
+
+    Every exchange lists a seeded @listing_rate share of @cryptos synthetic symbols,
+    or the symbols of its recording in @replay_dir. @profiles maps exchange names
+    to overrides of DEFAULT_PROFILE, "default" applies to all of them.
+
+    Rate limits and request stats are kept per exchange name,
+    shared by all instances of an exchange, like a real limit is per ip
+    """
+
+    def __init__(
+        self,
+        exchange_names: list[str],
+        cryptos: int,
+        listing_rate: float,
+        seed: int,
+        profiles: dict[str, dict] | None = None,
+        replay_dir: Path | None = None,
+    ) -> None:
+        profiles = profiles or {}
+        self.exchange_names = exchange_names
+        self.seed = seed
+        self.random = random.Random(seed)
+        self.profiles = {
+            name: {**DEFAULT_PROFILE, **profiles.get("default", {}), **profiles.get(name, {})}
+            for name in exchange_names
+        }
+        self.recordings = {
+            name: load_recording(replay_dir / f"{name}.jsonl") if replay_dir else None
+            for name in exchange_names
+        }
+        self.symbols = {
+            name: (
+                list(self.recordings[name])
+                if self.recordings[name]
+                else _listed_symbols(cryptos, listing_rate, seed=[seed, position])
+            )
+            for position, name in enumerate(exchange_names)
+        }
+        # request times of the last second and (latency ms, outcome) of every request
+        self._windows = {name: deque() for name in exchange_names}
+        self.requests: dict[str, list[tuple[float, str]]] = {name: [] for name in exchange_names}
+
+    def create(self, exchange_name: str) -> "FakeExchange":
+        return FakeExchange(exchange_name, self)
+
+    def stats(self) -> dict[str, dict]:
+        """
+        Request count per outcome and latency percentiles per exchange
+        """
+        stats = {}
+        for name, requests in self.requests.items():
+            if not requests:
+                continue
+            latencies = np.array([latency for latency, _ in requests])
+            outcomes = [outcome for _, outcome in requests]
+            stats[name] = {
+                "requests": len(requests),
+                **{outcome: outcomes.count(outcome) for outcome in sorted(set(outcomes))},
+                "p50_ms": round(float(np.percentile(latencies, 50)), 1),
+                "p95_ms": round(float(np.percentile(latencies, 95)), 1),
+                "max_ms": round(float(latencies.max()), 1),
+            }
+        return stats
+
+    def admit(self, exchange_name: str) -> bool:
+        # sliding one second window
+        now = time.monotonic()
+        window = self._windows[exchange_name]
+        while window and now - window[0] >= 1:
+            window.popleft()
+        if len(window) >= self.profiles[exchange_name]["rate_limit"]:
+            return False
+        window.append(now)
+        return True
+
+
+class FakeExchange:
+    """
+    One fake exchange, see FakeExchanges
+    """
+
+    def __init__(self, exchange_name: str, exchanges: FakeExchanges) -> None:
+        self.id = exchange_name
+        self.exchanges = exchanges
+        self.profile = exchanges.profiles[exchange_name]
+        self.symbols: list[str] = []
+        self.markets: dict[str, dict] = {}
+
+        self._position = exchanges.exchange_names.index(exchange_name)
+        self._recording = exchanges.recordings[exchange_name]
+        self._replayed = (
+            {symbol: cycle(responses) for symbol, responses in self._recording.items()}
+            if self._recording
+            else {}
+        )
+
+    async def load_markets(self, reload: bool = False) -> dict[str, dict]:
+        if not self.markets or reload:
+            self.symbols = self.exchanges.symbols[self.id]
+            self.markets = {symbol: {"symbol": symbol} for symbol in self.symbols}
+        return self.markets
+
+    async def fetch_ohlcv(
+        self,
+        symbol: str,
+        timeframe: str = "1m",
+        since: int | None = None,
+        limit: int | None = None,
+        params: dict | None = None,
+    ) -> list[list[float]]:
+        await self.load_markets()
+        if symbol not in self.markets:
+            self._record(0, UNSUPPORTED)
+            raise ccxt.BadSymbol(f"{self.id} does not have market symbol {symbol}")
+
+        if not self.exchanges.admit(self.id):
+            latency = self._latency() / 4
+            await asyncio.sleep(latency / 1000)
+            self._record(latency, RATE_LIMITED)
+            raise ccxt.RateLimitExceeded(f"{self.id} 429 Too Many Requests")
+
+        # recorded latency and outcome, only the rate limit applies on top
+        if self._replayed:
+            recorded = next(self._replayed[symbol])
+            await asyncio.sleep(recorded["latency_ms"] / 1000)
+            if "error" in recorded:
+                self._record(recorded["latency_ms"], FAILED)
+                raise getattr(ccxt, recorded["error"], ccxt.NetworkError)("replayed error")
+            self._record(recorded["latency_ms"], OK)
+            return recorded["ohlcv"]
+
+        roll = self.exchanges.random.random()
+        if roll < self.profile["timeout_rate"]:
+            await asyncio.sleep(self.profile["timeout_ms"] / 1000)
+            self._record(self.profile["timeout_ms"], TIMED_OUT)
+            raise ccxt.RequestTimeout(f"{self.id} GET ohlcv request timed out")
+
+        latency = self._latency()
+        await asyncio.sleep(latency / 1000)
+        if roll < self.profile["timeout_rate"] + self.profile["error_rate"]:
+            self._record(latency, FAILED)
+            raise ccxt.ExchangeNotAvailable(f"{self.id} 503 Service Unavailable")
+
+        self._record(latency, OK)
+        return self._candles(symbol, timeframe, since, limit)
+
+    async def close(self) -> None:
+        pass
+
+    def _candles(
+        self, symbol: str, timeframe: str, since: int | None, limit: int | None
+    ) -> list[list[float]]:
+        # newest candle is the forming one, like on a real exchange
+        interval_ms = ccxt.Exchange.parse_timeframe(timeframe) * 1000
+        last_open = int(time.time() * 1000) // interval_ms * interval_ms
+        candles = limit or self.profile["candles"]
+
+        start_ms = last_open - (candles - 1) * interval_ms
+        if since is not None:
+            start_ms = -(-since // interval_ms) * interval_ms
+            candles = min(candles, (last_open - start_ms) // interval_ms + 1)
+        if candles <= 0:
+            return []
+
+        return synthetic_exchange_ohlc(
+            seed=zlib.crc32(symbol.encode()) ^ self.exchanges.seed,
+            exchange=self._position,
+            candles=candles,
+            interval_ms=interval_ms,
+            gap_rate=self.profile["gap_rate"],
+            spread_bps=self.profile["spread_bps"],
+            start_ms=start_ms,
+        )
+
+    def _latency(self) -> float:
+        sigma = self.profile["latency_sigma"]
+        median = self.profile["latency_ms"]
+        return median * self.exchanges.random.lognormvariate(0, sigma) if sigma else median
+
+    def _record(self, latency_ms: float, outcome: str) -> None:
+        self.exchanges.requests[self.id].append((latency_ms, outcome))
+
+
+class RecordingExchange:
+    """
+    Real ccxt exchange which appends its ohlcv responses and their latency to @path
+
+    A FakeExchanges with the recording directory as replay_dir plays them back
+    """
+
+    def __init__(self, exchange: ccxt.Exchange, path: Path) -> None:
+        self.exchange = exchange
+        self.path = path
+
+    async def fetch_ohlcv(
+        self,
+        symbol: str,
+        timeframe: str = "1m",
+        since: int | None = None,
+        limit: int | None = None,
+        params: dict | None = None,
+    ) -> list[list[float]]:
+        started = time.perf_counter()
+        entry = {"symbol": symbol, "timeframe": timeframe}
+        try:
+            ohlcv = await self.exchange.fetch_ohlcv(symbol, timeframe, since, limit, params or {})
+            entry["ohlcv"] = ohlcv
+            return ohlcv
+        except ccxt.BaseError as e:
+            entry["error"] = type(e).__name__
+            raise
+        finally:
+            entry["latency_ms"] = round((time.perf_counter() - started) * 1000, 1)
+            with open(self.path, "a") as file:
+                file.write(json.dumps(entry) + "\n")
+
+    def __getattr__(self, name: str) -> Any:  # noqa: ANN401
+        # everything else is the real exchange's
+        return getattr(self.exchange, name)
+
+
+def load_recording(path: Path) -> dict[str, list[dict]] | None:
+    """
+    Recorded responses per symbol, None if nothing was recorded
+    """
+    if not path.exists():
+        return None
+
+    responses: dict[str, list[dict]] = {}
+    with open(path) as file:
+        for line in file:
+            entry = json.loads(line)
+            responses.setdefault(entry["symbol"], []).append(entry)
+    return responses or None
+
+
+def _listed_symbols(cryptos: int, listing_rate: float, seed: list[int]) -> list[str]:
+    listed = np.random.default_rng(seed).random(cryptos) < listing_rate
+    return [f"SYN{crypto:05d}/USDT" for crypto in np.flatnonzero(listed)]
@@ -0,0 +1,393 @@
+"""
+Load runs of the whole pipeline against fake exchanges
+
+A run goes the production way (start_fetch_run -> per exchange fetch chunks ->
+redis -> scan_available_ohlc chain -> computes -> postgres), executed by one celery
+worker inside this process, so every number is per worker process. Exchanges are
+FakeExchange instances, synthetic or replaying recorded responses.
+
+Redis and the celery broker are the configured ones, or in memory with --services memory
+(needs fakeredis). Postgres is always the configured one, the db layer relies on postgres
+upserts and COPY. Fake pairs are inserted into it, so point POSTGRES_DB (and REDIS_DB)
+at scratch ones. With CANDLE_STORE_ENABLED, candles go to a temporary store unless
+CANDLE_STORE_PATH is set.
+
+    python -m benchmarks.pipeline_load run --cryptos 10000 --services memory
+    python -m benchmarks.pipeline_load run --replay recordings --profiles profiles.json
+    python -m benchmarks.pipeline_load record --exchanges binance okx \\
+        --symbols BTC/USDT ETH/USDT --interval 1h -o recordings
+"""
+
+import argparse
+import asyncio
+import json
+import logging
+import os
+import sys
+import tempfile
+import threading
+import time
+from pathlib import Path
+
+import ccxt.async_support as ccxt
+import numpy as np
+from background.celery.celery_conf import scan_app
+from background.celery.celery_fetch import start_fetch_run
+from background.celery.fetch_worker import fetch_queue
+from background.compute.result_sink import get_result_sink
+from background.db.db_pairs import insert_exchange_names, insert_or_update_pairs
+from benchmarks.fake_exchange import FakeExchanges, RecordingExchange
+from celery import Task
+from celery.contrib.testing.worker import start_worker
+from celery.signals import before_task_publish, task_postrun, task_prerun
+from config.config import SUPPORTED_EXCHANGES, CryptoBatchSettings
+from services.db_session import get_session_raw
+from services.external_api_caller import CryptoFetcher
+from services.run_admission import new_run_id
+from utils.dependencies.dependencies import (
+    get_crypto_fetcher,
+    get_redis_client,
+    get_run_admission,
+    get_run_tracker,
+)
+
+try:
+    import fakeredis
+except ImportError:  # optional, only in memory services need it
+    fakeredis = None
+
+logger = logging.getLogger(__name__)
+batch_settings = CryptoBatchSettings()
+
+
+class TaskTimings:
+    """
+    Queue wait and run time of every celery task, collected from celery's signals
+
+    Queue wait is publish to start, countdowns included
+    """
+
+    def __init__(self) -> None:
+        self._lock = threading.Lock()
+        # task id -> publish time, until the task finished
+        self._published: dict[str, float] = {}
+        self._started: dict[str, float] = {}
+        # task name -> {"wait": [seconds], "run": [seconds]}
+        self.samples: dict[str, dict[str, list[float]]] = {}
+        self.first_finished: dict[str, float] = {}
+        self.last_activity = time.monotonic()
+
+    def connect(self) -> None:
+        before_task_publish.connect(self._on_publish, weak=False)
+        task_prerun.connect(self._on_prerun, weak=False)
+        task_postrun.connect(self._on_postrun, weak=False)
+
+    def in_flight(self) -> int:
+        with self._lock:
+            return len(self._published)
+
+    def summary(self) -> dict[str, dict]:
+        """
+        Per task count, wait and run percentiles, and seconds the worker spent on it
+        """
+        summary = {}
+        with self._lock:
+            for name, samples in sorted(self.samples.items()):
+                runs = np.array(samples["run"]) * 1000
+                waits = np.array(samples["wait"] or [0.0]) * 1000
+                summary[name.rsplit(".", 1)[-1]] = {
+                    "count": len(runs),
+                    "wait_p50_ms": round(float(np.percentile(waits, 50)), 1),
+                    "wait_p95_ms": round(float(np.percentile(waits, 95)), 1),
+                    "run_p50_ms": round(float(np.percentile(runs, 50)), 1),
+                    "run_p95_ms": round(float(np.percentile(runs, 95)), 1),
+                    "run_max_ms": round(float(runs.max()), 1),
+                    "busy_seconds": round(float(runs.sum()) / 1000, 2),
+                }
+        return summary
+
+    def _on_publish(self, headers: dict, **kwargs: object) -> None:
+        with self._lock:
+            self._published[headers["id"]] = time.monotonic()
+
+    def _on_prerun(self, task_id: str, task: Task, **kwargs: object) -> None:
+        started = time.monotonic()
+        with self._lock:
+            self._started[task_id] = started
+            published = self._published.get(task_id)
+            if published is not None:
+                self._samples(task.name)["wait"].append(started - published)
+
+    def _on_postrun(self, task_id: str, task: Task, **kwargs: object) -> None:
+        finished = time.monotonic()
+        with self._lock:
+            started = self._started.pop(task_id, finished)
+            # a retry republishes under the same id while the task runs
+            if self._published.get(task_id, 0) <= started:
+                self._published.pop(task_id, None)
+            self._samples(task.name)["run"].append(finished - started)
+            self.first_finished.setdefault(task.name, finished)
+            self.last_activity = finished
+
+    def _samples(self, name: str) -> dict[str, list[float]]:
+        return self.samples.setdefault(name, {"wait": [], "run": []})
+
+
+def use_memory_services() -> None:
+    """
+    Redis and the celery broker in this process, postgres stays the configured one
+    """
+    if fakeredis is None:
+        raise SystemExit("fakeredis isn't installed: pip install 'fakeredis[lua]'")
+
+    get_redis_client().client = fakeredis.FakeRedis()
+    scan_app.conf.update(
+        broker_url="memory://",
+        result_backend="cache+memory://",
+        # the memory transport polls once a second by default, that would be all queue wait
+        broker_transport_options={"polling_interval": 0.01},
+    )
+
+
+async def seed_pairs(exchanges: FakeExchanges) -> None:
+    """
+    Insert the markets of the fake exchanges, like BatchFetcher.init_pairs_db does
+    """
+    crypto_fetcher = CryptoFetcher(exchange_factory=exchanges.create)
+    loaded = await crypto_fetcher.get_exchanges_with_markets(exchanges.exchange_names)
+
+    session = get_session_raw()
+    try:
+        for exchange in loaded:
+            insert_or_update_pairs(exchange.symbols, session)
+            insert_exchange_names(exchange.id, exchange.symbols, session)
+    finally:
+        session.close()
+
+
+def run_load(
+    exchanges: FakeExchanges, interval: str, threshold: int, timeout: float, settle: float
+) -> dict:
+    """
+    One full run over all pairs, returns its report
+
+    The run is over once it's fetched and no task was queued or running for @settle seconds
+    """
+    get_crypto_fetcher().exchange_factory = exchanges.create
+    asyncio.run(seed_pairs(exchanges))
+
+    timings = TaskTimings()
+    timings.connect()
+    queues = [
+        scan_app.conf.task_default_queue,
+        *[fetch_queue(exchange_name) for exchange_name in exchanges.exchange_names],
+    ]
+
+    run_id = new_run_id()
+    running_run_id = get_run_admission().admit(
+        run_id=run_id, interval=interval, threshold=threshold
+    )
+    if running_run_id:
+        raise SystemExit(f"Run {running_run_id} is in progress, try again once it's done")
+
+    with start_worker(scan_app, perform_ping_check=False, queues=queues, shutdown_timeout=60):
+        started = time.monotonic()
+        start_fetch_run.apply_async(
+            kwargs={"threshold": threshold, "interval": interval, "run_id": run_id}
+        )
+
+        info = {}
+        finished = False
+        while time.monotonic() - started < timeout:
+            time.sleep(0.1)
+            info = get_run_tracker().info(run_id)
+            idle = time.monotonic() - timings.last_activity
+            if "fetched_at" in info and not timings.in_flight() and idle >= settle:
+                finished = True
+                break
+
+    seconds = timings.last_activity - started
+    pairs = info.get("pairs", 0)
+    # a spread is stored once its compute ran, or once the batched writer flushed it
+    stored_by = "flush_computed_spreads" if get_result_sink() else "compute_cross_exchange_spread"
+    first_spread = next(
+        (at for name, at in timings.first_finished.items() if name.endswith(stored_by)), None
+    )
+
+    return {
+        "run_id": run_id,
+        "finished": finished,
+        "interval": interval,
+        "pairs": pairs,
+        "computed": info.get("computed", 0),
+        "seconds": round(seconds, 2),
+        "pairs_per_second": round(pairs / seconds, 1) if seconds > 0 else None,
+        "fetch_seconds": info.get("fetch_seconds"),
+        "time_to_first_spread": round(first_spread - started, 2) if first_spread else None,
+        "stages": timings.summary(),
+        "exchanges": exchanges.stats(),
+    }
+
+
+async def record(
+    exchange_names: list[str], symbols: list[str], interval: str, repeat: int, output: Path
+) -> None:
+    """
+    Fetch @symbols @repeat times from the real exchanges, recording every response
+    """
+    output.mkdir(parents=True, exist_ok=True)
+    await asyncio.gather(
+        *[
+            _record_exchange(
+                exchange=RecordingExchange(
+                    getattr(ccxt, exchange_name)(), output / f"{exchange_name}.jsonl"
+                ),
+                symbols=symbols,
+                interval=interval,
+                repeat=repeat,
+            )
+            for exchange_name in exchange_names
+        ]
+    )
+
+
+async def _record_exchange(
+    exchange: RecordingExchange, symbols: list[str], interval: str, repeat: int
+) -> None:
+    try:
+        await exchange.load_markets()
+        for _ in range(repeat):
+            for symbol in symbols:
+                if symbol not in exchange.symbols:
+                    continue
+                try:
+                    await exchange.fetch_ohlcv(symbol, interval)
+                except ccxt.BaseError as e:
+                    logger.warning(f"Recorded a failed fetch of {symbol} on {exchange.id}: {e}")
+    finally:
+        await exchange.close()
+
+
+def _format(report: dict) -> str:
+    lines = [
+        f"{'stage':<32}{'count':>8}{'wait p50':>10}{'wait p95':>10}"
+        f"{'run p50':>10}{'run p95':>10}{'run max':>10}{'busy s':>10}"
+    ]
+    for name, stage in report["stages"].items():
+        lines.append(
+            f"{name:<32}{stage['count']:>8}{stage['wait_p50_ms']:>10}{stage['wait_p95_ms']:>10}"
+            f"{stage['run_p50_ms']:>10}{stage['run_p95_ms']:>10}{stage['run_max_ms']:>10}"
+            f"{stage['busy_seconds']:>10}"
+        )
+    lines.append("")
+    for name, exchange in report["exchanges"].items():
+        outcomes = ", ".join(
+            f"{key} {value}"
+            for key, value in exchange.items()
+            if key not in ("requests", "p50_ms", "p95_ms", "max_ms")
+        )
+        lines.append(
+            f"{name:<12}{exchange['requests']:>8} requests, p50 {exchange['p50_ms']} ms, "
+            f"p95 {exchange['p95_ms']} ms ({outcomes})"
+        )
+    return "\n".join(lines) + "\n"
+
+
+def _profiles(args: argparse.Namespace) -> dict[str, dict]:
+    profiles = json.loads(args.profiles.read_text()) if args.profiles else {}
+    overrides = {
+        key: getattr(args, key)
+        for key in ["latency_ms", "latency_sigma", "rate_limit", "error_rate", "timeout_rate"]
+        if getattr(args, key) is not None
+    }
+    profiles["default"] = {**profiles.get("default", {}), **overrides}
+    return profiles
+
+
+def _parse_args() -> argparse.Namespace:
+    parser = argparse.ArgumentParser(
+        prog="python -m benchmarks.pipeline_load",
+        description="Load runs of the fetch -> redis -> celery -> postgres pipeline",
+    )
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    run = commands.add_parser("run", help="one full run against fake exchanges")
+    run.add_argument("--cryptos", type=int, default=1000, help="synthetic symbols")
+    run.add_argument("--listing-rate", type=float, default=0.6, help="share listed per exchange")
+    run.add_argument("--seed", type=int, default=42)
+    run.add_argument("--interval", default=batch_settings.DEFAULT_INTERVAL)
+    run.add_argument("--threshold", type=int, default=batch_settings.DEFAULT_THRESHOLD)
+    run.add_argument("--services", choices=["local", "memory"], default="local")
+    run.add_argument("--profiles", type=Path, default=None, help="json of profile overrides")
+    run.add_argument("--replay", type=Path, default=None, help="directory of recordings")
+    run.add_argument("--latency-ms", type=float, default=None)
+    run.add_argument("--latency-sigma", type=float, default=None)
+    run.add_argument("--rate-limit", type=int, default=None, help="requests per second")
+    run.add_argument("--error-rate", type=float, default=None)
+    run.add_argument("--timeout-rate", type=float, default=None)
+    run.add_argument("--timeout", type=float, default=3600, help="seconds to wait for the run")
+    run.add_argument("--settle", type=float, default=2, help="idle seconds ending the run")
+    run.add_argument("--output", type=Path, default=None, help="json report")
+
+    recorder = commands.add_parser("record", help="record responses of real exchanges")
+    recorder.add_argument("--exchanges", nargs="+", default=list(SUPPORTED_EXCHANGES.values()))
+    recorder.add_argument("--symbols", nargs="+", required=True)
+    recorder.add_argument("--interval", default=batch_settings.DEFAULT_INTERVAL)
+    recorder.add_argument("--repeat", type=int, default=1)
+    recorder.add_argument("-o", "--output", type=Path, required=True)
+    return parser.parse_args()
+
+
+def main() -> None:
+    args = _parse_args()
+    # cache writes log on info, that's a line per pair
+    logging.basicConfig(level=logging.WARNING)
+
+    if args.command == "record":
+        asyncio.run(
+            record(
+                exchange_names=args.exchanges,
+                symbols=args.symbols,
+                interval=args.interval,
+                repeat=args.repeat,
+                output=args.output,
+            )
+        )
+        return
+
+    # fake candles never end up in the real candle store
+    os.environ.setdefault("CANDLE_STORE_PATH", tempfile.mkdtemp(prefix="load-candles-"))
+    if args.services == "memory":
+        use_memory_services()
+
+    exchanges = FakeExchanges(
+        exchange_names=list(SUPPORTED_EXCHANGES.values()),
+        cryptos=args.cryptos,
+        listing_rate=args.listing_rate,
+        seed=args.seed,
+        profiles=_profiles(args),
+        replay_dir=args.replay,
+    )
+    report = run_load(
+        exchanges=exchanges,
+        interval=args.interval,
+        threshold=args.threshold,
+        timeout=args.timeout,
+        settle=args.settle,
+    )
+
+    sys.stdout.write(_format(report))
+    sys.stdout.write(
+        json.dumps(
+            {key: value for key, value in report.items() if key not in ("stages", "exchanges")}
+        )
+        + "\n"
+    )
+    if args.output:
+        args.output.write_text(json.dumps(report, indent=2))
+    if not report["finished"]:
+        raise SystemExit(f"Run didn't finish within {args.timeout}s")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,64 @@
+import numpy as np
+
+# 2024-01-01 UTC, any candle boundary works
+DEFAULT_START_MS = 1_704_067_200_000
+
+
+def synthetic_ohlc(
+    seed: int, exchanges: int, candles: int, **options: float
+) -> list[list[list[float]]]:
+    """
+    Seeded ohlc of one crypto on @exchanges exchanges, shaped like ccxt returns it
+
+    @options are the ones of synthetic_exchange_ohlc. Same arguments always give the same data
+    """
+    return [
+        synthetic_exchange_ohlc(seed=seed, exchange=exchange, candles=candles, **options)
+        for exchange in range(exchanges)
+    ]
+
+
+def synthetic_exchange_ohlc(
+    seed: int,
+    exchange: int,
+    candles: int,
+    interval_ms: int = 3_600_000,
+    gap_rate: float = 0.0,
+    max_offset_ms: int = 0,
+    corrupted_rows: int = 0,
+    spread_bps: float = 20.0,
+    start_ms: int = DEFAULT_START_MS,
+) -> list[list[float]]:
+    """
+    Seeded ohlc of one crypto on the @exchange-th exchange
+
+    Prices are a random walk shared by all exchanges of @seed plus per exchange noise
+    of about @spread_bps. The exchange misses a @gap_rate share of candles,
+    its timestamps are shifted by a fixed offset of up to ±@max_offset_ms,
+    and @corrupted_rows of its candles have NaN prices
+    """
+    times = start_ms + np.arange(candles, dtype=np.int64) * interval_ms
+    base = 100 * np.exp(np.cumsum(np.random.default_rng(seed).normal(0, 0.01, candles)))
+
+    rng = np.random.default_rng([seed, exchange])
+    close = base * (1 + rng.normal(0, spread_bps / 10_000, candles))
+    open_ = np.concatenate((close[:1], close[:-1]))
+    wiggle = np.abs(rng.normal(0, 0.002, (2, candles))) * close
+    high = np.maximum(open_, close) + wiggle[0]
+    low = np.minimum(open_, close) - wiggle[1]
+    volume = rng.lognormal(10, 1, candles)
+
+    offset = int(rng.integers(-max_offset_ms, max_offset_ms + 1)) if max_offset_ms else 0
+    ohlc = np.column_stack([times + offset, open_, high, low, close, volume])
+
+    if corrupted_rows:
+        rows = rng.choice(candles, size=min(corrupted_rows, candles), replace=False)
+        ohlc[rows, 1:5] = np.nan
+    if gap_rate:
+        ohlc = ohlc[rng.random(candles) >= gap_rate]
+
+    # ccxt hands out int timestamps and float prices
+    rows = ohlc.tolist()
+    for row in rows:
+        row[0] = int(row[0])
+    return rows
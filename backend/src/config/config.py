@@ -13,6 +13,16 @@ class RedisSettings(BaseSettings):
     REDIS_PORT: int = 6379
     REDIS_DB: int = 0
     REDIS_LOCAL: bool = True
+    # prefix of every key, see services/cache_keys.py
+    REDIS_KEY_NAMESPACE: str = "cct"
+    # connect to REDIS_HOST as a Redis Cluster entry node
+    REDIS_CLUSTER: bool = False
+
+    # optional in-process L1 tier in front of redis
+    L1_CACHE_ENABLED: bool = False
+    L1_CACHE_MAX_BYTES: int = 64 * 1024 * 1024
+    # L1 entries never outlive their redis key either
+    L1_CACHE_MAX_TTL: int = 30
 
     def construct_celery_url(self) -> str:
         redis_networkname = "localhost" if self.REDIS_LOCAL else "redis"
@@ -27,12 +37,178 @@ class CryptoBatchSettings(BaseSettings):
 
     # arbitrary as well, seems managable
     DEFAULT_CHUNK_SIZE: int = 100
-    DEFAULT_OHLC_TTL: int = 1000
+    # rows fetched per round trip from the server-side cursor
+    DEFAULT_YIELD_PER: int = 1000
+
+    # min. amount of exchanges with ohlc, for a crypto to be computed
+    COMPUTE_QUORUM: int = 2
+    # failed fetches are retried by their exchange's fetch workers
+    FETCH_RETRY_COUNTDOWN: int = 30
+    FETCH_MAX_RETRIES: int = 3
+    # runs heartbeat on every chunk, a dead run frees its scope after this
+    RUN_LOCK_TTL_MS: int = 300_000
+    # runs are fetched by celery workers, one queue per exchange
+    # the api only enqueues them. Ignored with the local compute backend
+    DISTRIBUTED_FETCH: bool = True
+    FETCH_QUEUE_PREFIX: str = "fetch"
 
     # arbitrary, used for sleep between batches
     # when ohlc is downloaded from external api
     # with http client
-    DEFAULT_SLEEP_TIME: float = 1
+    # adaptive concurrency paces the exchanges, so it's off by default
+    DEFAULT_SLEEP_TIME: float = 0
+
+
+class SpreadStatsSettings(BaseSettings):
+    # rolling windows in candles, e.g. 6h, 1d, 3d for 1h interval
+    ROLLING_WINDOWS: list[int] = [6, 24, 72]
+    # spread percent, above which a candle counts as an opportunity
+    PERSISTENCE_THRESHOLD: float = 1.0
+    # with incremental compute, max spread and statistics cover this many newest candles
+    SPREAD_WINDOW_CANDLES: int = 1000
+    # fold only new candles into a per crypto state kept in redis
+    INCREMENTAL_COMPUTE: bool = True
+    SPREAD_STATE_TTL: int = 7 * 86400
+    # every closed candle's spread goes to the spread_series table too
+    SPREAD_SERIES_ENABLED: bool = True
+    # monthly partitions entirely older than this are dropped
+    SPREAD_SERIES_RETENTION_DAYS: int = 90
+
+
+class ComputeBackendType(StrEnum):
+    # redis cache + celery workers, default for multi node setups
+    CELERY = auto()
+    # process pool inside the api process, no broker needed
+    LOCAL = auto()
+
+
+class ComputeSettings(BaseSettings):
+    COMPUTE_BACKEND: ComputeBackendType = ComputeBackendType.CELERY
+    # None means one worker per cpu
+    LOCAL_COMPUTE_WORKERS: int | None = None
+    # amount of computed spreads written to db in one transaction
+    LOCAL_WRITE_BATCH_SIZE: int = 100
+
+    # celery computes append results to a redis stream, flushed in batches
+    RESULT_SINK_ENABLED: bool = True
+    # rows per transaction, a full batch is flushed right away
+    RESULT_BATCH_SIZE: int = 500
+    # max time a result waits in the stream
+    RESULT_FLUSH_MS: int = 500
+    # results read by a flusher that died are taken over after this
+    RESULT_CLAIM_IDLE_MS: int = 60_000
+
+
+class AlignmentSettings(BaseSettings):
+    # 0 means exact timestamp intersection only
+    ALIGN_TOLERANCE_MS: int = 0
+    # max amount of missing candles in a row to forward fill, 0 disables it
+    ALIGN_FFILL_LIMIT: int = 0
+
+
+class ConcurrencySettings(BaseSettings):
+    # per exchange AIMD limits for ohlc downloads
+    ADAPTIVE_CONCURRENCY_ENABLED: bool = True
+    CONCURRENCY_INITIAL: int = 8
+    CONCURRENCY_MIN: int = 1
+    CONCURRENCY_MAX: int = 64
+    # multiplicative decrease on rate limits / timeouts / latency spikes
+    CONCURRENCY_DECREASE_FACTOR: float = 0.5
+    # latency above this multiple of the average counts as a spike
+    CONCURRENCY_LATENCY_SPIKE: float = 3.0
+
+
+class HttpSettings(BaseSettings):
+    # one connection pool shared by all ccxt exchanges
+    HTTP_POOL_ENABLED: bool = True
+    HTTP_POOL_LIMIT: int = 200
+    # keep it >= CONCURRENCY_MAX, or requests queue in the connector
+    HTTP_POOL_LIMIT_PER_HOST: int = 64
+    # seconds an idle connection is kept open for reuse
+    HTTP_KEEPALIVE_TIMEOUT: float = 60
+    HTTP_DNS_CACHE_TTL: int = 600
+    HTTP_CONNECT_TIMEOUT: float = 5
+    # whole request, passed to ccxt as its timeout too
+    HTTP_REQUEST_TIMEOUT_MS: int = 10000
+
+
+class CandleStoreSettings(BaseSettings):
+    # closed candles are kept on disk, exchanges are only asked for newer ones
+    CANDLE_STORE_ENABLED: bool = False
+    # share it between api and fetch workers, it's one directory per series.
+    # relative paths depend on the working directory, configure an absolute one
+    CANDLE_STORE_PATH: str = ".candles"
+    # newest stored candles served per fetch
+    CANDLE_STORE_SERVE_CANDLES: int = 1000
+    # serve stored candles only, never call exchanges (e.g. reprocessing)
+    CANDLE_STORE_OFFLINE: bool = False
+
+
+class ExportSettings(BaseSettings):
+    # arrow / parquet exports are built and sent in chunks, memory stays flat
+    EXPORT_CHUNK_CRYPTOS: int = 200
+    EXPORT_CHUNK_ROWS: int = 5000
+    PARQUET_COMPRESSION: str = "zstd"
+
+
+class MetricsSettings(BaseSettings):
+    # celery workers serve /metrics on this port from their main process, None disables it
+    # prefork children need PROMETHEUS_MULTIPROC_DIR set, see services/metrics.py
+    METRICS_WORKER_PORT: int | None = 9808
+
+
+class TracingSettings(BaseSettings):
+    # spans of a run follow its cryptos from fetch to the stored spread, see services/tracing.py
+    TRACING_ENABLED: bool = False
+    # share of runs traced, decided by run id so every process agrees
+    TRACE_SAMPLE_RATE: float = 1.0
+    # spans are appended as json lines, None skips the file
+    TRACE_FILE: str | None = "traces/spans.jsonl"
+    # OTLP/HTTP json endpoint, e.g. http://otel-collector:4318/v1/traces
+    TRACE_COLLECTOR_URL: str | None = None
+
+
+class ChangeDetection(StrEnum):
+    # ohlc changed if its newest candle did, cheap and enough on aligned refreshes
+    LAST_CANDLE = auto()
+    # hash of the whole series, also catches revised older candles
+    CONTENT_HASH = auto()
+
+
+class SchedulerSettings(BaseSettings):
+    # celery beat refreshes, see background/celery/schedule.py
+    SCHEDULER_ENABLED: bool = False
+    SCHEDULER_INTERVALS: list[str] = ["1h"]
+    # refresh cadence, aligned to its own boundaries. Defaults to every candle close
+    SCHEDULER_REFRESH_EVERY: str | None = None
+    CHANGE_DETECTION: ChangeDetection = ChangeDetection.LAST_CANDLE
+    # fingerprints of unchanged ohlc have to outlive a few refreshes
+    FINGERPRINT_TTL: int = 7 * 86400
+    # runs kept per interval for timing reports
+    RUN_HISTORY_SIZE: int = 50
+    RUN_INFO_TTL: int = 2 * 86400
+
+
+class CacheSettings(BaseSettings):
+    # seconds after candle close, until exchanges surely publish the closed candle
+    CACHE_CLOSE_GRACE: int = 30
+    CACHE_MIN_TTL: int = 60
+    # seconds expired ohlc is still served while refreshing in background
+    CACHE_STALE_WINDOW: int = 300
+    # upper bound for ohlc waiting for a compute, in case it never gets consumed
+    CACHE_PIN_MAX_TTL: int = 6 * 3600
+
+    # collapse concurrent identical ohlc fetches, also across processes.
+    # A run never fetches the same ohlc twice, so it's only worth it with overlapping runs
+    SINGLE_FLIGHT_ENABLED: bool = False
+    # max time other processes wait for the fetching one
+    SINGLE_FLIGHT_LOCK_TTL_MS: int = 10000
+    SINGLE_FLIGHT_POLL_MS: int = 100
+    # fetched result is shared through redis for that long
+    SINGLE_FLIGHT_RESULT_TTL: int = 5
+
+    # top-n spreads served from redis sorted sets, postgres stays the source of truth
+    LEADERBOARD_ENABLED: bool = True
 
 
 class LocalTimeZone(BaseSettings):
@@ -40,6 +216,7 @@ class LocalTimeZone(BaseSettings):
     TIMEZONE: str = "Europe/Berlin"
 
 
+# interval lengths in seconds, cache expiry aligns to them
 CACHE_TTL_CONFIG: dict = {
     "5m": 300,
     "30m": 1800,
@@ -47,7 +224,7 @@ CACHE_TTL_CONFIG: dict = {
     "4h": 14400,
     "1d": 86400,
     "1w": 604800,
-    "1M": 604800,
+    "1M": 2592000,
 }
 
 
@@ -61,6 +238,15 @@ class Exchange(StrEnum):
     KUCION = "kucoin"
 
 
+class FetchStatus(StrEnum):
+    PENDING = auto()
+    OK = auto()
+    # transient errors, worth a retry
+    FAILED = auto()
+    # exchange doesn't serve this symbol / interval, retrying won't help
+    UNSUPPORTED = auto()
+
+
 class TickerType(StrEnum):
     OHLC = auto()
     CHART_LINE = auto()
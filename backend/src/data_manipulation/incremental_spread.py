@@ -0,0 +1,162 @@
+import logging
+from collections import deque
+
+import pandas as pd
+from data_manipulation.spread_statistics import SpreadStatistics
+
+logger = logging.getLogger(__name__)
+
+
+class SpreadState:
+    def __init__(
+        self,
+        ce_ids: list[int],
+        max_candles: int,
+        times: list[int] | None = None,
+        spread_percent: list[float] | None = None,
+        high_ids: list[int] | None = None,
+        low_ids: list[int] | None = None,
+        evicted: int = 0,
+        max_queue: list[int] | None = None,
+    ) -> None:
+        """
+        Running per candle spread of one crypto over its last @max_candles closed candles
+
+        New candles are folded in one by one, the oldest fall out of the window.
+        Max spread is kept with a monotonic queue, so both are O(1) amortized per candle.
+
+        Positions in max_queue are absolute (counting evicted candles too),
+        the window starts at position @evicted
+        """
+        self.ce_ids = ce_ids
+        self.max_candles = max_candles
+        self.times = deque(times or [])
+        self.spread_percent = deque(spread_percent or [])
+        self.high_ids = deque(high_ids or [])
+        self.low_ids = deque(low_ids or [])
+        self.evicted = evicted
+        # positions with decreasing spread, front is the window max
+        self.max_queue = deque(max_queue or [])
+
+    @property
+    def last_time(self) -> int | None:
+        """
+        Time of the newest folded candle, in ms
+        """
+        return self.times[-1] if self.times else None
+
+    def fold(self, spreads_df: pd.DataFrame) -> None:
+        """
+        Append closed candles of a Spread frame, newer than the last folded one
+        """
+        if spreads_df.empty:
+            return
+
+        times = _to_ms(spreads_df.index)
+        rows = zip(
+            times,
+            spreads_df["spread_percent"].to_numpy(),
+            spreads_df["high_exchange_id"].to_numpy(),
+            spreads_df["low_exchange_id"].to_numpy(),
+            strict=True,
+        )
+        for time, spread_percent, high_id, low_id in rows:
+            if self.last_time is not None and time <= self.last_time:
+                continue
+            self._append(int(time), float(spread_percent), int(high_id), int(low_id))
+
+    def _append(self, time: int, spread_percent: float, high_id: int, low_id: int) -> None:
+        position = self.evicted + len(self.times)
+        self.times.append(time)
+        self.spread_percent.append(spread_percent)
+        self.high_ids.append(high_id)
+        self.low_ids.append(low_id)
+
+        while self.max_queue and self._spread_at(self.max_queue[-1]) <= spread_percent:
+            self.max_queue.pop()
+        self.max_queue.append(position)
+
+        if len(self.times) > self.max_candles:
+            self._evict_oldest()
+
+    def _evict_oldest(self) -> None:
+        self.times.popleft()
+        self.spread_percent.popleft()
+        self.high_ids.popleft()
+        self.low_ids.popleft()
+        if self.max_queue and self.max_queue[0] == self.evicted:
+            self.max_queue.popleft()
+        self.evicted += 1
+
+    def _spread_at(self, position: int) -> float:
+        return self.spread_percent[position - self.evicted]
+
+    def max_spread(self, tail: pd.DataFrame | None = None) -> dict:
+        """
+        Max spread of the window, @tail holds not yet closed candles
+        """
+        best = None
+        if self.max_queue:
+            index = self.max_queue[0] - self.evicted
+            best = {
+                "time": pd.Timestamp(self.times[index], unit="ms", tz="UTC"),
+                "spread_percent": self.spread_percent[index],
+                "high_exchange_id": self.high_ids[index],
+                "low_exchange_id": self.low_ids[index],
+            }
+
+        if tail is not None and not tail.empty:
+            tail_max = tail.loc[tail["spread_percent"].idxmax()]
+            if best is None or tail_max["spread_percent"] > best["spread_percent"]:
+                best = {
+                    "time": tail_max.name,
+                    "spread_percent": float(tail_max["spread_percent"]),
+                    "high_exchange_id": int(tail_max["high_exchange_id"]),
+                    "low_exchange_id": int(tail_max["low_exchange_id"]),
+                }
+        return best or {}
+
+    def statistics(
+        self,
+        windows: list[int],
+        persistence_threshold: float,
+        tail: pd.DataFrame | None = None,
+    ) -> dict:
+        """
+        Window statistics over the folded candles and @tail
+
+        Runs and rolling windows need the whole window, they're recomputed
+        vectorized over at most @max_candles values, never over the full history.
+        So unlike fold and max, this is O(@max_candles) per call, not O(1) per candle
+        """
+        values = list(self.spread_percent)
+        if tail is not None and not tail.empty:
+            values.extend(tail["spread_percent"].to_list())
+        if not values:
+            return {}
+
+        return SpreadStatistics(
+            spread_percent=pd.Series(values, dtype="float64"),
+            windows=windows,
+            persistence_threshold=persistence_threshold,
+        ).summary()
+
+    def to_dict(self) -> dict:
+        return {
+            "ce_ids": self.ce_ids,
+            "max_candles": self.max_candles,
+            "times": list(self.times),
+            "spread_percent": list(self.spread_percent),
+            "high_ids": list(self.high_ids),
+            "low_ids": list(self.low_ids),
+            "evicted": self.evicted,
+            "max_queue": list(self.max_queue),
+        }
+
+    @classmethod
+    def from_dict(cls, data: dict) -> "SpreadState":
+        return cls(**data)
+
+
+def _to_ms(index: pd.Index) -> list[int]:
+    return pd.DatetimeIndex(index).as_unit("ms").asi8.tolist()
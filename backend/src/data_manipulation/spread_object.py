@@ -1,11 +1,23 @@
 import logging
 
+import numpy as np
 import pandas as pd
+from data_manipulation.spread_statistics import SpreadStatistics
 
 # derived from DB Model names
 DEFAULT_COLUMN_NAMES = ["spread", "spread_percent", "high_exchange_id", "low_exchange_id"]
 DEFAULT_COLUMNS_TO_KEEP = ["time", "spread_percent", "high_exchange_id", "low_exchange_id"]
 
+# one row per candle of a spread series, time in ms
+SERIES_DTYPE = np.dtype(
+    [
+        ("time", np.int64),
+        ("spread_percent", np.float32),
+        ("high_exchange_id", np.int32),
+        ("low_exchange_id", np.int32),
+    ]
+)
+
 logger = logging.getLogger(__name__)
 
 
@@ -46,7 +58,8 @@ class Spread:
         )
 
     def _construct_frame_from_records(self, data: pd.Series, index: pd.Index) -> pd.DataFrame:
-        return pd.DataFrame.from_records(data=data, columns=self._cnames, index=index)
+        # positional access into a time indexed Series is gone in pandas 3
+        return pd.DataFrame.from_records(data=data.to_list(), columns=self._cnames, index=index)
 
     def _calculate_max_spread_per_row(self, x: pd.Series) -> tuple[int | str]:
         max, min = x.max(), x.min()
@@ -70,5 +83,37 @@ class Spread:
         max_spread_dict["time"] = max_spread_row.name
         return {col: max_spread_dict.get(col) for col in columns_to_keep}
 
+    def get_statistics(self, windows: list[int], persistence_threshold: float) -> dict:
+        """
+        Get rolling / persistence statistics for the whole pair
+
+        Meant to be stored next to the max spread
+        """
+        if self.spreads_df.empty:
+            return {}
+        return SpreadStatistics(
+            spread_percent=self.spreads_df["spread_percent"],
+            windows=windows,
+            persistence_threshold=persistence_threshold,
+        ).summary()
+
     def get_as_dict(self) -> dict:
         return self.spreads_df.to_dict(orient="index")
+
+
+def series_rows(spreads_df: pd.DataFrame) -> np.ndarray:
+    """
+    Spreads frame as a SERIES_DTYPE array, candles with undefined spread are dropped
+    """
+    if spreads_df.empty:
+        return np.empty(0, dtype=SERIES_DTYPE)
+
+    spread_percent = spreads_df["spread_percent"].to_numpy(dtype=np.float64)
+    finite = np.isfinite(spread_percent)
+
+    rows = np.empty(int(finite.sum()), dtype=SERIES_DTYPE)
+    rows["time"] = spreads_df.index.as_unit("ms").asi8[finite]
+    rows["spread_percent"] = spread_percent[finite]
+    rows["high_exchange_id"] = spreads_df["high_exchange_id"].to_numpy()[finite]
+    rows["low_exchange_id"] = spreads_df["low_exchange_id"].to_numpy()[finite]
+    return rows
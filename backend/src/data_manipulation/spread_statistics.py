@@ -0,0 +1,115 @@
+import logging
+
+import numpy as np
+import pandas as pd
+
+logger = logging.getLogger(__name__)
+
+
+class SpreadStatistics:
+    def __init__(
+        self,
+        spread_percent: pd.Series,
+        windows: list[int],
+        persistence_threshold: float,
+        revert_level: float | None = None,
+    ) -> None:
+        """
+        Rolling and run-length statistics over a per-candle spread series.
+
+        Everything is computed with whole-array numpy / pandas operations,
+        so the cost is O(n) per window and there are no python loops over rows.
+
+        revert_level is the spread a run above @persistence_threshold has
+        to fall back to, to count as reverted. Defaults to the series median
+        """
+        self.series = spread_percent.astype("float64")
+        self.windows = windows
+        self.threshold = persistence_threshold
+
+        self._values = self.series.to_numpy()
+        median = float(np.median(self._values)) if self._values.size else 0.0
+        # a run can't be reverted on its first candle,
+        # so the revert level is never above the threshold
+        self.revert_level = min(
+            revert_level if revert_level is not None else median, persistence_threshold
+        )
+
+    def rolling_frame(self) -> pd.DataFrame:
+        """
+        Rolling mean and std of spread_percent for every configured window
+        """
+        columns = {}
+        for window in self.windows:
+            rolling = self.series.rolling(window=window, min_periods=window)
+            columns[f"mean_{window}"] = rolling.mean()
+            columns[f"std_{window}"] = rolling.std()
+        return pd.DataFrame(columns, index=self.series.index)
+
+    def longest_run_above(self) -> int:
+        """
+        Longest amount of consecutive candles with spread above threshold
+        """
+        above = self._values > self.threshold
+        if not above.any():
+            return 0
+
+        # every False starts a new run id,
+        # so all candles of one run above the threshold share the same id
+        run_ids = np.cumsum(~above)
+        return int(np.bincount(run_ids[above]).max())
+
+    def revert_candles(self) -> np.ndarray:
+        """
+        Amount of candles each run above threshold needed to revert
+
+        Runs which didn't revert until the end of the series are left out
+        """
+        n = self._values.size
+        if not n:
+            return np.empty(0, dtype=np.int64)
+
+        positions = np.arange(n)
+        reverted = self._values <= self.revert_level
+
+        # position of the next reverted candle at or after every position
+        # n means the spread never reverted afterwards
+        next_revert = np.minimum.accumulate(np.where(reverted, positions, n)[::-1])[::-1]
+
+        above = self._values > self.threshold
+        run_starts = positions[above & ~np.concatenate(([False], above[:-1]))]
+
+        run_ends = next_revert[run_starts]
+        closed = run_ends < n
+        return run_ends[closed] - run_starts[closed]
+
+    # db-ready dict, stored next to the max spread
+    def summary(self) -> dict:
+        if self.series.empty:
+            return {}
+
+        rolling = self.rolling_frame()
+        rolling_stats = {
+            str(window): {
+                "max_mean": _to_nullable(rolling[f"mean_{window}"].max()),
+                "last_mean": _to_nullable(rolling[f"mean_{window}"].iloc[-1]),
+                "last_std": _to_nullable(rolling[f"std_{window}"].iloc[-1]),
+            }
+            for window in self.windows
+        }
+
+        revert_candles = self.revert_candles()
+        return {
+            "mean_spread_percent": _to_nullable(self.series.mean()),
+            "std_spread_percent": _to_nullable(self.series.std()),
+            "longest_run_above": self.longest_run_above(),
+            "mean_revert_candles": (
+                _to_nullable(revert_candles.mean()) if revert_candles.size else None
+            ),
+            "rolling_stats": rolling_stats,
+        }
+
+
+def _to_nullable(value: float) -> float | None:
+    # NaN can't be stored as JSON, and means "not enough candles" anyway
+    return None if pd.isna(value) else float(value)
@@ -1,6 +1,8 @@
 import logging
 from typing import Annotated
 
+import ccxt
+import numpy as np
 import pandas as pd
 from fastapi import Depends
 
@@ -8,13 +10,54 @@ logger = logging.getLogger(__name__)
 
 
 class TimeframeSynchronizer:
-    def __init__(self) -> None:
+    def __init__(
+        self, tolerance_ms: int = 0, ffill_limit: int = 0, interval: str | None = None
+    ) -> None:
+        """
+        With default parameters only exact timestamp intersections are kept.
+
+        tolerance_ms > 0 matches candles to the nearest timestamp of a reference grid
+        if they are at most @tolerance_ms apart. It has to stay below half an interval,
+        or one candle could match two grid rows: checked against @interval if given,
+        otherwise capped at the candle spacing of every synced grid.
+        ffill_limit > 0 forward fills up to @ffill_limit missing candles in a row.
+        """
+        if tolerance_ms < 0 or ffill_limit < 0:
+            raise ValueError("Alignment tolerance and forward fill limit can't be negative")
+        if interval and tolerance_ms * 2 >= ccxt.Exchange.parse_timeframe(interval) * 1000:
+            raise ValueError(
+                f"Alignment tolerance of {tolerance_ms}ms isn't below half of {interval}"
+            )
+
         self._cnames = ["time", "open", "high", "low", "close", "volume"]
+        self.tolerance_ms = tolerance_ms
+        self.ffill_limit = ffill_limit
+
+        # per exchange alignment report of the last sync_many call
+        # same order as the frames returned
+        self.coverage: list[dict] = []
+
+    @classmethod
+    def from_interval(
+        cls, interval: str, tolerance_fraction: float, ffill_limit: int = 0
+    ) -> "TimeframeSynchronizer":
+        """
+        Tolerance as a fraction of the candle interval, e.g. 0.1 of 1h = ±6 minutes
+        """
+        interval_ms = ccxt.Exchange.parse_timeframe(interval) * 1000
+        return cls(
+            tolerance_ms=int(interval_ms * tolerance_fraction),
+            ffill_limit=ffill_limit,
+            interval=interval,
+        )
 
     def sync_many(self, ohlc_data_entries: list[list[list[float]]]) -> list[pd.DataFrame]:
+        if self.tolerance_ms or self.ffill_limit:
+            return self._sync_nearest(ohlc_data_entries)
+
         dataframes_raw: list[pd.DataFrame] = []
         for ohlc_entry in ohlc_data_entries:
-            if len(ohlc_entry[0]) != len(self._cnames):
+            if not len(ohlc_entry) or len(ohlc_entry[0]) != len(self._cnames):
                 logger.error("OHLC CORRUPTED! SKIPPING")
                 continue
 
@@ -22,11 +65,136 @@ class TimeframeSynchronizer:
             df.index = pd.to_datetime(df.index, unit="ms", origin="unix", utc=True)
             dataframes_raw.append(df)
 
+        if not dataframes_raw:
+            return self._empty_frames(len(ohlc_data_entries))
+
         common_index = dataframes_raw[0].index
         for df in dataframes_raw[1:]:
             common_index = df.index.intersection(common_index)
 
+        self.coverage = [
+            {
+                "candles": len(df),
+                "matched": len(common_index),
+                "filled": 0,
+                "coverage": _coverage(aligned=len(common_index), candles=len(df)),
+            }
+            for df in dataframes_raw
+        ]
         return [df.loc[common_index] for df in dataframes_raw]
 
+    def _sync_nearest(self, ohlc_data_entries: list[list[list[float]]]) -> list[pd.DataFrame]:
+        """
+        Align every exchange onto the grid of the exchange with most candles
+
+        Matching is a sorted-array nearest search (np.searchsorted),
+        forward filling is a running max over matched positions.
+        Only python loop is over exchanges, never over candles
+        """
+        arrays: list[np.ndarray] = []
+        for ohlc_entry in ohlc_data_entries:
+            array = np.asarray(ohlc_entry, dtype=np.float64)
+            if array.ndim != 2 or array.shape[1] != len(self._cnames):
+                logger.error("OHLC CORRUPTED! SKIPPING")
+                continue
+            # exchanges usually return sorted candles, but it isn't guaranteed
+            arrays.append(array[np.argsort(array[:, 0], kind="stable")])
+
+        # every exchange returned garbage
+        if not arrays:
+            return self._empty_frames(len(ohlc_data_entries))
+
+        reference = max(arrays, key=len)
+        grid = reference[:, 0].astype(np.int64)
+        grid_positions = np.arange(grid.size)
+        tolerance_ms = self._grid_tolerance(grid)
+
+        source_rows: list[np.ndarray] = []
+        self.coverage = []
+        for array in arrays:
+            times = array[:, 0].astype(np.int64)
+            matched = self._nearest_rows(times=times, grid=grid, tolerance_ms=tolerance_ms)
+            filled = self._forward_fill_rows(matched=matched, grid_positions=grid_positions)
+
+            source_rows.append(filled)
+            self.coverage.append(
+                {
+                    "candles": len(array),
+                    "matched": int((matched >= 0).sum()),
+                    "filled": int((filled >= 0).sum() - (matched >= 0).sum()),
+                }
+            )
+
+        # keep only grid rows every exchange has a candle for
+        common = np.logical_and.reduce([rows >= 0 for rows in source_rows])
+        common_index = pd.to_datetime(grid[common], unit="ms", origin="unix", utc=True)
+        common_index.name = self._cnames[0]
+
+        for report in self.coverage:
+            report["coverage"] = _coverage(aligned=int(common.sum()), candles=report["candles"])
+
+        return [
+            pd.DataFrame(array[rows[common], 1:], columns=self._cnames[1:], index=common_index)
+            for array, rows in zip(arrays, source_rows, strict=True)
+        ]
+
+    def _grid_tolerance(self, grid: np.ndarray) -> int:
+        """
+        @tolerance_ms capped below half the grid's candle spacing,
+        so one candle never matches two grid rows
+        """
+        steps = np.diff(grid)
+        steps = steps[steps > 0]
+        if not steps.size or self.tolerance_ms * 2 < steps.min():
+            return self.tolerance_ms
+
+        capped = int(steps.min() - 1) // 2
+        logger.warning(
+            f"Alignment tolerance of {self.tolerance_ms}ms isn't below half a candle, "
+            f"using {capped}ms"
+        )
+        return capped
+
+    def _empty_frames(self, count: int) -> list[pd.DataFrame]:
+        # callers look at the first frame, so there's at least one
+        self.coverage = []
+        index = pd.DatetimeIndex([], tz="UTC", name=self._cnames[0])
+        return [pd.DataFrame(columns=self._cnames[1:], index=index) for _ in range(max(count, 1))]
+
+    def _nearest_rows(self, times: np.ndarray, grid: np.ndarray, tolerance_ms: int) -> np.ndarray:
+        """
+        Row in @times nearest to every grid timestamp, -1 if out of @tolerance_ms
+        """
+        right = np.clip(np.searchsorted(times, grid), 0, times.size - 1)
+        left = np.clip(right - 1, 0, times.size - 1)
+
+        right_distance = np.abs(times[right] - grid)
+        left_distance = np.abs(times[left] - grid)
+
+        nearest = np.where(left_distance <= right_distance, left, right)
+        distance = np.minimum(left_distance, right_distance)
+        return np.where(distance <= tolerance_ms, nearest, -1)
+
+    def _forward_fill_rows(self, matched: np.ndarray, grid_positions: np.ndarray) -> np.ndarray:
+        """
+        Reuse the last matched row for at most @ffill_limit grid rows in a row
+        """
+        if not self.ffill_limit:
+            return matched
+
+        last_matched_position = np.maximum.accumulate(np.where(matched >= 0, grid_positions, -1))
+        gap = grid_positions - last_matched_position
+
+        fillable = (matched < 0) & (last_matched_position >= 0) & (gap <= self.ffill_limit)
+        filled = matched.copy()
+        filled[fillable] = matched[last_matched_position[fillable]]
+        return filled
+
+
+def _coverage(aligned: int, candles: int) -> float:
+    # share of an exchange's own candles that made it into the aligned frames
+    # forward filled rows can push it above 1, so it's capped
+    return round(min(aligned / candles, 1.0), 4) if candles else 0.0
+
 
 TimeframesSyncDependency = Annotated[TimeframeSynchronizer, Depends()]
@@ -1,4 +1,6 @@
-from sqlalchemy import TIMESTAMP, ForeignKey, UniqueConstraint
+from config.config import FetchStatus
+from sqlalchemy import REAL, TIMESTAMP, ForeignKey, Index, String, UniqueConstraint, func
+from sqlalchemy.dialects.postgresql import JSONB
 from sqlalchemy.orm import DeclarativeBase, Mapped, mapped_column, relationship
 
 
@@ -35,22 +37,37 @@ class SupportedExchangesByCrypto(Base):
 
 
 class BatchStatus(Base):
+    """
+    Fetch / compute progress of every pair of a run
+
+    Rows are scoped by run, runs of other intervals or thresholds can be in progress
+    at the same time
+    """
+
     __tablename__ = "batch_status"
 
+    run_id: Mapped[str] = mapped_column(primary_key=True)
     id: Mapped[int] = mapped_column(
         ForeignKey(SupportedExchangesByCrypto.id),
         primary_key=True,
     )
     crypto_id: Mapped[int] = mapped_column(ForeignKey(CryptoPairName.id), nullable=False)
     interval: Mapped[str] = mapped_column(nullable=False)
+    threshold: Mapped[int] = mapped_column(nullable=False)
+    # rows of a run are kept while its computes may still come in
+    created_at = mapped_column(TIMESTAMP(timezone=True), nullable=False, server_default=func.now())
 
     # actual status columns
+    # one of config.FetchStatus
+    fetch_status: Mapped[str] = mapped_column(nullable=False, server_default=FetchStatus.PENDING)
     saved_cache: Mapped[bool] = mapped_column(nullable=False)
     difference_found: Mapped[bool] = mapped_column(nullable=False)
     saved_db: Mapped[bool] = mapped_column(nullable=False)
 
     crypto_id_ref: Mapped["CryptoPairName"] = relationship(back_populates="batch_stats")
 
+    __table_args__ = (Index("ix_batch_status_run_crypto", "run_id", "crypto_id"),)
+
 
 class ComputedSpreadMax(Base):
     __tablename__ = "computed_spread_max"
@@ -63,3 +80,38 @@ class ComputedSpreadMax(Base):
     high_exchange_id: Mapped[int] = mapped_column(ForeignKey(SupportedExchangesByCrypto.id))
     low_exchange_id: Mapped[int] = mapped_column(ForeignKey(SupportedExchangesByCrypto.id))
     spread_percent: Mapped[float] = mapped_column(nullable=False)
+    # interval of the ohlc the spread was computed on, one row per crypto and interval
+    interval: Mapped[str] = mapped_column(primary_key=True)
+
+    # persistence statistics over the whole fetched spread series,
+    # the newest SPREAD_WINDOW_CANDLES with incremental compute
+    mean_spread_percent: Mapped[float | None] = mapped_column(nullable=True)
+    std_spread_percent: Mapped[float | None] = mapped_column(nullable=True)
+    longest_run_above: Mapped[int | None] = mapped_column(nullable=True)
+    mean_revert_candles: Mapped[float | None] = mapped_column(nullable=True)
+    # per rolling window: {"24": {"max_mean": .., "last_mean": .., "last_std": ..}}
+    rolling_stats = mapped_column(JSONB, nullable=True)
+
+
+class SpreadSeries(Base):
+    """
+    Spread of every closed candle, range partitioned by month on time
+
+    Written with COPY only, partitions are created on demand.
+    No foreign keys, they'd cost a lookup per copied row
+    """
+
+    __tablename__ = "spread_series"
+
+    crypto_id: Mapped[int] = mapped_column(primary_key=True)
+    interval: Mapped[str] = mapped_column(String(4), primary_key=True)
+    time = mapped_column(TIMESTAMP(timezone=True), primary_key=True)
+    spread_percent: Mapped[float] = mapped_column(REAL, nullable=False)
+    high_exchange_id: Mapped[int] = mapped_column(nullable=False)
+    low_exchange_id: Mapped[int] = mapped_column(nullable=False)
+
+    __table_args__ = (
+        # rows arrive roughly in time order, a brin index stays tiny
+        Index("ix_spread_series_time_brin", "time", postgresql_using="brin"),
+        {"postgresql_partition_by": "RANGE (time)"},
+    )
@@ -0,0 +1,78 @@
+from typing import Annotated
+
+from background import export
+from config.config import AlignmentSettings, CryptoBatchSettings
+from fastapi import APIRouter, HTTPException, Query
+from fastapi.responses import StreamingResponse
+from utils.dependencies.dependencies import CandleStoreDependency
+
+export_router = APIRouter(prefix="/export")
+batch_settings = CryptoBatchSettings()
+
+
+@export_router.get("/ohlc")
+def export_aligned_ohlc(
+    candle_store: CandleStoreDependency,
+    interval: str | None = None,
+    symbols: Annotated[list[str] | None, Query()] = None,
+) -> StreamingResponse:
+    """
+    Stored OHLC aligned across exchanges, as an Arrow IPC stream.
+
+    Long format (symbol, exchange, time, ohlcv), one record batch per symbol.
+    All stored symbols if none are given.
+    """
+    _require_arrow()
+    if not candle_store:
+        raise HTTPException(status_code=404, detail="Candle store is disabled")
+
+    batches = export.aligned_ohlc_batches(
+        store=candle_store,
+        interval=interval or batch_settings.DEFAULT_INTERVAL,
+        alignment=AlignmentSettings(),
+        symbols=symbols,
+    )
+    return _arrow_response(export.ohlc_schema(), batches)
+
+
+@export_router.get("/spread-series")
+def export_spread_series(
+    interval: str | None = None,
+    crypto_ids: Annotated[list[int] | None, Query()] = None,
+) -> StreamingResponse:
+    """
+    Stored per-candle spreads, as an Arrow IPC stream.
+
+    All cryptos with a stored series if no crypto_ids are given.
+    """
+    _require_arrow()
+    batches = export.with_session(
+        lambda session: export.spread_series_batches(
+            session=session,
+            interval=interval or batch_settings.DEFAULT_INTERVAL,
+            crypto_ids=crypto_ids,
+        )
+    )
+    return _arrow_response(export.series_schema(), batches)
+
+
+@export_router.get("/computed")
+def export_computed_spreads() -> StreamingResponse:
+    """
+    Computed max spreads with statistics, as an Arrow IPC stream.
+    """
+    _require_arrow()
+    batches = export.with_session(export.computed_spread_batches)
+    return _arrow_response(export.computed_schema(), batches)
+
+
+def _require_arrow() -> None:
+    if not export.available():
+        raise HTTPException(status_code=501, detail="Exports need pyarrow installed")
+
+
+def _arrow_response(schema: object, batches: object) -> StreamingResponse:
+    # sync iterator, starlette drains it in a threadpool
+    return StreamingResponse(
+        export.arrow_stream(schema, batches), media_type=export.ARROW_STREAM_MEDIA_TYPE
+    )
@@ -1,4 +1,5 @@
 import logging
+import time
 from contextlib import asynccontextmanager
 
 import ccxt
@@ -6,8 +7,11 @@ from config.database import run_alembic_migrations
 from config.logs import setup_logging
 from fastapi import FastAPI, Request
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import JSONResponse
+from fastapi.responses import JSONResponse, Response
+from routes.export import export_router
+from routes.metrics import metrics_router
 from routes.scan_spreads import spreads_router
+from services.metrics import HTTP_SECONDS
 from utils.dependencies.dependencies import get_crypto_fetcher
 
 logger = logging.getLogger(__name__)
@@ -33,6 +37,22 @@ app.add_middleware(
 )
 
 app.include_router(spreads_router)
+app.include_router(export_router)
+app.include_router(metrics_router)
+
+
+@app.middleware("http")
+async def observe_latency(request: Request, call_next) -> Response:  # noqa: ANN001
+    started = time.perf_counter()
+    response = await call_next(request)
+    # route templates, raw paths would make a label per crypto id
+    route = request.scope.get("route")
+    HTTP_SECONDS.labels(
+        method=request.method,
+        route=route.path if route else "unmatched",
+        status=response.status_code,
+    ).observe(time.perf_counter() - started)
+    return response
 
 
 @app.exception_handler(ValueError)
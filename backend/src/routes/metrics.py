@@ -0,0 +1,47 @@
+from typing import Iterator
+
+from background.celery.fetch_worker import fetch_queue
+from config.config import SUPPORTED_EXCHANGES
+from fastapi import APIRouter, Response
+from prometheus_client import CONTENT_TYPE_LATEST
+from prometheus_client.core import GaugeMetricFamily
+from prometheus_client.registry import Collector
+from services.caching import RedisClient
+from services.metrics import exposition
+from utils.dependencies.dependencies import RedisClientDependency
+
+metrics_router = APIRouter()
+
+
+class QueueDepthCollector(Collector):
+    """
+    Messages waiting in celery's redis queues, read at scrape time
+    """
+
+    def __init__(self, redis_client: RedisClient, queues: list[str]) -> None:
+        self.redis_client = redis_client
+        self.queues = queues
+
+    def collect(self) -> Iterator[GaugeMetricFamily]:
+        depth = GaugeMetricFamily("cct_celery_queue_depth", "Queued celery tasks", labels=["queue"])
+        if self.redis_client.client:
+            pipe = self.redis_client.client.pipeline(transaction=False)
+            for queue in self.queues:
+                pipe.llen(queue)
+            for queue, length in zip(self.queues, pipe.execute(), strict=True):
+                depth.add_metric([queue], length)
+        yield depth
+
+
+@metrics_router.get("/metrics", include_in_schema=False)
+def metrics(redis_client: RedisClientDependency) -> Response:
+    """
+    Prometheus scrape endpoint, worker metrics are served by the workers themselves
+    """
+    # compute_cross_exchange_spread goes to the default queue
+    queues = [
+        "celery",
+        *(fetch_queue(exchange) for exchange in SUPPORTED_EXCHANGES.values()),
+    ]
+    collector = QueueDepthCollector(redis_client=redis_client, queues=queues)
+    return Response(exposition([collector]), media_type=CONTENT_TYPE_LATEST)
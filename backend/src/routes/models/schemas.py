@@ -1,18 +1,14 @@
 from datetime import datetime
+from enum import StrEnum
 
 from pydantic import BaseModel
+from services.cache_keys import ticker_key
 
 
 class RedisCacheble(BaseModel):
     def construct_key(self) -> str:
         raise NotImplementedError
 
-    def separate_strings_with_colons(self, *parameters: list[str]) -> str:
-        key = ""
-        for index, parameter in enumerate(parameters):
-            key += f"{parameter}:" if index < len(parameters) - 1 else parameter
-        return key
-
 
 class PriceTicker(RedisCacheble):
     crypto_id: int | None = None
@@ -20,6 +16,11 @@ class PriceTicker(RedisCacheble):
     exchange_name: str
     interval: str = "1h"
 
+    def construct_key(self) -> str:
+        return ticker_key(
+            exchange_name=self.exchange_name, crypto_name=self.crypto_name, interval=self.interval
+        )
+
 
 class BatchStatusSummaryResponse(BaseModel):
     """Aggregate batch processing status summary."""
@@ -39,9 +40,45 @@ class ComputedSpreadResponse(BaseModel):
     high_exchange: str
     low_exchange: str
 
+    # persistence statistics, missing for spreads computed before they existed
+    mean_spread_percent: float | None = None
+    std_spread_percent: float | None = None
+    longest_run_above: int | None = None
+    mean_revert_candles: float | None = None
+    rolling_stats: dict | None = None
+
+
+class SpreadSeriesResponse(BaseModel):
+    """Spread of every stored candle of one crypto, column wise for charting."""
+
+    crypto_id: int
+    interval: str
+    time: list[datetime]
+    spread_percent: list[float]
+    high_exchange: list[str]
+    low_exchange: list[str]
+
+
+class SpreadOrdering(StrEnum):
+    """Columns computed spreads can be ranked by, always descending."""
+
+    SPREAD_PERCENT = "spread_percent"
+    MEAN_SPREAD_PERCENT = "mean_spread_percent"
+    LONGEST_RUN_ABOVE = "longest_run_above"
+
 
 class TaskStatusResponse(BaseModel):
     """Response model for background task initiation."""
 
     status: str
     message: str
+
+
+class ComputeRunResponse(TaskStatusResponse):
+    """Run started by compute-all, or the run already in progress for the same scope."""
+
+    run_id: str | None = None
+    already_running: bool = False
+    # a run was queued to start once the running one is done
+    queued: bool = False
+    processing_progress: float | None = None
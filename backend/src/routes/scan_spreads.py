@@ -1,17 +1,39 @@
 import logging
+from datetime import datetime
 
 from background.batch_fetch_ohlc import BatchFetcherDependency
-from background.db.user_api import get_batch_status_counts, get_computed_spreads
-from fastapi import APIRouter, BackgroundTasks
+from background.celery.celery_fetch import start_fetch_run
+from background.db.user_api import (
+    get_batch_status_counts,
+    get_computed_spreads,
+    get_computed_spreads_by_id,
+    get_spread_series,
+)
+from config.config import ComputeBackendType, ComputeSettings, CryptoBatchSettings
+from fastapi import APIRouter, BackgroundTasks, Query
 from routes.models.schemas import (
     BatchStatusSummaryResponse,
     ComputedSpreadResponse,
+    ComputeRunResponse,
+    SpreadOrdering,
+    SpreadSeriesResponse,
     TaskStatusResponse,
 )
+from services.cache_keys import run_ohlc_pattern
 from services.db_session import DBSessionDep
+from services.run_admission import new_run_id
+from utils.dependencies.dependencies import (
+    CryptoFetcherDependency,
+    LeaderboardDependency,
+    RedisClientDependency,
+    RunAdmissionDependency,
+    RunTrackerDependency,
+)
 
 logger = logging.getLogger(__name__)
 spreads_router = APIRouter(prefix="/spreads")
+batch_settings = CryptoBatchSettings()
+compute_settings = ComputeSettings()
 
 
 @spreads_router.post("/init-pairs")
@@ -30,21 +52,67 @@ async def init_pairs(
 @spreads_router.post("/compute-all")
 async def get_all_spreads(
     batch_fetcher: BatchFetcherDependency,
+    run_admission: RunAdmissionDependency,
     db: DBSessionDep,
     bg_tasks: BackgroundTasks,
-) -> TaskStatusResponse:
+    queue: bool = False,
+) -> ComputeRunResponse:
     """
     Trigger background task to download all OHLC data for arbitrable pairs.
+
+    With distributed fetch the run is only enqueued, celery fetch workers download it.
+
+    Only one run per interval, threshold and exchange set is in progress at a time.
+    Otherwise the running run's id and progress are returned,
+    with @queue one more run starts once it's done.
     """
-    bg_tasks.add_task(batch_fetcher.download_all_ohlc, db)
-    return TaskStatusResponse(status="success", message="Batch OHLC download started")
+    threshold = batch_settings.DEFAULT_THRESHOLD
+    interval = batch_settings.DEFAULT_INTERVAL
+
+    run_id = new_run_id()
+    running_run_id = run_admission.admit(run_id=run_id, interval=interval, threshold=threshold)
+    if running_run_id:
+        queued = queue and run_admission.queue_pending(interval=interval, threshold=threshold)
+        return ComputeRunResponse(
+            status="running",
+            message=f"Run {running_run_id} is in progress",
+            run_id=running_run_id,
+            already_running=True,
+            queued=queued,
+            processing_progress=_processing_progress(
+                get_batch_status_counts(session=db, run_id=running_run_id)
+            ),
+        )
+
+    if (
+        batch_settings.DISTRIBUTED_FETCH
+        and compute_settings.COMPUTE_BACKEND == ComputeBackendType.CELERY
+    ):
+        start_fetch_run.delay(threshold=threshold, interval=interval, run_id=run_id)
+        return ComputeRunResponse(
+            status="success", message="Batch OHLC download enqueued", run_id=run_id
+        )
+
+    bg_tasks.add_task(
+        batch_fetcher.download_all_ohlc, db, threshold=threshold, interval=interval, run_id=run_id
+    )
+    return ComputeRunResponse(
+        status="success", message="Batch OHLC download started", run_id=run_id
+    )
 
 
 @spreads_router.get("/batch-status")
-def get_status(db: DBSessionDep) -> BatchStatusSummaryResponse:
+def get_status(
+    db: DBSessionDep,
+    run_tracker: RunTrackerDependency,
+    run_id: str | None = None,
+    interval: str | None = None,
+) -> BatchStatusSummaryResponse:
     """
     Get aggregate batch processing status summary.
 
+    Of run @run_id, or of the newest run of @interval (the default interval if not given).
+
     Returns:
         Summary object containing:
         - total_pairs: Total number of crypto-exchange pairs being tracked
@@ -52,23 +120,33 @@ def get_status(db: DBSessionDep) -> BatchStatusSummaryResponse:
         - spreads_computed: Number of pairs with computed spreads
         - processing_progress: Percentage of pairs cached (0-100)
     """
-    counts = get_batch_status_counts(session=db)
+    if run_id is None:
+        newest = run_tracker.recent(interval=interval or batch_settings.DEFAULT_INTERVAL, count=1)
+        run_id = newest[0]["run_id"] if newest else None
+    counts = get_batch_status_counts(session=db, run_id=run_id)
+
+    return BatchStatusSummaryResponse(
+        total_pairs=counts["total_pairs"],
+        cached=counts["cached"],
+        spreads_computed=counts["spreads_computed"],
+        processing_progress=_processing_progress(counts),
+    )
 
+
+def _processing_progress(counts: dict[str, int]) -> float:
     # Calculate progress percentage
     total = counts["total_pairs"]
     cached = counts["cached"]
     progress = (cached / total * 100.0) if total > 0 else 0.0
-
-    return BatchStatusSummaryResponse(
-        total_pairs=total,
-        cached=cached,
-        spreads_computed=counts["spreads_computed"],
-        processing_progress=round(progress, 2),
-    )
+    return round(progress, 2)
 
 
 @spreads_router.get("/computed")
-def get_computed_spreads_endpoint(db: DBSessionDep) -> list[ComputedSpreadResponse]:
+def get_computed_spreads_endpoint(
+    db: DBSessionDep,
+    order_by: SpreadOrdering = SpreadOrdering.SPREAD_PERCENT,
+    interval: str | None = None,
+) -> list[ComputedSpreadResponse]:
     """
     Get all computed spreads with exchange names resolved.
 
@@ -79,7 +157,102 @@ def get_computed_spreads_endpoint(db: DBSessionDep) -> list[ComputedSpreadRespon
         - spread_percent: Spread percentage
         - high_exchange: Exchange with higher price (sell here)
         - low_exchange: Exchange with lower price (buy here)
+        - mean/std spread percent, longest run above threshold,
+          mean candles to revert and per-window rolling stats
+
+    Results are ordered by @order_by (spread_percent by default) in descending order.
+    Spreads of @interval only, DEFAULT_INTERVAL if not given
+    """
+    return get_computed_spreads(
+        session=db, interval=interval or batch_settings.DEFAULT_INTERVAL, order_by=order_by
+    )
+
+
+@spreads_router.get("/top")
+def get_top_spreads(
+    leaderboard: LeaderboardDependency,
+    db: DBSessionDep,
+    n: int = Query(default=20, ge=1, le=500),
+    order_by: SpreadOrdering = SpreadOrdering.SPREAD_PERCENT,
+    interval: str | None = None,
+) -> list[ComputedSpreadResponse]:
+    """
+    Top n computed spreads, straight from the redis leaderboard.
+
+    Postgres is only queried to rebuild an empty (e.g. flushed) leaderboard,
+    or if the leaderboard is disabled.
+    """
+    interval = interval or batch_settings.DEFAULT_INTERVAL
+    if not leaderboard:
+        return get_computed_spreads(session=db, interval=interval, order_by=order_by)[:n]
+
+    if leaderboard.is_empty(interval):
+        leaderboard.replace(
+            interval=interval, spreads=get_computed_spreads_by_id(session=db, interval=interval)
+        )
+    return leaderboard.top(interval=interval, order_by=order_by, n=n)
+
+
+@spreads_router.get("/{crypto_id}/series")
+def get_spread_series_endpoint(
+    db: DBSessionDep,
+    crypto_id: int,
+    interval: str | None = None,
+    since: datetime | None = None,
+    limit: int = Query(default=1000, ge=1, le=100_000),
+) -> SpreadSeriesResponse:
+    """
+    Per-candle spread history of one crypto, for charting.
+
+    Newest @limit candles at or after @since, oldest first.
+    """
+    return get_spread_series(
+        session=db,
+        crypto_id=crypto_id,
+        interval=interval or batch_settings.DEFAULT_INTERVAL,
+        since=since,
+        limit=limit,
+    )
+
+
+@spreads_router.delete("/cache")
+def clear_run_cache(
+    redis_client: RedisClientDependency, run_id: str | None = None
+) -> TaskStatusResponse:
+    """
+    Delete cached OHLC of a single run, or of all runs if no run_id is given.
+    """
+    unlinked = redis_client.unlink_matching(run_ohlc_pattern(run_id))
+    return TaskStatusResponse(status="success", message=f"Deleted {unlinked} cached OHLC keys")
+
+
+@spreads_router.get("/fetch-concurrency")
+def get_fetch_concurrency(crypto_fetcher: CryptoFetcherDependency) -> dict[str, dict]:
+    """
+    Current adaptive fetch concurrency per exchange.
+
+    Empty if adaptive concurrency is disabled or nothing was fetched yet.
+    """
+    if not crypto_fetcher.concurrency:
+        return {}
+    return crypto_fetcher.concurrency.snapshot()
+
+
+@spreads_router.get("/http-pool")
+def get_http_pool_stats(crypto_fetcher: CryptoFetcherDependency) -> dict:
+    """
+    Connection reuse stats of the shared ccxt connection pool.
+    """
+    if not crypto_fetcher.http_pool:
+        return {}
+    return crypto_fetcher.http_pool.stats()
+
+
+@spreads_router.get("/runs")
+def get_runs(run_tracker: RunTrackerDependency, interval: str, count: int = 10) -> list[dict]:
+    """
+    Timing of the newest runs of an interval, newest first.
 
-    Results are ordered by spread_percent in descending order.
+    finished_before_next shows whether a scheduled cycle keeps up with its cadence.
     """
-    return get_computed_spreads(session=db)
+    return run_tracker.recent(interval=interval, count=count)
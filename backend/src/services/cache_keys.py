@@ -0,0 +1,128 @@
+"""
+The only place redis keys are built
+
+Layout: {namespace}:{kind}:{scope...}
+
+OHLC of a run carries interval and run id, so runs never overwrite each other.
+The crypto id is a hash tag ({...}), on Redis Cluster all exchanges of a crypto
+land on the same slot and can be read with one MGET
+"""
+
+from config.config import RedisSettings
+
+NAMESPACE = RedisSettings().REDIS_KEY_NAMESPACE
+
+
+def run_ohlc_key(run_id: str, interval: str, crypto_id: int, ce_id: int) -> str:
+    """
+    OHLC of one crypto on one exchange, fetched in a batch run
+    """
+    return f"{NAMESPACE}:ohlc:{run_id}:{interval}:{{{crypto_id}}}:{ce_id}"
+
+
+def run_ohlc_pattern(run_id: str | None = None) -> str:
+    """
+    SCAN pattern for all OHLC of a run, or of all runs
+    """
+    return f"{NAMESPACE}:ohlc:{run_id or '*'}:*"
+
+
+def ticker_key(exchange_name: str, crypto_name: str, interval: str) -> str:
+    """
+    Latest OHLC of a ticker, as served to charts
+    """
+    return f"{NAMESPACE}:ticker:{interval}:{exchange_name}:{crypto_name}"
+
+
+def concurrency_limits_key() -> str:
+    """
+    Adaptive fetch concurrency, persisted between runs. A hash with a field per exchange
+    """
+    return f"{NAMESPACE}:concurrency:limits:by_exchange"
+
+
+def fingerprint_key(interval: str, crypto_id: int, ce_id: int) -> str:
+    """
+    Fingerprint of the ohlc a crypto was last computed from, on one exchange
+    """
+    return f"{NAMESPACE}:fingerprint:{interval}:{{{crypto_id}}}:{ce_id}"
+
+
+def changed_cryptos_key(run_id: str) -> str:
+    """
+    Set of crypto ids whose ohlc changed since they were last computed
+    """
+    return f"{NAMESPACE}:changed:{run_id}"
+
+
+def run_info_key(run_id: str) -> str:
+    """
+    Hash with settings, progress and timing of a run
+    """
+    return f"{NAMESPACE}:run:{run_id}"
+
+
+def run_history_key(interval: str) -> str:
+    """
+    Newest run ids of an interval first
+    """
+    return f"{NAMESPACE}:runs:{interval}"
+
+
+def spread_state_key(interval: str, crypto_id: int) -> str:
+    """
+    Running spread state of a crypto, new candles are folded into it
+    """
+    return f"{NAMESPACE}:spreadstate:{interval}:{{{crypto_id}}}"
+
+
+def run_lock_key(interval: str, threshold: int, exchanges: list[str]) -> str:
+    """
+    Held by the run scanning @exchanges with this interval and threshold
+    """
+    return f"{NAMESPACE}:runlock:{interval}:{threshold}:{','.join(sorted(exchanges))}"
+
+
+def pending_run_key(interval: str, threshold: int, exchanges: list[str]) -> str:
+    """
+    Set while a run with the same scope waits for the current one
+    """
+    return f"{NAMESPACE}:runpending:{interval}:{threshold}:{','.join(sorted(exchanges))}"
+
+
+def leaderboard_key(interval: str, mode: str) -> str:
+    """
+    Sorted set of crypto ids, scored by the @mode column of their computed spread
+
+    The interval is a hash tag, all boards of an interval can change in one transaction
+    """
+    return f"{NAMESPACE}:leaderboard:{{{interval}}}:{mode}"
+
+
+def leaderboard_display_key(interval: str) -> str:
+    """
+    Hash of crypto id -> display ready computed spread
+    """
+    return f"{NAMESPACE}:leaderboard:{{{interval}}}:display"
+
+
+def result_stream_key() -> str:
+    """
+    Stream of computed spreads waiting to be written to postgres
+    """
+    return f"{NAMESPACE}:results"
+
+
+def result_flush_key() -> str:
+    """
+    Set while a flush of the result stream is scheduled
+    """
+    return f"{NAMESPACE}:results:flush"
+
+
+def single_flight_key(
+    exchange_name: str, crypto_name: str, interval: str, since: int | None = None
+) -> str:
+    # fetches of different windows mustn't share a result
+    window = "latest" if since is None else since
+    return f"{NAMESPACE}:singleflight:{interval}:{exchange_name}:{crypto_name}:{window}"
@@ -0,0 +1,69 @@
+import time
+from datetime import UTC, datetime
+
+import ccxt
+from config.config import CACHE_TTL_CONFIG, CacheSettings
+
+# weekly candles open on monday, unix epoch was a thursday
+WEEK_OPEN_OFFSET = 4 * 86400
+
+
+class CachePolicy:
+    """
+    Decides how long ohlc stays in cache
+
+    Fresh data expires together with the candle it's missing, i.e. on the next
+    candle close of its interval. After that it's still served as stale for
+    @stale_window seconds while a refresh runs in background.
+
+    Data waiting for a compute is pinned until the compute has consumed it
+    """
+
+    def __init__(self, settings: CacheSettings) -> None:
+        self.close_grace = settings.CACHE_CLOSE_GRACE
+        self.min_ttl = settings.CACHE_MIN_TTL
+        self.stale_window = settings.CACHE_STALE_WINDOW
+        self.pin_ttl = settings.CACHE_PIN_MAX_TTL
+
+    def fresh_ttl(self, interval: str, now: float | None = None) -> int:
+        """
+        Seconds until the current candle of @interval closes
+
+        Plus a grace period, exchanges publish the closed candle a bit later
+        """
+        now = time.time() if now is None else now
+        return max(self._seconds_to_close(interval, now) + self.close_grace, self.min_ttl)
+
+    def storage_ttl(self, interval: str, now: float | None = None) -> int:
+        """
+        TTL to store a key with, so it outlives its freshness by the stale window
+        """
+        return self.fresh_ttl(interval, now) + self.stale_window
+
+    def is_stale(self, remaining_ttl: int) -> bool:
+        """
+        Stale keys only have their stale window left to live
+        """
+        return 0 <= remaining_ttl <= self.stale_window
+
+    def pinned_ttl(self) -> int:
+        """
+        Upper bound for keys waiting for a compute
+
+        Computes unpin them after reading, this only protects against leaks
+        if a compute never happens
+        """
+        return self.pin_ttl
+
+    def _seconds_to_close(self, interval: str, now: float) -> int:
+        if interval.endswith("M"):
+            # calendar months, the only interval without a fixed length
+            current = datetime.fromtimestamp(now, tz=UTC)
+            next_month = (current.month % 12) + 1
+            next_year = current.year + (1 if next_month == 1 else 0)
+            next_open = datetime(next_year, next_month, 1, tzinfo=UTC)
+            return int(next_open.timestamp() - now)
+
+        length = CACHE_TTL_CONFIG.get(interval) or ccxt.Exchange.parse_timeframe(interval)
+        offset = WEEK_OPEN_OFFSET if interval.endswith("w") else 0
+        return int(length - (now - offset) % length)
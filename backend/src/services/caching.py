@@ -1,21 +1,44 @@
+import json
 import logging
+from typing import Any
 
+import numpy as np
 import redis
 from config.config import RedisSettings
+from services.metrics import redis_payload, timed_redis
 
 logger = logging.getLogger(__name__)
 
+# only the owner of a lock may release it
+RELEASE_LOCK_SCRIPT = """
+if redis.call("get", KEYS[1]) == ARGV[1] then
+    return redis.call("del", KEYS[1])
+end
+return 0
+"""
+
+# only the owner of a lock may extend it
+EXTEND_LOCK_SCRIPT = """
+if redis.call("get", KEYS[1]) == ARGV[1] then
+    return redis.call("pexpire", KEYS[1], ARGV[2])
+end
+return 0
+"""
+
 
 class RedisClient:
     def __init__(self) -> None:
-        self.client: redis.Redis | None = self._init_client()
+        self.client: redis.Redis | redis.RedisCluster | None = self._init_client()
 
+    @timed_redis("set")
     def set(self, key: str, data: str, ttl: int) -> None:
         if not self.client:
             return
         logger.info(f"Caching data for key: {key} with TTL: {ttl / 60} minutes")
+        redis_payload(operation="set", direction="write", size=len(data))
         self.client.set(name=key, value=data, ex=ttl)
 
+    @timed_redis("get")
     def get(self, key: str) -> str | None:
         if not self.client:
             return None
@@ -23,12 +46,228 @@ class RedisClient:
         response = self.client.get(key)
 
         if response:
+            redis_payload(operation="get", direction="read", size=len(response))
             logger.info(f"Cache hit for key: {key}")
             return response
         return None
 
-    def _init_client(self) -> redis.Redis | None:
+    @timed_redis("get_with_ttl")
+    def get_with_ttl(self, key: str) -> tuple[str | None, int]:
+        """
+        Value together with its remaining TTL in seconds, in one round trip
+
+        TTL is negative if the key doesn't exist or has no expiry
+        """
+        if not self.client:
+            return None, -2
+
+        pipe = self.client.pipeline(transaction=False)
+        pipe.get(key)
+        pipe.ttl(key)
+        response, ttl = pipe.execute()
+
+        if response:
+            redis_payload(operation="get_with_ttl", direction="read", size=len(response))
+            logger.info(f"Cache hit for key: {key}, {ttl}s left")
+            return response, ttl
+        return None, ttl
+
+    @timed_redis("expire")
+    def expire(self, key: str, ttl: int) -> None:
+        if not self.client:
+            return
+        self.client.expire(name=key, time=ttl)
+
+    def mget_json(self, keys: list[str]) -> list[Any]:
+        """
+        Decoded json values of @keys in one round trip, None for missing ones
+
+        On Redis Cluster all @keys must share a hash tag
+        """
+        return [self._decode(response) if response else None for response in self._mget(keys)]
+
+    @timed_redis("mget_json")
+    def _mget(self, keys: list[str]) -> list[bytes | None]:
+        if not self.client or not keys:
+            return [None] * len(keys)
+        responses = self.client.mget(keys)
+        redis_payload(
+            operation="mget_json",
+            direction="read",
+            size=sum(len(response) for response in responses if response),
+        )
+        return responses
+
+    @timed_redis("expire_many")
+    def expire_many(self, keys: list[str], ttl: int) -> None:
+        if not self.client or not keys:
+            return
+        pipe = self.client.pipeline(transaction=False)
+        for key in keys:
+            pipe.expire(name=key, time=ttl)
+        pipe.execute()
+
+    @timed_redis("unlink_matching")
+    def unlink_matching(self, pattern: str, batch_size: int = 500) -> int:
+        """
+        Delete all keys matching @pattern
+
+        SCAN instead of KEYS and UNLINK instead of DEL,
+        so redis isn't blocked even for millions of keys
+        """
+        if not self.client:
+            return 0
+
+        unlinked = 0
+        batch = []
+        for key in self.client.scan_iter(match=pattern, count=batch_size):
+            batch.append(key)
+            if len(batch) >= batch_size:
+                unlinked += self.client.unlink(*batch)
+                batch = []
+        if batch:
+            unlinked += self.client.unlink(*batch)
+        return unlinked
+
+    @timed_redis("mget")
+    def mget(self, keys: list[str]) -> list[str | None]:
+        """
+        Raw string values of @keys, never served from a local tier
+
+        Pipelined GETs instead of MGET, so @keys may live on different cluster slots
+        """
+        if not self.client or not keys:
+            return [None] * len(keys)
+        pipe = self.client.pipeline(transaction=False)
+        for key in keys:
+            pipe.get(key)
+        responses = pipe.execute()
+        redis_payload(
+            operation="mget",
+            direction="read",
+            size=sum(len(response) for response in responses if response),
+        )
+        return [response.decode() if response else None for response in responses]
+
+    @timed_redis("set_many")
+    def set_many(self, mapping: dict[str, str], ttl: int) -> None:
+        if not self.client or not mapping:
+            return
+        pipe = self.client.pipeline(transaction=False)
+        for key, data in mapping.items():
+            pipe.set(name=key, value=data, ex=ttl)
+        pipe.execute()
+        redis_payload(operation="set_many", direction="write", size=sum(map(len, mapping.values())))
+
+    @timed_redis("add_to_set")
+    def add_to_set(self, key: str, members: list[str | int], ttl: int) -> None:
+        if not self.client or not members:
+            return
+        pipe = self.client.pipeline(transaction=False)
+        pipe.sadd(key, *members)
+        pipe.expire(name=key, time=ttl)
+        pipe.execute()
+
+    @timed_redis("set_members")
+    def set_members(self, key: str) -> list[str]:
+        if not self.client:
+            return []
+        return [member.decode() for member in self.client.smembers(key)]
+
+    @timed_redis("hash_set")
+    def hash_set(self, key: str, mapping: dict[str, str | int | float], ttl: int) -> None:
+        if not self.client or not mapping:
+            return
+        pipe = self.client.pipeline(transaction=False)
+        pipe.hset(key, mapping=mapping)
+        pipe.expire(name=key, time=ttl)
+        pipe.execute()
+
+    @timed_redis("hash_incr")
+    def hash_incr(self, key: str, field: str, amount: int = 1) -> int:
+        if not self.client:
+            return 0
+        return self.client.hincrby(key, field, amount)
+
+    @timed_redis("hash_get_all")
+    def hash_get_all(self, key: str) -> dict[str, str]:
+        if not self.client:
+            return {}
+        return {
+            field.decode(): value.decode() for field, value in self.client.hgetall(key).items()
+        }
+
+    @timed_redis("push_capped")
+    def push_capped(self, key: str, value: str, max_len: int) -> None:
+        """
+        Prepend @value to a list, keeping only the @max_len newest entries
+        """
+        if not self.client:
+            return
+        pipe = self.client.pipeline(transaction=False)
+        pipe.lpush(key, value)
+        pipe.ltrim(key, 0, max_len - 1)
+        pipe.execute()
+
+    @timed_redis("list_range")
+    def list_range(self, key: str, count: int) -> list[str]:
+        if not self.client:
+            return []
+        return [value.decode() for value in self.client.lrange(key, 0, count - 1)]
+
+    @timed_redis("acquire_lock")
+    def acquire_lock(self, key: str, token: str, ttl_ms: int) -> bool:
+        """
+        SET NX with expiry, @token identifies the owner
+        """
+        if not self.client:
+            return True
+        return bool(self.client.set(name=key, value=token, nx=True, px=ttl_ms))
+
+    @timed_redis("extend_lock")
+    def extend_lock(self, key: str, token: str, ttl_ms: int) -> bool:
+        """
+        Reset the expiry of a lock, False if @token doesn't own it (anymore)
+        """
+        if not self.client:
+            return True
+        return bool(self.client.eval(EXTEND_LOCK_SCRIPT, 1, key, token, ttl_ms))
+
+    @timed_redis("release_lock")
+    def release_lock(self, key: str, token: str) -> bool:
+        """
+        False if @token didn't own the lock
+        """
+        if not self.client:
+            return True
+        return bool(self.client.eval(RELEASE_LOCK_SCRIPT, 1, key, token))
+
+    def get_json(self, key: str) -> Any:  # noqa: ANN401
+        """
+        Decoded json value, None if missing or corrupted
+        """
+        return self.get_json_with_ttl(key)[0]
+
+    def get_json_with_ttl(self, key: str) -> tuple[Any, int]:
+        response, ttl = self.get_with_ttl(key)
+        if not response:
+            return None, ttl
+        return self._decode(response), ttl
+
+    def set_json(self, key: str, data: Any, ttl: int) -> None:  # noqa: ANN401
+        self.set(key=key, data=json.dumps(data, default=_json_default), ttl=ttl)
+
+    def _decode(self, response: str | bytes) -> Any:  # noqa: ANN401
+        try:
+            return json.loads(response)
+        except json.JSONDecodeError:
+            logger.error("Corrupted json in cache, ignoring it")
+            return None
+
+    def _init_client(self) -> redis.Redis | redis.RedisCluster | None:
         r_config = RedisSettings()
+        if r_config.REDIS_CLUSTER:
+            return redis.RedisCluster(host=r_config.REDIS_HOST, port=r_config.REDIS_PORT)
         return redis.Redis(
             host=r_config.REDIS_HOST, port=r_config.REDIS_PORT, db=r_config.REDIS_DB
         )
@@ -42,3 +281,10 @@ class RedisClient:
         except (redis.RedisError, redis.TimeoutError) as e:
             logger.error(f"REDIS CLIENT UNAVAILABLE: {e}")
             return False
+
+
+def _json_default(value: Any) -> Any:  # noqa: ANN401
+    # candle store ohlc are arrays
+    if isinstance(value, np.ndarray):
+        return value.tolist()
+    raise TypeError(f"{type(value).__name__} is not JSON serializable")
@@ -0,0 +1,182 @@
+import fcntl
+import logging
+import os
+import time
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Iterator
+
+import ccxt
+import numpy as np
+from config.config import CandleStoreSettings
+
+logger = logging.getLogger(__name__)
+
+TIME_COLUMN = "time"
+PRICE_COLUMNS = ["open", "high", "low", "close", "volume"]
+
+
+class CandleStore:
+    """
+    Append-only columnar candle history on disk, persistent L2 behind redis
+
+    One directory per (interval, exchange, symbol) with a sorted int64 time file
+    and a float64 file per ohlcv column. Reads are memory mapped,
+    the returned arrays are views onto the page cache, nothing is copied.
+
+    Only closed candles are stored, the forming one would be frozen otherwise.
+    The time column is appended last and defines the row count,
+    so readers never see half appended rows, even across processes
+    """
+
+    def __init__(self, settings: CandleStoreSettings) -> None:
+        self.root = Path(settings.CANDLE_STORE_PATH)
+        self.serve_candles = settings.CANDLE_STORE_SERVE_CANDLES
+        self.offline = settings.CANDLE_STORE_OFFLINE
+
+    def columns(
+        self, exchange_name: str, crypto_name: str, interval: str
+    ) -> dict[str, np.ndarray] | None:
+        """
+        Memory mapped columns of all stored candles, None if nothing is stored
+        """
+        directory = self._directory(exchange_name, crypto_name, interval)
+        rows = self._rows(directory)
+        if not rows:
+            return None
+
+        return {
+            column: np.memmap(
+                directory / _file_name(column),
+                dtype=_dtype(column),
+                mode="r",
+                shape=(rows,),
+            )
+            for column in [TIME_COLUMN, *PRICE_COLUMNS]
+        }
+
+    def series(self, interval: str) -> dict[str, list[str]]:
+        """
+        Stored exchanges per symbol directory of @interval
+        """
+        stored: dict[str, list[str]] = {}
+        interval_directory = self.root / interval
+        if not interval_directory.is_dir():
+            return stored
+
+        for exchange_directory in sorted(interval_directory.iterdir()):
+            for symbol_directory in sorted(exchange_directory.iterdir()):
+                if self._rows(symbol_directory):
+                    stored.setdefault(symbol_directory.name, []).append(exchange_directory.name)
+        return stored
+
+    def last_time(self, exchange_name: str, crypto_name: str, interval: str) -> int | None:
+        """
+        Open time of the newest stored candle, reads 8 bytes only
+        """
+        directory = self._directory(exchange_name, crypto_name, interval)
+        rows = self._rows(directory)
+        if not rows:
+            return None
+
+        with open(directory / _file_name(TIME_COLUMN), "rb") as file:
+            file.seek((rows - 1) * 8)
+            return int(np.frombuffer(file.read(8), dtype=np.int64)[0])
+
+    def ohlc(
+        self, exchange_name: str, crypto_name: str, interval: str, limit: int | None = None
+    ) -> np.ndarray:
+        """
+        Newest @limit stored candles in ccxt's ohlcv layout, as one (n, 6) float64 array
+
+        The columns are copied into it straight from the page cache, no per candle objects
+        """
+        columns = self.columns(exchange_name, crypto_name, interval)
+        if columns is None:
+            return np.empty((0, len(PRICE_COLUMNS) + 1), dtype=np.float64)
+
+        start = -limit if limit else 0
+        return np.column_stack(
+            [columns[column][start:] for column in [TIME_COLUMN, *PRICE_COLUMNS]]
+        ).astype(np.float64, copy=False)
+
+    def append(
+        self,
+        exchange_name: str,
+        crypto_name: str,
+        interval: str,
+        ohlc: list[list[float]] | np.ndarray,
+        now_ms: int | None = None,
+    ) -> int:
+        """
+        Append closed candles newer than the stored ones, returns how many were added
+        """
+        if not len(ohlc):
+            return 0
+
+        array = np.asarray(ohlc, dtype=np.float64)
+        if array.ndim != 2 or array.shape[1] != len(PRICE_COLUMNS) + 1:
+            logger.error(f"Not storing corrupted ohlc of {crypto_name} from {exchange_name}")
+            return 0
+
+        now_ms = int(time.time() * 1000) if now_ms is None else now_ms
+        interval_ms = ccxt.Exchange.parse_timeframe(interval) * 1000
+        array = array[array[:, 0] + interval_ms <= now_ms]
+
+        directory = self._directory(exchange_name, crypto_name, interval)
+        directory.mkdir(parents=True, exist_ok=True)
+        with _locked(directory):
+            last_time = self.last_time(exchange_name, crypto_name, interval)
+            if last_time is not None:
+                array = array[array[:, 0] > last_time]
+            if not array.size:
+                return 0
+
+            array = array[np.argsort(array[:, 0], kind="stable")]
+            rows = self._rows(directory)
+            for position, column in enumerate(PRICE_COLUMNS, start=1):
+                _append_column(directory / _file_name(column), rows, array[:, position])
+            # commits the rows
+            _append_column(directory / _file_name(TIME_COLUMN), rows, array[:, 0].astype(np.int64))
+
+        return len(array)
+
+    def _directory(self, exchange_name: str, crypto_name: str, interval: str) -> Path:
+        return self.root / interval / exchange_name / symbol_directory(crypto_name)
+
+    def _rows(self, directory: Path) -> int:
+        try:
+            return os.path.getsize(directory / _file_name(TIME_COLUMN)) // 8
+        except FileNotFoundError:
+            return 0
+
+
+def symbol_directory(crypto_name: str) -> str:
+    # spot and swap symbols, e.g. BTC/USDT:USDT
+    return crypto_name.replace("/", "_").replace(":", "_")
+
+
+def _append_column(path: Path, rows: int, values: np.ndarray) -> None:
+    with open(path, "ab") as file:
+        # drop leftovers of an append that died before committing the time column
+        file.truncate(rows * 8)
+        file.write(values.tobytes())
+
+
+@contextmanager
+def _locked(directory: Path) -> Iterator[None]:
+    # one writer per series, fetch workers may append the same one
+    with open(directory / ".lock", "w") as lock_file:
+        fcntl.flock(lock_file, fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+
+def _file_name(column: str) -> str:
+    return f"{column}.i8" if column == TIME_COLUMN else f"{column}.f8"
+
+
+def _dtype(column: str) -> type:
+    return np.int64 if column == TIME_COLUMN else np.float64
@@ -0,0 +1,94 @@
+import hashlib
+import json
+from typing import Sequence
+
+import numpy as np
+from config.config import ChangeDetection
+from services.cache_keys import changed_cryptos_key, fingerprint_key
+from services.caching import RedisClient
+
+
+class ChangeDetector:
+    """
+    Tells which cryptos' ohlc changed since they were last computed
+
+    Every computed crypto leaves a fingerprint per exchange.
+    Fetches compare against it and flag the crypto as changed for their run
+    """
+
+    def __init__(
+        self,
+        redis_client: RedisClient,
+        mode: ChangeDetection,
+        fingerprint_ttl: int,
+        run_ttl: int,
+    ) -> None:
+        self.redis_client = redis_client
+        self.mode = mode
+        self.fingerprint_ttl = fingerprint_ttl
+        self.run_ttl = run_ttl
+
+    def fingerprint(self, ohlc: list[list[float]] | np.ndarray) -> str:
+        if self.mode == ChangeDetection.LAST_CANDLE:
+            return str(int(ohlc[-1][0]))
+        # fetched arrays and cached json lists hash the same
+        try:
+            content = np.ascontiguousarray(ohlc, dtype=np.float64).tobytes()
+        except (TypeError, ValueError):
+            # corrupted, ragged ohlc
+            content = json.dumps(ohlc).encode()
+        return hashlib.blake2b(content, digest_size=16).hexdigest()
+
+    def record_changes(
+        self,
+        run_id: str,
+        interval: str,
+        fetched: Sequence[tuple[int, int, list[list[float]] | np.ndarray]],
+    ) -> set[int]:
+        """
+        Flag cryptos with at least one changed exchange, @fetched holds (crypto_id, ce_id, ohlc)
+
+        Cryptos never computed before count as changed
+        """
+        if not fetched:
+            return set()
+
+        previous = self.redis_client.mget(
+            [
+                fingerprint_key(interval=interval, crypto_id=crypto_id, ce_id=ce_id)
+                for crypto_id, ce_id, _ in fetched
+            ]
+        )
+        changed = {
+            crypto_id
+            for (crypto_id, _, ohlc), fingerprint in zip(fetched, previous, strict=True)
+            if fingerprint != self.fingerprint(ohlc)
+        }
+        self.redis_client.add_to_set(
+            changed_cryptos_key(run_id), members=list(changed), ttl=self.run_ttl
+        )
+        return changed
+
+    def changed_cryptos(self, run_id: str) -> set[int]:
+        members = self.redis_client.set_members(changed_cryptos_key(run_id))
+        return {int(member) for member in members}
+
+    def remember(
+        self,
+        interval: str,
+        crypto_id: int,
+        ce_ids: list[int],
+        ohlc_grouped: list[list[list[float]]],
+    ) -> None:
+        """
+        Fingerprints of the ohlc a crypto was just computed from
+        """
+        self.redis_client.set_many(
+            {
+                fingerprint_key(interval=interval, crypto_id=crypto_id, ce_id=ce_id): (
+                    self.fingerprint(ohlc)
+                )
+                for ce_id, ohlc in zip(ce_ids, ohlc_grouped, strict=True)
+            },
+            ttl=self.fingerprint_ttl,
+        )
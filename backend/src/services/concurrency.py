@@ -0,0 +1,131 @@
+import asyncio
+import logging
+import time
+
+from config.config import ConcurrencySettings
+from services.cache_keys import concurrency_limits_key
+from services.caching import RedisClient
+
+logger = logging.getLogger(__name__)
+
+# limits outlive runs, but shouldn't be trusted forever
+PERSISTED_LIMITS_TTL = 7 * 86400
+
+
+class AdaptiveLimit:
+    """
+    Concurrency limit of one exchange, adjusted with AIMD
+
+    Every fast success widens the limit by 1 / limit, i.e. by one per full window.
+    Rate limit errors, timeouts and latency spikes cut it by @decrease_factor,
+    at most once per average round trip, so one burst of 429s counts once
+    """
+
+    def __init__(self, limit: float, settings: ConcurrencySettings) -> None:
+        self.min_limit = settings.CONCURRENCY_MIN
+        self.max_limit = settings.CONCURRENCY_MAX
+        self.decrease_factor = settings.CONCURRENCY_DECREASE_FACTOR
+        self.latency_spike = settings.CONCURRENCY_LATENCY_SPIKE
+
+        self.limit = min(max(limit, self.min_limit), self.max_limit)
+        self.in_flight = 0
+        self.latency_ewma: float | None = None
+
+        self._last_decrease = 0.0
+        self._condition = asyncio.Condition()
+
+    async def acquire(self) -> None:
+        async with self._condition:
+            await self._condition.wait_for(lambda: self.in_flight < int(self.limit))
+            self.in_flight += 1
+
+    async def cancel(self) -> None:
+        """
+        Give back a slot which wasn't used for a request, the limit stays as it is
+        """
+        async with self._condition:
+            self.in_flight -= 1
+            self._condition.notify_all()
+
+    async def release(self, latency: float, congested: bool, succeeded: bool) -> None:
+        async with self._condition:
+            self.in_flight -= 1
+            self._adjust(latency=latency, congested=congested, succeeded=succeeded)
+            self._condition.notify_all()
+
+    def _adjust(self, latency: float, congested: bool, succeeded: bool) -> None:
+        spiked = self.latency_ewma is not None and latency > self.latency_ewma * self.latency_spike
+
+        if congested or spiked:
+            self._decrease()
+        elif succeeded:
+            self.limit = min(self.limit + 1 / self.limit, self.max_limit)
+
+        # failed requests say nothing about latency
+        if succeeded:
+            self.latency_ewma = (
+                latency if self.latency_ewma is None else 0.8 * self.latency_ewma + 0.2 * latency
+            )
+
+    def _decrease(self) -> None:
+        now = time.monotonic()
+        if now - self._last_decrease < (self.latency_ewma or 1.0):
+            return
+
+        self._last_decrease = now
+        self.limit = max(self.limit * self.decrease_factor, self.min_limit)
+
+    def snapshot(self) -> dict:
+        latency_ms = None if self.latency_ewma is None else round(self.latency_ewma * 1000)
+        return {
+            "limit": round(self.limit, 2),
+            "in_flight": self.in_flight,
+            "latency_ms": latency_ms,
+        }
+
+
+class ExchangeConcurrency:
+    """
+    Adaptive limits per exchange
+
+    Limits are persisted in redis between runs, so every run starts warm.
+    Every exchange is a field of its own, a process only writes the exchanges it fetched from
+    """
+
+    def __init__(self, settings: ConcurrencySettings, redis_client: RedisClient | None) -> None:
+        self.settings = settings
+        self.redis_client = redis_client
+        self._limits: dict[str, AdaptiveLimit] = {}
+        self._persisted = self._load()
+
+    def for_exchange(self, exchange_name: str) -> AdaptiveLimit:
+        if exchange_name not in self._limits:
+            initial = self._persisted.get(exchange_name, self.settings.CONCURRENCY_INITIAL)
+            self._limits[exchange_name] = AdaptiveLimit(limit=initial, settings=self.settings)
+        return self._limits[exchange_name]
+
+    def snapshot(self) -> dict[str, dict]:
+        """
+        Current limit per exchange, for monitoring
+        """
+        return {name: limit.snapshot() for name, limit in self._limits.items()}
+
+    def save(self) -> None:
+        if not self.redis_client or not self._limits:
+            return
+
+        limits = {name: limit.limit for name, limit in self._limits.items()}
+        self.redis_client.hash_set(
+            key=concurrency_limits_key(), mapping=limits, ttl=PERSISTED_LIMITS_TTL
+        )
+        logger.info(f"Saved exchange concurrency limits: {limits}")
+
+    def _load(self) -> dict[str, float]:
+        if not self.redis_client:
+            return {}
+        try:
+            persisted = self.redis_client.hash_get_all(concurrency_limits_key())
+            return {name: float(limit) for name, limit in persisted.items()}
+        except Exception:
+            logger.exception("Couldn't load persisted concurrency limits, starting cold")
+            return {}
@@ -1,5 +1,5 @@
 import asyncio
-import json
+import logging
 from typing import Annotated
 
 from config.config import SUPPORTED_EXCHANGES
@@ -7,16 +7,25 @@ from data_manipulation.exchanges_symbols_converter import ConverterDependency
 from fastapi import Depends
 from routes.models.schemas import PriceTicker
 from utils.dependencies.dependencies import (
+    CachePolicyDependency,
     CryptoFetcherDependency,
     RedisClientDependency,
 )
 
+logger = logging.getLogger(__name__)
+
+# key -> refresh task, module level as DataManager is created per request
+# also keeps a reference to the tasks, so they don't get garbage collected
+_background_refreshes: dict[str, asyncio.Task] = {}
+
 
 class DataManager:
     """
     This class is intended to manage cached data
     If there's cache, it will return it
     If not, it will make calls to fetch it
+
+    Stale cache is returned as well, but gets refreshed in background
     """
 
     def __init__(
@@ -24,10 +33,12 @@ class DataManager:
         redis_cacher: RedisClientDependency,
         fetcher: CryptoFetcherDependency,
         converter: ConverterDependency,
+        cache_policy: CachePolicyDependency,
     ) -> None:
         self.redis_cacher = redis_cacher
         self.fetcher = fetcher
         self.converter = converter
+        self.cache_policy = cache_policy
 
     async def get_ohlc_data_cached(
         self, requests: list[PriceTicker]
@@ -52,20 +63,22 @@ class DataManager:
             data_response = ticker_data_responses[index]
             uncached_request_key = uncached_ticker_request.construct_key()
 
-            if not data_response:
+            if not data_response or isinstance(data_response, BaseException):
                 ohlc_dict.pop(uncached_request_key)
                 continue
 
             ohlc_dict[uncached_request_key] = data_response
-
-            self.redis_cacher.set(
-                key=uncached_ticker_request.construct_key(),
-                data=json.dumps(data_response),
-                ttl=10000,
-            )
+            self._cache_response(request=uncached_ticker_request, data_response=data_response)
 
         return ohlc_dict
 
+    def _cache_response(self, request: PriceTicker, data_response: list[list[float]]) -> None:
+        self.redis_cacher.set_json(
+            key=request.construct_key(),
+            data=data_response,
+            ttl=self.cache_policy.storage_ttl(request.interval),
+        )
+
     def _fill_with_cached_get_uncached(
         self, ohlc_dict: dict, requests: list[PriceTicker]
     ) -> tuple[list[PriceTicker], dict[str, list[list[float]]]]:
@@ -76,16 +89,42 @@ class DataManager:
         uncached = []
         for ticker_request in requests:
             ticker_key = ticker_request.construct_key()
-            cached = self.redis_cacher.get(ticker_key)
+            cached, remaining_ttl = self.redis_cacher.get_json_with_ttl(ticker_key)
 
             if not cached:
                 uncached.append(ticker_request)
                 continue
 
-            ohlc_dict[ticker_key] = json.loads(cached)
+            ohlc_dict[ticker_key] = cached
+
+            if self.cache_policy.is_stale(remaining_ttl):
+                self._refresh_in_background(ticker_request)
 
         return uncached, ohlc_dict
 
+    def _refresh_in_background(self, request: PriceTicker) -> None:
+        """
+        Stale-while-revalidate, at most one refresh per key at a time
+        """
+        key = request.construct_key()
+        if key in _background_refreshes:
+            return
+
+        task = asyncio.get_running_loop().create_task(self._refresh(request))
+        _background_refreshes[key] = task
+        task.add_done_callback(lambda _: _background_refreshes.pop(key, None))
+
+    async def _refresh(self, request: PriceTicker) -> None:
+        try:
+            data_response = await self.fetcher.get_ohlc_with_request(request)
+        except Exception:
+            logger.exception(f"Background refresh failed for {request.construct_key()}")
+            return
+
+        # keep serving stale data, it's better than nothing
+        if data_response:
+            self._cache_response(request=request, data_response=data_response)
+
     async def get_arbitrable_pairs(self) -> dict[str, list[str]]:
         exchanges = await self.fetcher.get_exchanges_with_markets(SUPPORTED_EXCHANGES.values())
         return self.converter.get_list_like(exchanges)
@@ -1,8 +1,18 @@
 import asyncio
 import logging
+import time
+from typing import Callable
 
 import ccxt.async_support as ccxt
+import numpy as np
+from config.config import FetchStatus
 from routes.models.schemas import PriceTicker
+from services.cache_keys import single_flight_key
+from services.candle_store import CandleStore
+from services.concurrency import ExchangeConcurrency
+from services.http_pool import HttpPool
+from services.metrics import fetch_timer
+from services.single_flight import SingleFlight
 
 logger = logging.getLogger(__name__)
 
@@ -10,10 +20,28 @@ logger = logging.getLogger(__name__)
 class CryptoFetcher:
     """
     CCXT wrapper with internal functions
+
+    Concurrent identical ohlc fetches are collapsed into one, if @single_flight is given
+    Fetches per exchange are limited adaptively, if @concurrency is given
+    All exchanges share one tuned connection pool, if @http_pool is given
+    Stored candles are served from @candle_store, only newer ones are fetched
+    Exchanges are built by @exchange_factory instead of ccxt if given (load harness fakes)
     """
 
-    def __init__(self) -> None:
+    def __init__(
+        self,
+        single_flight: SingleFlight | None = None,
+        concurrency: ExchangeConcurrency | None = None,
+        http_pool: HttpPool | None = None,
+        candle_store: CandleStore | None = None,
+        exchange_factory: Callable[[str], ccxt.Exchange] | None = None,
+    ) -> None:
         self._exchanges: dict[str, ccxt.Exchange] = {}
+        self.single_flight = single_flight
+        self.concurrency = concurrency
+        self.http_pool = http_pool
+        self.candle_store = candle_store
+        self.exchange_factory = exchange_factory
 
     async def get_ohlc_with_request(self, request: PriceTicker) -> list[list[float]] | None:
         return await self.get_ohlc_parameterised(
@@ -29,13 +57,36 @@ class CryptoFetcher:
         exchange_name: str,
         interval: str,
     ) -> list[list[float]] | None:
-        exchange = self._get_saved_exchange(exchange_name)
+        ohlc, _ = await self.get_ohlc_with_status(
+            crypto_name=crypto_name, exchange_name=exchange_name, interval=interval
+        )
+        # api responses and their cache are json
+        return ohlc.tolist() if isinstance(ohlc, np.ndarray) else ohlc
+
+    async def get_ohlc_with_status(
+        self,
+        *,
+        crypto_name: str,
+        exchange_name: str,
+        interval: str,
+    ) -> tuple[list[list[float]] | np.ndarray | None, FetchStatus]:
+        """
+        OHLC together with the fetch outcome, ohlc is None unless the status is OK
 
+        With a candle store it's a (n, 6) float64 array, otherwise ccxt's lists
+        """
         try:
-            return await exchange.fetch_ohlcv(
-                crypto_name,
-                interval,
-            )
+            if self.candle_store:
+                ohlc = await self._fetch_ohlc_stored(
+                    crypto_name=crypto_name, exchange_name=exchange_name, interval=interval
+                )
+            else:
+                ohlc = await self._fetch_ohlc_shared(
+                    crypto_name=crypto_name, exchange_name=exchange_name, interval=interval
+                )
+        except (ccxt.BadSymbol, ccxt.NotSupported) as e:
+            logger.warning(f"{exchange_name} doesn't support ohlc for {crypto_name}: {e}")
+            return None, FetchStatus.UNSUPPORTED
         except ccxt.BaseError as e:
             logger.error(
                 f"""
@@ -44,7 +95,153 @@ class CryptoFetcher:
                 Error: {str(e)}
                 """
             )
-            return None
+            return None, FetchStatus.FAILED
+
+        # no candles for this interval, a retry won't change that
+        if ohlc is None or not len(ohlc):
+            return None, FetchStatus.UNSUPPORTED
+        return ohlc, FetchStatus.OK
+
+    async def _fetch_ohlc_stored(
+        self,
+        *,
+        crypto_name: str,
+        exchange_name: str,
+        interval: str,
+    ) -> list[list[float]] | np.ndarray:
+        """
+        Stored closed candles plus whatever the exchange has after them
+
+        Newly closed candles are appended to the store, paged up to the open one.
+        If the store lags behind more than it serves, the newest candles are fetched
+        instead (leaving a gap).
+        Store reads and writes (flock included) run in threads, off the event loop
+        """
+        series = {"exchange_name": exchange_name, "crypto_name": crypto_name, "interval": interval}
+        store = self.candle_store
+        if store.offline:
+            return await asyncio.to_thread(store.ohlc, **series, limit=store.serve_candles)
+
+        interval_ms = ccxt.Exchange.parse_timeframe(interval) * 1000
+        last_time = await asyncio.to_thread(store.last_time, **series)
+        since = None
+        if last_time is not None:
+            lag = time.time() * 1000 - last_time
+            since = last_time + interval_ms if lag <= store.serve_candles * interval_ms else None
+
+        if since is None:
+            fetched = await self._fetch_ohlc_shared(**series)
+            await asyncio.to_thread(store.append, **series, ohlc=fetched)
+            return fetched
+
+        fetched = await self._fetch_ohlc_since(**series, since=since, interval_ms=interval_ms)
+        await asyncio.to_thread(store.append, **series, ohlc=fetched)
+
+        stored = await asyncio.to_thread(store.ohlc, **series, limit=store.serve_candles)
+        newest_stored = stored[-1, 0] if len(stored) else last_time
+        fetched_array = _ohlc_array(fetched)
+        # the open candle is never stored
+        return np.concatenate([stored, fetched_array[fetched_array[:, 0] > newest_stored]])
+
+    async def _fetch_ohlc_since(
+        self,
+        *,
+        crypto_name: str,
+        exchange_name: str,
+        interval: str,
+        since: int,
+        interval_ms: int,
+    ) -> list[list[float]]:
+        """
+        Candles from @since up to the open one
+
+        Exchanges return one page per request (e.g. okx 100 candles, bybit 200),
+        so a store lagging more than that is caught up page by page
+        """
+        open_time = time.time() * 1000 // interval_ms * interval_ms
+        ohlc: list[list[float]] = []
+        while True:
+            page = await self._fetch_ohlc_shared(
+                crypto_name=crypto_name, exchange_name=exchange_name, interval=interval, since=since
+            )
+            newer = [candle for candle in page if not ohlc or candle[0] > ohlc[-1][0]]
+            ohlc += newer
+            # nothing newer, or up to the open candle
+            if not newer or ohlc[-1][0] >= open_time:
+                return ohlc
+            since = int(ohlc[-1][0]) + interval_ms
+
+    async def _fetch_ohlc_shared(
+        self,
+        *,
+        crypto_name: str,
+        exchange_name: str,
+        interval: str,
+        since: int | None = None,
+    ) -> list[list[float]]:
+        if not self.single_flight:
+            return await self._fetch_ohlc(
+                crypto_name=crypto_name, exchange_name=exchange_name, interval=interval, since=since
+            )
+
+        # the slot is taken before the single flight lock, the fetch then only releases it
+        return await self.single_flight.do(
+            single_flight_key(
+                exchange_name=exchange_name, crypto_name=crypto_name, interval=interval, since=since
+            ),
+            lambda: self._fetch_ohlc(
+                crypto_name=crypto_name,
+                exchange_name=exchange_name,
+                interval=interval,
+                since=since,
+                acquired=True,
+            ),
+            slot=self.concurrency.for_exchange(exchange_name) if self.concurrency else None,
+        )
+
+    async def _fetch_ohlc(
+        self,
+        *,
+        crypto_name: str,
+        exchange_name: str,
+        interval: str,
+        since: int | None = None,
+        acquired: bool = False,
+    ) -> list[list[float]]:
+        """
+        @acquired means the caller holds the exchange's concurrency slot already
+        """
+        exchange = self._get_saved_exchange(exchange_name)
+        if not self.concurrency:
+            with fetch_timer(exchange_name):
+                return await exchange.fetch_ohlcv(
+                    crypto_name,
+                    interval,
+                    since,
+                )
+
+        limit = self.concurrency.for_exchange(exchange_name)
+        if not acquired:
+            await limit.acquire()
+
+        started = time.monotonic()
+        congested = succeeded = False
+        try:
+            with fetch_timer(exchange_name):
+                ohlc = await exchange.fetch_ohlcv(
+                    crypto_name,
+                    interval,
+                    since,
+                )
+            succeeded = True
+            return ohlc
+        except (ccxt.RateLimitExceeded, ccxt.DDoSProtection, ccxt.RequestTimeout):
+            congested = True
+            raise
+        finally:
+            await limit.release(
+                latency=time.monotonic() - started, congested=congested, succeeded=succeeded
+            )
 
     async def get_exchanges_with_markets(self, exchanges: list[str]) -> list[ccxt.Exchange]:
         """
@@ -63,16 +260,39 @@ class CryptoFetcher:
         return self._exchanges[exchange]
 
     def _get_ccxt_exchange(self, exchange_name: str) -> ccxt.Exchange:
-        return getattr(ccxt, exchange_name)()
+        if self.exchange_factory:
+            return self.exchange_factory(exchange_name)
+        if not self.http_pool:
+            return getattr(ccxt, exchange_name)()
+
+        # ccxt doesn't own (and won't close) a session passed in
+        return getattr(ccxt, exchange_name)(
+            {
+                "session": self.http_pool.session(),
+                "timeout": self.http_pool.settings.HTTP_REQUEST_TIMEOUT_MS,
+            }
+        )
 
     async def close_all(self) -> None:
         """Close all exchange connections after completing async call"""
-        if not self._exchanges:
-            return
+        if self._exchanges:
+            tasks = []
+            for exchange in self._exchanges.values():
+                tasks.append(exchange.close())
+            logger.info("ON SHUTDOWN LIFESPAN CALLED!")
+
+            await asyncio.gather(*tasks)
+
+        if self.http_pool:
+            await self.http_pool.close()
 
-        tasks = []
-        for exchange in self._exchanges.values():
-            tasks.append(exchange.close())
-        logger.info("ON SHUTDOWN LIFESPAN CALLED!")
 
-        await asyncio.gather(*tasks)
+def _ohlc_array(ohlc: list[list[float]]) -> np.ndarray:
+    try:
+        array = np.asarray(ohlc, dtype=np.float64)
+    except (TypeError, ValueError):
+        array = np.empty(0)
+    if array.ndim != 2 or array.shape[1] != 6:
+        # empty or corrupted pages, the store already refused them
+        return np.empty((0, 6), dtype=np.float64)
+    return array
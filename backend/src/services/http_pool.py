@@ -0,0 +1,88 @@
+import logging
+import ssl
+from collections.abc import Awaitable, Callable
+from types import SimpleNamespace
+
+import aiohttp
+import certifi
+from config.config import HttpSettings
+
+logger = logging.getLogger(__name__)
+
+
+class HttpPool:
+    """
+    One aiohttp session shared by all ccxt exchanges of a CryptoFetcher
+
+    Tuned connector instead of a default one per exchange:
+    keep-alive, per-host limits and cached DNS, so connections are reused across requests.
+    Session has to be created inside a running event loop, so it's created lazily
+    """
+
+    def __init__(self, settings: HttpSettings) -> None:
+        self.settings = settings
+        self._session: aiohttp.ClientSession | None = None
+        self._stats = {
+            "requests": 0,
+            "connections_created": 0,
+            "connections_reused": 0,
+            "dns_cache_hits": 0,
+            "dns_cache_misses": 0,
+        }
+
+    def session(self) -> aiohttp.ClientSession:
+        if self._session is None or self._session.closed:
+            self._session = self._create_session()
+        return self._session
+
+    def _create_session(self) -> aiohttp.ClientSession:
+        connector = aiohttp.TCPConnector(
+            ssl=ssl.create_default_context(cafile=certifi.where()),
+            limit=self.settings.HTTP_POOL_LIMIT,
+            limit_per_host=self.settings.HTTP_POOL_LIMIT_PER_HOST,
+            keepalive_timeout=self.settings.HTTP_KEEPALIVE_TIMEOUT,
+            use_dns_cache=True,
+            ttl_dns_cache=self.settings.HTTP_DNS_CACHE_TTL,
+            enable_cleanup_closed=True,
+        )
+        return aiohttp.ClientSession(
+            connector=connector,
+            timeout=aiohttp.ClientTimeout(
+                total=self.settings.HTTP_REQUEST_TIMEOUT_MS / 1000,
+                sock_connect=self.settings.HTTP_CONNECT_TIMEOUT,
+            ),
+            trace_configs=[self._trace_config()],
+        )
+
+    def _trace_config(self) -> aiohttp.TraceConfig:
+        trace_config = aiohttp.TraceConfig()
+        trace_config.on_request_start.append(self._counter("requests"))
+        trace_config.on_connection_create_end.append(self._counter("connections_created"))
+        trace_config.on_connection_reuseconn.append(self._counter("connections_reused"))
+        trace_config.on_dns_cache_hit.append(self._counter("dns_cache_hits"))
+        trace_config.on_dns_cache_miss.append(self._counter("dns_cache_misses"))
+        return trace_config
+
+    def _counter(self, name: str) -> Callable[..., Awaitable[None]]:
+        async def count(
+            session: aiohttp.ClientSession, context: SimpleNamespace, params: object
+        ) -> None:
+            self._stats[name] += 1
+
+        return count
+
+    def stats(self) -> dict:
+        """
+        Connection reuse stats since the pool was created
+        """
+        connections = self._stats["connections_created"] + self._stats["connections_reused"]
+        reuse_ratio = self._stats["connections_reused"] / connections if connections else 0.0
+        return {**self._stats, "reuse_ratio": round(reuse_ratio, 4)}
+
+    async def close(self) -> None:
+        if self._session is None:
+            return
+
+        logger.info(f"Closing shared http pool, stats: {self.stats()}")
+        await self._session.close()
+        self._session = None
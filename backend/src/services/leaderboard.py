@@ -0,0 +1,101 @@
+import logging
+
+import redis
+from routes.models.schemas import ComputedSpreadResponse, SpreadOrdering
+from services.cache_keys import leaderboard_display_key, leaderboard_key
+from services.caching import RedisClient
+
+logger = logging.getLogger(__name__)
+
+
+class Leaderboard:
+    """
+    Top computed spreads per interval, one sorted set per SpreadOrdering
+
+    Members are crypto ids, display fields live in a hash next to them,
+    so top-n is ZREVRANGE + HMGET: O(log N + n), no postgres involved.
+    Workers update it after saving, it can always be rebuilt from postgres
+    """
+
+    def __init__(self, redis_client: RedisClient) -> None:
+        self.redis_client = redis_client
+
+    def record(self, interval: str, spreads: dict[int, ComputedSpreadResponse]) -> None:
+        """
+        Add or update @spreads, keyed by crypto id
+
+        Redis errors are only logged, the spreads are saved in postgres already
+        """
+        if not self.redis_client.client or not spreads:
+            return
+
+        try:
+            pipe = self.redis_client.client.pipeline(transaction=True)
+            self._queue_record(pipe=pipe, interval=interval, spreads=spreads)
+            pipe.execute()
+        except redis.RedisError:
+            logger.exception(f"Couldn't update the {interval} leaderboard")
+
+    def replace(self, interval: str, spreads: dict[int, ComputedSpreadResponse]) -> None:
+        """
+        Swap the whole leaderboard in one transaction, e.g. rebuilt from postgres
+        """
+        if not self.redis_client.client:
+            return
+
+        pipe = self.redis_client.client.pipeline(transaction=True)
+        pipe.delete(
+            leaderboard_display_key(interval),
+            *[leaderboard_key(interval=interval, mode=mode) for mode in SpreadOrdering],
+        )
+        self._queue_record(pipe=pipe, interval=interval, spreads=spreads)
+        pipe.execute()
+        logger.info(f"Rebuilt the {interval} leaderboard with {len(spreads)} spreads")
+
+    def top(self, interval: str, order_by: SpreadOrdering, n: int) -> list[ComputedSpreadResponse]:
+        if not self.redis_client.client or n <= 0:
+            return []
+
+        client = self.redis_client.client
+        crypto_ids = client.zrevrange(leaderboard_key(interval=interval, mode=order_by), 0, n - 1)
+        if not crypto_ids:
+            return []
+
+        displayed = client.hmget(leaderboard_display_key(interval), crypto_ids)
+        return [
+            ComputedSpreadResponse.model_validate_json(display) for display in displayed if display
+        ]
+
+    def is_empty(self, interval: str) -> bool:
+        if not self.redis_client.client:
+            return True
+        return not self.redis_client.client.hlen(leaderboard_display_key(interval))
+
+    def _queue_record(
+        self,
+        pipe: redis.client.Pipeline,
+        interval: str,
+        spreads: dict[int, ComputedSpreadResponse],
+    ) -> None:
+        for mode in SpreadOrdering:
+            key = leaderboard_key(interval=interval, mode=mode)
+            scores = {
+                crypto_id: getattr(spread, mode)
+                for crypto_id, spread in spreads.items()
+                if getattr(spread, mode) is not None
+            }
+            # statistics can go missing on a recompute, the old score must not stay
+            unscored = [crypto_id for crypto_id in spreads if crypto_id not in scores]
+            if scores:
+                pipe.zadd(key, scores)
+            if unscored:
+                pipe.zrem(key, *unscored)
+
+        # redis refuses an empty mapping, e.g. rebuilding before the first compute
+        if spreads:
+            pipe.hset(
+                leaderboard_display_key(interval),
+                mapping={
+                    crypto_id: spread.model_dump_json() for crypto_id, spread in spreads.items()
+                },
+            )
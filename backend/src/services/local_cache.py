@@ -0,0 +1,191 @@
+import logging
+import threading
+import time
+from collections import OrderedDict
+from typing import Any
+
+from services.caching import RedisClient
+
+logger = logging.getLogger(__name__)
+
+
+class LocalCache:
+    """
+    Bounded in-process LRU cache for decoded objects
+
+    Bounded by the summed size of the entries (callers pass the size,
+    usually the length of the serialized payload) and by a TTL per entry.
+    Cached objects are shared between callers, treat them as read-only
+    """
+
+    def __init__(self, max_bytes: int, max_ttl: int) -> None:
+        self.max_bytes = max_bytes
+        self.max_ttl = max_ttl
+
+        # key -> (value, size, expires at, expires at in redis or None)
+        self._entries: OrderedDict[str, tuple[Any, int, float, float | None]] = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+
+    def get(self, key: str) -> tuple[Any, int] | None:
+        """
+        Cached value with its remaining TTL in redis, None on a miss
+
+        Remaining TTL is -1 if the key has no expiry in redis
+        """
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+
+            value, _, expires_at, redis_expires_at = entry
+            if expires_at <= now:
+                self._pop(key)
+                self.expirations += 1
+                self.misses += 1
+                return None
+
+            self._entries.move_to_end(key)
+            self.hits += 1
+
+        remaining_ttl = -1 if redis_expires_at is None else int(redis_expires_at - now)
+        return value, remaining_ttl
+
+    def put(self, key: str, value: Any, size: int, redis_ttl: int) -> None:  # noqa: ANN401
+        """
+        Entries never outlive their redis key, or @max_ttl
+        """
+        if size > self.max_bytes or redis_ttl == 0:
+            return
+
+        expires_at, redis_expires_at = self._expiry(redis_ttl)
+        with self._lock:
+            self._pop(key)
+            self._entries[key] = (value, size, expires_at, redis_expires_at)
+            self._bytes += size
+
+            while self._bytes > self.max_bytes:
+                oldest_key = next(iter(self._entries))
+                self._pop(oldest_key)
+                self.evictions += 1
+
+    def touch(self, key: str, redis_ttl: int) -> None:
+        """
+        Redis TTL of the key changed, but its value didn't
+
+        Refreshed in place under the lock, a concurrent invalidate is never undone
+        """
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return
+            if redis_ttl == 0:
+                self._pop(key)
+                return
+
+            value, size, _, _ = entry
+            self._entries[key] = (value, size, *self._expiry(redis_ttl))
+
+    def invalidate(self, key: str) -> None:
+        with self._lock:
+            self._pop(key)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+            self._bytes = 0
+
+    def stats(self) -> dict[str, int]:
+        with self._lock:
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "expirations": self.expirations,
+                "entries": len(self._entries),
+                "bytes": self._bytes,
+            }
+
+    def _expiry(self, redis_ttl: int) -> tuple[float, float | None]:
+        # entries never outlive their redis key, or max_ttl
+        now = time.monotonic()
+        if redis_ttl < 0:
+            return now + self.max_ttl, None
+        return now + min(redis_ttl, self.max_ttl), now + redis_ttl
+
+    def _pop(self, key: str) -> None:
+        # lock must be held by the caller
+        entry = self._entries.pop(key, None)
+        if entry is not None:
+            self._bytes -= entry[1]
+
+
+class LocalCachedRedisClient(RedisClient):
+    """
+    RedisClient with an in-process L1 tier for decoded json values
+
+    Local writes invalidate the L1 entry. Writes of other processes are only
+    picked up after the L1 TTL, so keep it short
+    """
+
+    def __init__(self, local_cache: LocalCache) -> None:
+        super().__init__()
+        self.local_cache = local_cache
+
+    def set(self, key: str, data: str, ttl: int) -> None:
+        self.local_cache.invalidate(key)
+        super().set(key=key, data=data, ttl=ttl)
+
+    def expire(self, key: str, ttl: int) -> None:
+        self.local_cache.touch(key=key, redis_ttl=ttl)
+        super().expire(key=key, ttl=ttl)
+
+    def expire_many(self, keys: list[str], ttl: int) -> None:
+        for key in keys:
+            self.local_cache.touch(key=key, redis_ttl=ttl)
+        super().expire_many(keys=keys, ttl=ttl)
+
+    def unlink_matching(self, pattern: str, batch_size: int = 500) -> int:
+        # bulk cleanups are rare, matching patterns against L1 isn't worth it
+        self.local_cache.clear()
+        return super().unlink_matching(pattern=pattern, batch_size=batch_size)
+
+    def mget_json(self, keys: list[str]) -> list[Any]:
+        local_hits = [self.local_cache.get(key) for key in keys]
+        missing_keys = [key for key, hit in zip(keys, local_hits, strict=True) if hit is None]
+        fetched = dict(zip(missing_keys, self._mget(missing_keys), strict=True))
+
+        values = []
+        for key, hit in zip(keys, local_hits, strict=True):
+            if hit is not None:
+                values.append(hit[0])
+                continue
+
+            response = fetched[key]
+            value = self._decode(response) if response else None
+            if value is not None:
+                # MGET has no TTLs, so the entry lives for the L1 max TTL
+                self.local_cache.put(key=key, value=value, size=len(response), redis_ttl=-1)
+            values.append(value)
+        return values
+
+    def get_json_with_ttl(self, key: str) -> tuple[Any, int]:
+        local_hit = self.local_cache.get(key)
+        if local_hit is not None:
+            return local_hit
+
+        response, ttl = self.get_with_ttl(key)
+        if not response:
+            return None, ttl
+
+        value = self._decode(response)
+        if value is not None:
+            self.local_cache.put(key=key, value=value, size=len(response), redis_ttl=ttl)
+        return value, ttl
@@ -0,0 +1,228 @@
+"""
+Prometheus metrics of the api, fetchers, cache and workers
+
+Metrics live in the process recording them. Celery prefork children and multi worker
+uvicorn need PROMETHEUS_MULTIPROC_DIR set to an empty directory (before start),
+every process then writes its samples there and a scrape merges them
+"""
+
+import functools
+import inspect
+import logging
+import os
+import shutil
+import time
+from contextlib import contextmanager
+from typing import Callable, Iterator, TypeVar
+
+import ccxt.async_support as ccxt
+from prometheus_client import (
+    REGISTRY,
+    CollectorRegistry,
+    Counter,
+    Gauge,
+    Histogram,
+    generate_latest,
+    multiprocess,
+    start_http_server,
+)
+from prometheus_client.registry import Collector
+
+logger = logging.getLogger(__name__)
+
+Function = TypeVar("Function", bound=Callable)
+
+# redis round trips are sub-millisecond, everything else is way slower
+FAST_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 1)
+SLOW_BUCKETS = (0.01, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 300)
+
+FETCH_SECONDS = Histogram(
+    "cct_fetch_ohlcv_seconds", "fetch_ohlcv latency", ["exchange"], buckets=SLOW_BUCKETS
+)
+FETCH_ERRORS = Counter(
+    "cct_fetch_ohlcv_errors_total", "Failed fetch_ohlcv calls", ["exchange", "error"]
+)
+PAIRS_FETCHED = Counter(
+    "cct_pairs_fetched_total", "Fetched pairs by fetch status", ["exchange", "status"]
+)
+
+REDIS_SECONDS = Histogram(
+    "cct_redis_operation_seconds", "RedisClient call latency", ["operation"], buckets=FAST_BUCKETS
+)
+REDIS_BYTES = Counter(
+    "cct_redis_payload_bytes_total", "Bytes sent to / read from redis", ["operation", "direction"]
+)
+
+TASK_SECONDS = Histogram(
+    "cct_celery_task_seconds", "Celery task run time", ["task", "state"], buckets=SLOW_BUCKETS
+)
+DB_SECONDS = Histogram(
+    "cct_db_call_seconds",
+    "Time spent in background/db functions",
+    ["function"],
+    buckets=SLOW_BUCKETS,
+)
+HTTP_SECONDS = Histogram(
+    "cct_http_request_seconds",
+    "Api request latency",
+    ["method", "route", "status"],
+    buckets=SLOW_BUCKETS,
+)
+
+SPREADS_COMPUTED = Counter(
+    "cct_spreads_computed_total", "Computes by outcome", ["interval", "outcome"]
+)
+# runs finish in any process, the gauges show the latest one
+RUN_PAIRS = Gauge(
+    "cct_run_pairs", "Pairs of the latest fetched run", ["interval"], multiprocess_mode="mostrecent"
+)
+RUN_FETCH_SECONDS = Gauge(
+    "cct_run_fetch_seconds",
+    "Fetch time of the latest fetched run",
+    ["interval"],
+    multiprocess_mode="mostrecent",
+)
+RUN_PAIRS_PER_SECOND = Gauge(
+    "cct_run_pairs_per_second",
+    "Fetch throughput of the latest fetched run",
+    ["interval"],
+    multiprocess_mode="mostrecent",
+)
+
+
+def multiprocess_dir() -> str | None:
+    return os.environ.get("PROMETHEUS_MULTIPROC_DIR")
+
+
+@contextmanager
+def fetch_timer(exchange_name: str) -> Iterator[None]:
+    """
+    Time one exchange request, count it as an error if it raises
+    """
+    started = time.perf_counter()
+    try:
+        yield
+    except ccxt.BaseError as e:
+        FETCH_ERRORS.labels(exchange=exchange_name, error=type(e).__name__).inc()
+        raise
+    finally:
+        FETCH_SECONDS.labels(exchange=exchange_name).observe(time.perf_counter() - started)
+
+
+def timed_redis(operation: str) -> Callable[[Function], Function]:
+    """
+    Decorator timing a RedisClient method as @operation
+    """
+
+    def decorator(function: Function) -> Function:
+        @functools.wraps(function)
+        def wrapper(*args: object, **kwargs: object):  # noqa: ANN202
+            started = time.perf_counter()
+            try:
+                return function(*args, **kwargs)
+            finally:
+                REDIS_SECONDS.labels(operation=operation).observe(time.perf_counter() - started)
+
+        return wrapper
+
+    return decorator
+
+
+def redis_payload(operation: str, direction: str, size: int) -> None:
+    """
+    @direction is "write" or "read"
+    """
+    REDIS_BYTES.labels(operation=operation, direction=direction).inc(size)
+
+
+def timed_db(function: Function) -> Function:
+    """
+    Decorator timing a db function
+
+    Generators are timed by the time spent in them (fetching rows),
+    not by the time their consumer takes in between
+    """
+    name = function.__name__
+
+    if inspect.isgeneratorfunction(function):
+
+        @functools.wraps(function)
+        def generator_wrapper(*args: object, **kwargs: object):  # noqa: ANN202
+            rows = function(*args, **kwargs)
+            spent = 0.0
+            try:
+                while True:
+                    started = time.perf_counter()
+                    try:
+                        row = next(rows)
+                    except StopIteration:
+                        return
+                    finally:
+                        spent += time.perf_counter() - started
+                    yield row
+            finally:
+                rows.close()
+                DB_SECONDS.labels(function=name).observe(spent)
+
+        return generator_wrapper
+
+    @functools.wraps(function)
+    def wrapper(*args: object, **kwargs: object):  # noqa: ANN202
+        started = time.perf_counter()
+        try:
+            return function(*args, **kwargs)
+        finally:
+            DB_SECONDS.labels(function=name).observe(time.perf_counter() - started)
+
+    return wrapper
+
+
+def record_run(interval: str, pairs: int, fetch_seconds: float) -> None:
+    RUN_PAIRS.labels(interval=interval).set(pairs)
+    RUN_FETCH_SECONDS.labels(interval=interval).set(fetch_seconds)
+    if fetch_seconds > 0:
+        RUN_PAIRS_PER_SECOND.labels(interval=interval).set(pairs / fetch_seconds)
+
+
+def exposition(collectors: list[Collector] | None = None) -> bytes:
+    """
+    Text exposition of all processes' metrics plus @collectors
+    """
+    if multiprocess_dir():
+        registry = CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)
+        output = generate_latest(registry)
+    else:
+        output = generate_latest(REGISTRY)
+
+    extra = CollectorRegistry()
+    for collector in collectors or []:
+        extra.register(collector)
+    return output + generate_latest(extra)
+
+
+def serve_worker_metrics(port: int) -> None:
+    """
+    Serve merged metrics of a worker and its pool processes, from the main process
+    """
+    registry = REGISTRY
+    directory = multiprocess_dir()
+    if directory:
+        # samples of a previous worker would be merged in otherwise
+        shutil.rmtree(directory, ignore_errors=True)
+        os.makedirs(directory, exist_ok=True)
+        registry = CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)
+
+    try:
+        start_http_server(port, registry=registry)
+    except OSError as e:
+        logger.warning(f"Not serving worker metrics on port {port}: {e}")
+
+
+def process_dead(pid: int) -> None:
+    """
+    Drop live gauges of a dead pool process, its counters and histograms are kept
+    """
+    if multiprocess_dir():
+        multiprocess.mark_process_dead(pid)
@@ -0,0 +1,71 @@
+import logging
+from uuid import uuid4
+
+from config.config import SUPPORTED_EXCHANGES
+from services.cache_keys import pending_run_key, run_lock_key
+from services.caching import RedisClient
+
+logger = logging.getLogger(__name__)
+
+
+def new_run_id() -> str:
+    # scopes cache keys, so runs never overwrite each other
+    return uuid4().hex[:12]
+
+
+class RunAdmission:
+    """
+    At most one run per (interval, threshold, exchange set) at a time
+
+    The lock value is the run id of its owner. Runs extend it with a heartbeat,
+    so the lock of a crashed run expires after @lock_ttl_ms.
+    One more run of the same scope can wait as pending, it's started
+    by the owner on release. More requests than that are deduped
+    """
+
+    def __init__(self, redis_client: RedisClient, lock_ttl_ms: int) -> None:
+        self.redis_client = redis_client
+        self.lock_ttl_ms = lock_ttl_ms
+        self.exchanges = list(SUPPORTED_EXCHANGES.values())
+
+    def admit(self, run_id: str, interval: str, threshold: int) -> str | None:
+        """
+        None if @run_id may start, otherwise the id of the run already in progress
+        """
+        key = run_lock_key(interval=interval, threshold=threshold, exchanges=self.exchanges)
+        # the owner may release in between, then it's tried again.
+        # @run_id only starts once it holds the lock itself
+        while True:
+            if self.redis_client.acquire_lock(key=key, token=run_id, ttl_ms=self.lock_ttl_ms):
+                return None
+
+            running = self.redis_client.get(key)
+            if running:
+                return running.decode() if isinstance(running, bytes) else running
+
+    def heartbeat(self, run_id: str, interval: str, threshold: int) -> bool:
+        key = run_lock_key(interval=interval, threshold=threshold, exchanges=self.exchanges)
+        owned = self.redis_client.extend_lock(key=key, token=run_id, ttl_ms=self.lock_ttl_ms)
+        if not owned:
+            logger.warning(f"Run {run_id} lost its lock, another run may start")
+        return owned
+
+    def queue_pending(self, interval: str, threshold: int) -> bool:
+        """
+        True if a pending run got queued, False if one was queued already
+        """
+        key = pending_run_key(interval=interval, threshold=threshold, exchanges=self.exchanges)
+        return self.redis_client.acquire_lock(key=key, token="1", ttl_ms=self.lock_ttl_ms * 2)
+
+    def release(self, run_id: str, interval: str, threshold: int) -> bool:
+        """
+        Free the scope, True if a pending run waits and should be started now
+        """
+        self.redis_client.release_lock(
+            key=run_lock_key(interval=interval, threshold=threshold, exchanges=self.exchanges),
+            token=run_id,
+        )
+        return self.redis_client.release_lock(
+            key=pending_run_key(interval=interval, threshold=threshold, exchanges=self.exchanges),
+            token="1",
+        )
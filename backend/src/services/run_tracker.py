@@ -0,0 +1,123 @@
+import logging
+import time
+
+from services.cache_keys import run_history_key, run_info_key
+from services.caching import RedisClient
+
+logger = logging.getLogger(__name__)
+
+
+class RunTracker:
+    """
+    Settings, progress and timing of fetch runs, kept in a redis hash per run
+
+    Timestamps are unix seconds. A run is fetched once all its chunks are done,
+    last_compute_at moves with every compute after that
+    """
+
+    def __init__(self, redis_client: RedisClient, history_size: int, ttl: int) -> None:
+        self.redis_client = redis_client
+        self.history_size = history_size
+        self.ttl = ttl
+
+    def start(
+        self, run_id: str, interval: str, threshold: int, changed_only: bool, scheduled: bool
+    ) -> None:
+        previous = self.recent(interval=interval, count=1)
+        still_fetching = bool(previous) and "fetched_at" not in previous[0]
+        if still_fetching:
+            logger.warning(f"Run {run_id} starts before run {previous[0]['run_id']} was fetched")
+
+        self.redis_client.hash_set(
+            run_info_key(run_id),
+            {
+                "run_id": run_id,
+                "interval": interval,
+                "threshold": threshold,
+                "changed_only": int(changed_only),
+                "scheduled": int(scheduled),
+                "started_at": time.time(),
+                "overlapped_previous": int(still_fetching),
+            },
+            ttl=self.ttl,
+        )
+        self.redis_client.push_capped(run_history_key(interval), run_id, self.history_size)
+
+    def split_done(self, run_id: str, chunks_total: int, pairs: int) -> bool:
+        """
+        True if the run is fetched already
+        """
+        self.redis_client.hash_set(
+            run_info_key(run_id), {"chunks_total": chunks_total, "pairs": pairs}, ttl=self.ttl
+        )
+        # chunks may have finished while the run was still being split
+        chunks_done = self.redis_client.hash_get_all(run_info_key(run_id)).get("chunks_done", 0)
+        return int(chunks_done) >= chunks_total and self._mark_fetched(run_id)
+
+    def chunk_done(self, run_id: str) -> bool:
+        """
+        True if this was the last chunk of the run
+        """
+        chunks_done = self.redis_client.hash_incr(run_info_key(run_id), "chunks_done")
+        chunks_total = self.redis_client.hash_get_all(run_info_key(run_id)).get("chunks_total")
+        return (
+            chunks_total is not None
+            and chunks_done >= int(chunks_total)
+            and self._mark_fetched(run_id)
+        )
+
+    def computes_done(self, run_id: str, computed: int = 0, skipped: int = 0) -> None:
+        key = run_info_key(run_id)
+        if computed:
+            self.redis_client.hash_incr(key, "computed", computed)
+        if skipped:
+            self.redis_client.hash_incr(key, "skipped_unchanged", skipped)
+        self.redis_client.hash_set(key, {"last_compute_at": time.time()}, ttl=self.ttl)
+
+    def is_change_driven(self, run_id: str) -> bool:
+        return self.redis_client.hash_get_all(run_info_key(run_id)).get("changed_only") == "1"
+
+    def info(self, run_id: str) -> dict:
+        raw = self.redis_client.hash_get_all(run_info_key(run_id))
+        if not raw:
+            return {}
+
+        info: dict = {field: _parse_field(field, value) for field, value in raw.items()}
+        started_at = info["started_at"]
+        if "fetched_at" in info:
+            info["fetch_seconds"] = round(info["fetched_at"] - started_at, 3)
+        finished_at = max(info.get("fetched_at", 0), info.get("last_compute_at", 0))
+        if finished_at:
+            info["total_seconds"] = round(finished_at - started_at, 3)
+        return info
+
+    def recent(self, interval: str, count: int) -> list[dict]:
+        """
+        Newest runs of @interval first
+
+        finished_before_next tells if a run was done before the following run started
+        """
+        run_ids = self.redis_client.list_range(run_history_key(interval), count)
+        runs = [info for info in (self.info(run_id) for run_id in run_ids) if info]
+
+        for newer, older in zip(runs, runs[1:], strict=False):
+            finished_at = older["started_at"] + older.get("total_seconds", float("inf"))
+            older["finished_before_next"] = finished_at <= newer["started_at"]
+        return runs
+
+    def _mark_fetched(self, run_id: str) -> bool:
+        # split and last chunk can both see the run fetched, only one of them wins
+        if self.redis_client.hash_incr(run_info_key(run_id), "fetched_marks") > 1:
+            return False
+        self.redis_client.hash_set(run_info_key(run_id), {"fetched_at": time.time()}, ttl=self.ttl)
+        return True
+
+
+def _parse_field(field: str, value: str) -> str | float | int | bool:
+    if field in ("run_id", "interval"):
+        return value
+    if field.endswith("_at"):
+        return float(value)
+    if field in ("changed_only", "scheduled", "overlapped_previous"):
+        return value == "1"
+    return int(value)
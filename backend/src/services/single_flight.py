@@ -0,0 +1,126 @@
+import asyncio
+import logging
+import math
+import time
+from typing import Awaitable, Callable, TypeVar
+from uuid import uuid4
+
+import redis
+from services.caching import RedisClient
+from services.concurrency import AdaptiveLimit
+
+logger = logging.getLogger(__name__)
+
+T = TypeVar("T")
+
+
+class SingleFlight:
+    """
+    Collapses concurrent identical calls into one
+
+    In-process, callers with the same key await the same task.
+    Across processes, a short redis lock elects one fetching process,
+    the others poll the shared result until it shows up or the lock is gone.
+    The result is only written to redis if another process announced it's waiting.
+    If the fetching process fails, the next waiter takes over
+    """
+
+    def __init__(
+        self,
+        redis_client: RedisClient | None,
+        lock_ttl_ms: int,
+        poll_interval_ms: int,
+        result_ttl: int,
+    ) -> None:
+        self.redis_client = redis_client
+        self.lock_ttl_ms = lock_ttl_ms
+        self.poll_interval = poll_interval_ms / 1000
+        self.result_ttl = result_ttl
+
+        self._in_flight: dict[str, asyncio.Task] = {}
+
+    async def do(
+        self, key: str, call: Callable[[], Awaitable[T]], slot: AdaptiveLimit | None = None
+    ) -> T:
+        """
+        @slot (e.g. the exchange's concurrency limit) is acquired before the lock is taken,
+        so the lock doesn't expire while queueing for it. @call has to release it
+        """
+        task = self._in_flight.get(key)
+        if task is None:
+            task = asyncio.ensure_future(self._do_shared(key, call, slot))
+            self._in_flight[key] = task
+            task.add_done_callback(lambda _: self._in_flight.pop(key, None))
+        else:
+            logger.info(f"Joining in-flight call for {key}")
+
+        # one cancelled caller mustn't cancel the call for everyone
+        return await asyncio.shield(task)
+
+    async def _do_shared(
+        self, key: str, call: Callable[[], Awaitable[T]], slot: AdaptiveLimit | None
+    ) -> T:
+        if not self.redis_client:
+            return await self._call(call, slot)
+
+        lock_key, result_key, waiters_key = f"{key}:lock", f"{key}:result", f"{key}:waiters"
+        token = uuid4().hex
+        wait_until = time.monotonic() + self.lock_ttl_ms / 1000
+
+        waiting = False
+        while True:
+            try:
+                # the result is checked before the lock, as the lock is free again
+                # by the time the fetching process has shared its result
+                if waiting and (shared := self.redis_client.get_json(result_key)):
+                    return shared
+            except redis.RedisError as e:
+                logger.error(f"Single flight unavailable for {key}, calling directly: {e}")
+                return await self._call(call, slot)
+
+            if slot:
+                await slot.acquire()
+            try:
+                locked = self.redis_client.acquire_lock(lock_key, token, self.lock_ttl_ms)
+                if not locked:
+                    self.redis_client.set(
+                        key=waiters_key, data="1", ttl=math.ceil(self.lock_ttl_ms / 1000)
+                    )
+            except redis.RedisError as e:
+                logger.error(f"Single flight unavailable for {key}, calling directly: {e}")
+                return await call()
+            if locked:
+                return await self._call_and_share(lock_key, result_key, waiters_key, token, call)
+
+            # another process is fetching, wait for its result without holding a slot
+            if slot:
+                await slot.cancel()
+            waiting = True
+            if time.monotonic() > wait_until:
+                logger.warning(f"Gave up waiting for {key}, calling directly")
+                return await self._call(call, slot)
+
+            await asyncio.sleep(self.poll_interval)
+
+    async def _call(self, call: Callable[[], Awaitable[T]], slot: AdaptiveLimit | None) -> T:
+        if slot:
+            await slot.acquire()
+        return await call()
+
+    async def _call_and_share(
+        self,
+        lock_key: str,
+        result_key: str,
+        waiters_key: str,
+        token: str,
+        call: Callable[[], Awaitable[T]],
+    ) -> T:
+        try:
+            result = await call()
+            # failed calls aren't shared, waiters will try themselves.
+            # Nobody waiting (the usual case within a run) means nothing to write
+            if result and self.redis_client.get(waiters_key):
+                self.redis_client.set_json(key=result_key, data=result, ttl=self.result_ttl)
+            return result
+        finally:
+            self.redis_client.release_lock(lock_key, token)
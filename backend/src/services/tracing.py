@@ -0,0 +1,279 @@
+"""
+Lightweight tracing of runs, following every crypto from its fetch to the stored spread
+
+A run is one trace, its trace id is the zero padded run id. Spans nest through a context variable
+within a process (asyncio tasks included) and travel between celery tasks
+in the task headers, see background/celery/celery_tracing.py.
+
+Finished spans are buffered per process and written out once the outermost span
+of the process ends, as json lines to TRACE_FILE and / or as OTLP json
+to TRACE_COLLECTOR_URL. background/trace_report.py finds the critical path of a run
+"""
+
+import json
+import logging
+import secrets
+import time
+import zlib
+from contextlib import contextmanager
+from contextvars import ContextVar, Token
+from functools import lru_cache
+from pathlib import Path
+from typing import Iterator
+
+import httpx
+from config.config import TracingSettings
+
+logger = logging.getLogger(__name__)
+tracing_settings = TracingSettings()
+
+# long runs would otherwise keep all their spans until the run span ends
+FLUSH_SPANS = 1000
+
+
+class Span:
+    __slots__ = ("trace_id", "span_id", "parent_id", "name", "start", "end", "attributes", "error")
+
+    def __init__(
+        self,
+        trace_id: str,
+        name: str,
+        parent_id: str | None = None,
+        start: float | None = None,
+        attributes: dict | None = None,
+    ) -> None:
+        self.trace_id = trace_id
+        self.span_id = secrets.token_hex(8)
+        self.parent_id = parent_id
+        self.name = name
+        self.start = time.time() if start is None else start
+        self.end: float | None = None
+        self.attributes = attributes or {}
+        self.error: str | None = None
+
+    def context(self) -> dict:
+        """
+        What a child needs, in another process too
+        """
+        return {"trace_id": self.trace_id, "span_id": self.span_id}
+
+    def as_dict(self) -> dict:
+        return {
+            "trace_id": self.trace_id,
+            "span_id": self.span_id,
+            "parent_id": self.parent_id,
+            "name": self.name,
+            "start": self.start,
+            "end": self.end,
+            "attributes": self.attributes,
+            "error": self.error,
+        }
+
+
+_current: ContextVar[Span | None] = ContextVar("current_span", default=None)
+
+
+def trace_id_of(run_id: str) -> str:
+    # OTLP wants 16 bytes, run ids are shorter hex
+    return run_id.zfill(32)
+
+
+def sampled(run_id: str) -> bool:
+    if not tracing_settings.TRACING_ENABLED:
+        return False
+    return zlib.crc32(run_id.encode()) % 10_000 < tracing_settings.TRACE_SAMPLE_RATE * 10_000
+
+
+def current_context() -> dict | None:
+    span = _current.get()
+    return span.context() if span else None
+
+
+def open_span(
+    name: str, parent: dict, start: float | None = None, **attributes: object
+) -> tuple[Span, Token]:
+    """
+    Span continuing @parent (a context, maybe from another process), made the current one
+
+    Has to be closed with close_span in the same context
+    """
+    span = Span(
+        trace_id=parent["trace_id"],
+        name=name,
+        parent_id=parent.get("span_id"),
+        start=start,
+        attributes=attributes,
+    )
+    return span, _current.set(span)
+
+
+def close_span(span: Span, token: Token, error: str | None = None) -> None:
+    span.end = time.time()
+    span.error = error
+    _current.reset(token)
+
+    exporter = get_span_exporter()
+    exporter.add(span)
+    if _current.get() is None or exporter.pending() >= FLUSH_SPANS:
+        exporter.flush()
+
+
+def record_span(name: str, parent: dict, start: float, end: float, **attributes: object) -> Span:
+    """
+    Span of something which already happened, e.g. waiting in a queue
+    """
+    span = Span(
+        trace_id=parent["trace_id"],
+        name=name,
+        parent_id=parent.get("span_id"),
+        start=start,
+        attributes=attributes,
+    )
+    span.end = end
+    get_span_exporter().add(span)
+    return span
+
+
+@contextmanager
+def start_trace(run_id: str, name: str, **attributes: object) -> Iterator[dict]:
+    """
+    Root span of run @run_id, or a child if the caller is in its trace already
+
+    Nothing is recorded if tracing is off or the run isn't sampled
+    """
+    if not sampled(run_id):
+        yield attributes
+        return
+
+    trace_id = trace_id_of(run_id)
+    parent = current_context()
+    if not parent or parent["trace_id"] != trace_id:
+        parent = {"trace_id": trace_id}
+    with _traced(
+        name=name, parent=parent, attributes={"run_id": run_id, **attributes}
+    ) as span_attributes:
+        yield span_attributes
+
+
+@contextmanager
+def span(name: str, **attributes: object) -> Iterator[dict]:
+    """
+    Child of the current span, nothing is recorded outside of a traced run
+
+    Yields the span's attributes, to add the ones known only afterwards
+    """
+    parent = current_context()
+    if parent is None:
+        yield attributes
+        return
+
+    with _traced(name=name, parent=parent, attributes=attributes) as span_attributes:
+        yield span_attributes
+
+
+@contextmanager
+def _traced(name: str, parent: dict, attributes: dict) -> Iterator[dict]:
+    opened, token = open_span(name, parent, **attributes)
+    try:
+        yield opened.attributes
+    except BaseException as e:
+        close_span(opened, token, error=type(e).__name__)
+        raise
+    close_span(opened, token)
+
+
+class SpanExporter:
+    """
+    Buffers finished spans of this process, flush writes them to @path and / or
+    posts them to the OTLP/HTTP @collector_url
+    """
+
+    def __init__(self, path: Path | None, collector_url: str | None) -> None:
+        self.path = path
+        self.collector_url = collector_url
+        self._spans: list[Span] = []
+
+    def add(self, span: Span) -> None:
+        self._spans.append(span)
+
+    def pending(self) -> int:
+        return len(self._spans)
+
+    def flush(self) -> None:
+        spans, self._spans = self._spans, []
+        if not spans:
+            return
+
+        if self.path:
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            lines = "".join(json.dumps(span.as_dict()) + "\n" for span in spans)
+            # one write per flush, several processes append to the same file
+            with open(self.path, "a") as file:
+                file.write(lines)
+
+        if self.collector_url:
+            try:
+                response = httpx.post(self.collector_url, json=otlp_payload(spans), timeout=2)
+                response.raise_for_status()
+            except httpx.HTTPError as e:
+                logger.warning(f"Dropped {len(spans)} spans, collector failed: {e}")
+
+
+@lru_cache()
+def get_span_exporter() -> SpanExporter:
+    trace_file = tracing_settings.TRACE_FILE
+    return SpanExporter(
+        path=Path(trace_file) if trace_file else None,
+        collector_url=tracing_settings.TRACE_COLLECTOR_URL,
+    )
+
+
+def otlp_payload(spans: list[Span]) -> dict:
+    """
+    Spans in the OTLP json encoding, what collectors take on /v1/traces
+    """
+    return {
+        "resourceSpans": [
+            {
+                "resource": {
+                    "attributes": _otlp_attributes({"service.name": "cryptocurrency-tracker"})
+                },
+                "scopeSpans": [
+                    {"scope": {"name": __name__}, "spans": [_otlp_span(span) for span in spans]}
+                ],
+            }
+        ]
+    }
+
+
+def _otlp_span(span: Span) -> dict:
+    otlp_span = {
+        "traceId": span.trace_id,
+        "spanId": span.span_id,
+        "name": span.name,
+        # internal
+        "kind": 1,
+        "startTimeUnixNano": str(int(span.start * 1e9)),
+        "endTimeUnixNano": str(int(span.end * 1e9)),
+        "attributes": _otlp_attributes(span.attributes),
+        # 1 ok, 2 error
+        "status": {"code": 2, "message": span.error} if span.error else {"code": 1},
+    }
+    if span.parent_id:
+        otlp_span["parentSpanId"] = span.parent_id
+    return otlp_span
+
+
+def _otlp_attributes(attributes: dict) -> list[dict]:
+    otlp_attributes = []
+    for key, value in attributes.items():
+        if isinstance(value, bool):
+            typed = {"boolValue": value}
+        elif isinstance(value, int):
+            typed = {"intValue": str(value)}
+        elif isinstance(value, float):
+            typed = {"doubleValue": value}
+        else:
+            typed = {"stringValue": str(value)}
+        otlp_attributes.append({"key": key, "value": typed})
+    return otlp_attributes
@@ -1,21 +1,127 @@
 from functools import lru_cache
 from typing import Annotated
 
+from config.config import (
+    CacheSettings,
+    CandleStoreSettings,
+    ConcurrencySettings,
+    CryptoBatchSettings,
+    HttpSettings,
+    RedisSettings,
+    SchedulerSettings,
+)
 from fastapi import Depends
+from services.cache_policy import CachePolicy
 from services.caching import RedisClient
+from services.candle_store import CandleStore
+from services.change_detection import ChangeDetector
+from services.concurrency import ExchangeConcurrency
 from services.external_api_caller import CryptoFetcher
+from services.http_pool import HttpPool
+from services.leaderboard import Leaderboard
+from services.local_cache import LocalCache, LocalCachedRedisClient
+from services.run_admission import RunAdmission
+from services.run_tracker import RunTracker
+from services.single_flight import SingleFlight
 
 
 @lru_cache()
 def get_redis_client() -> RedisClient:
+    settings = RedisSettings()
+    if settings.L1_CACHE_ENABLED:
+        return LocalCachedRedisClient(
+            LocalCache(
+                max_bytes=settings.L1_CACHE_MAX_BYTES,
+                max_ttl=settings.L1_CACHE_MAX_TTL,
+            )
+        )
     return RedisClient()
 
 
+@lru_cache()
+def get_exchange_concurrency() -> ExchangeConcurrency | None:
+    settings = ConcurrencySettings()
+    if not settings.ADAPTIVE_CONCURRENCY_ENABLED:
+        return None
+    return ExchangeConcurrency(settings=settings, redis_client=get_redis_client())
+
+
 @lru_cache()
 def get_crypto_fetcher() -> CryptoFetcher:
-    return CryptoFetcher()
+    settings = CacheSettings()
+    single_flight = None
+    if settings.SINGLE_FLIGHT_ENABLED:
+        single_flight = SingleFlight(
+            redis_client=get_redis_client(),
+            lock_ttl_ms=settings.SINGLE_FLIGHT_LOCK_TTL_MS,
+            poll_interval_ms=settings.SINGLE_FLIGHT_POLL_MS,
+            result_ttl=settings.SINGLE_FLIGHT_RESULT_TTL,
+        )
+
+    http_settings = HttpSettings()
+    http_pool = HttpPool(http_settings) if http_settings.HTTP_POOL_ENABLED else None
+
+    return CryptoFetcher(
+        single_flight=single_flight,
+        concurrency=get_exchange_concurrency(),
+        http_pool=http_pool,
+        candle_store=get_candle_store(),
+    )
+
+
+@lru_cache()
+def get_candle_store() -> CandleStore | None:
+    settings = CandleStoreSettings()
+    if not settings.CANDLE_STORE_ENABLED:
+        return None
+    return CandleStore(settings)
+
+
+@lru_cache()
+def get_cache_policy() -> CachePolicy:
+    return CachePolicy(CacheSettings())
+
+
+@lru_cache()
+def get_change_detector() -> ChangeDetector:
+    settings = SchedulerSettings()
+    return ChangeDetector(
+        redis_client=get_redis_client(),
+        mode=settings.CHANGE_DETECTION,
+        fingerprint_ttl=settings.FINGERPRINT_TTL,
+        run_ttl=settings.RUN_INFO_TTL,
+    )
+
+
+@lru_cache()
+def get_run_tracker() -> RunTracker:
+    settings = SchedulerSettings()
+    return RunTracker(
+        redis_client=get_redis_client(),
+        history_size=settings.RUN_HISTORY_SIZE,
+        ttl=settings.RUN_INFO_TTL,
+    )
+
+
+@lru_cache()
+def get_run_admission() -> RunAdmission:
+    return RunAdmission(
+        redis_client=get_redis_client(), lock_ttl_ms=CryptoBatchSettings().RUN_LOCK_TTL_MS
+    )
+
+
+@lru_cache()
+def get_leaderboard() -> Leaderboard | None:
+    if not CacheSettings().LEADERBOARD_ENABLED:
+        return None
+    return Leaderboard(redis_client=get_redis_client())
 
 
 # init heavy dependencies with lru cache singleton patterns
 RedisClientDependency = Annotated[RedisClient, Depends(get_redis_client)]
-CryptoFetcherDependency = Annotated[CryptoFetcher, Depends(get_crypto_fetcher)]
\ No newline at end of file
+CryptoFetcherDependency = Annotated[CryptoFetcher, Depends(get_crypto_fetcher)]
+CachePolicyDependency = Annotated[CachePolicy, Depends(get_cache_policy)]
+RunTrackerDependency = Annotated[RunTracker, Depends(get_run_tracker)]
+RunAdmissionDependency = Annotated[RunAdmission, Depends(get_run_admission)]
+LeaderboardDependency = Annotated[Leaderboard | None, Depends(get_leaderboard)]
+CandleStoreDependency = Annotated[CandleStore | None, Depends(get_candle_store)]